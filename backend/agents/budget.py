@@ -0,0 +1,90 @@
+
+import time
+from typing import Optional, Tuple
+
+from django.conf import settings
+
+# Latency budget: a deliberation gets an absolute deadline (state["deadline"],
+# epoch seconds). A slice of the budget is reserved for the Arbiter up front;
+# the rest is spread evenly over the seat turns still to come, so a turn that
+# finishes early leaves more time for the ones after it.
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def arbiter_reserve(budget_seconds: float) -> float:
+    fraction = _setting("DELIBERATION_ARBITER_RESERVE_FRACTION", 0.3)
+    minimum = _setting("DELIBERATION_ARBITER_MIN_SECONDS", 10)
+    # Never reserve more than half the budget, the seats need some of it too
+    return min(max(budget_seconds * fraction, minimum), budget_seconds / 2)
+
+
+def remaining_seconds(state) -> Optional[float]:
+    deadline = state.get("deadline")
+    if not deadline:
+        return None
+    return deadline - time.time()
+
+
+def turns_left(state, seat_index: int, seat_count: int) -> int:
+    """
+    Seat turns still to run, including the current one.
+    """
+    rounds_after = max(state["max_rounds"] - state["current_round"], 0)
+    return (seat_count - seat_index) + seat_count * rounds_after
+
+
+def seat_slice(state, seat_index: int, seat_count: int) -> Optional[Tuple[float, float]]:
+    """
+    (deadline, seconds) for the current seat turn, or None without a budget.
+    """
+    remaining = remaining_seconds(state)
+    if remaining is None:
+        return None
+    available = remaining - state.get("arbiter_reserve", 0)
+    seconds = max(available / turns_left(state, seat_index, seat_count),
+                  _setting("DELIBERATION_MIN_TURN_SECONDS", 3))
+    return time.time() + seconds, seconds
+
+
+def parallel_slice(state) -> Optional[Tuple[float, float]]:
+    """
+    (deadline, seconds) for turns that run side by side (self-consistency
+    samples): they share a single turn's worth of the budget.
+    """
+    remaining = remaining_seconds(state)
+    if remaining is None:
+        return None
+    seconds = max(remaining - state.get("arbiter_reserve", 0), _setting("DELIBERATION_MIN_TURN_SECONDS", 3))
+    return time.time() + seconds, seconds
+
+
+def arbiter_slice(state) -> Optional[Tuple[float, float]]:
+    """
+    The Arbiter gets whatever is left, and never less than its reserve
+    (seats may overrun their slices slightly).
+    """
+    remaining = remaining_seconds(state)
+    if remaining is None:
+        return None
+    seconds = max(remaining, state.get("arbiter_reserve", 0), _setting("DELIBERATION_MIN_TURN_SECONDS", 3))
+    return time.time() + seconds, seconds
+
+
+def can_afford_round(state, seat_count: int) -> bool:
+    remaining = remaining_seconds(state)
+    if remaining is None:
+        return True
+    needed = seat_count * _setting("DELIBERATION_MIN_TURN_SECONDS", 3)
+    return remaining - state.get("arbiter_reserve", 0) >= needed
+
+
+def max_tokens_for(spec: dict, seconds: float) -> int:
+    """
+    Output token cap matching a time slice, from the model's expected
+    throughput (spec["tokens_per_second"] or the global default).
+    """
+    rate = spec.get("tokens_per_second") or _setting("DELIBERATION_TOKENS_PER_SECOND", 30)
+    return max(int(seconds * rate), _setting("DELIBERATION_MIN_TURN_TOKENS", 64))
@@ -0,0 +1,203 @@
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+# Record / replay of provider streams, for comparing performance changes to
+# the nodes and the stream relay without provider noise.
+#
+# With DELIBERATION_RECORD_CASSETTES on, every turn streamed through
+# stream_chat (OpenAI, DeepSeek, Ollama, Gemini alike) is written to
+# DELIBERATION_CASSETTE_DIR/<conversation_id>.jsonl.gz: one "run" line per
+# deliberation run (question, rounds, roster, strategy, names of the API keys
+# supplied) followed by one "turn" line per model call:
+#
+#   {"type": "turn", "at": 1.234, "key": "<request hash>", "provider": ..,
+#    "model": .., "temperature": .., "items": [[wait_ms, text], [wait_ms, text, usage], ..],
+#    "closed": false, "error": null}
+#
+# wait_ms is the time spent waiting on the provider for that chunk only, so
+# the recording does not include our own per-chunk overhead. Lines are
+# appended as separate gzip members (parallel samples write concurrently).
+#
+# A Player serves a run's turns back in place of the real clients. Turns are
+# matched on the request hash (same model, temperature and messages), then on
+# the next unused turn of the same provider/model, then on recording order.
+# Chunks arrive on the recorded schedule divided by `speed` (0: no waiting),
+# like a network stream: a slow consumer finds them already buffered.
+
+_write_lock = threading.Lock()
+# conversation_id -> (cassette path, run start, perf_counter)
+_recording: Dict[str, tuple] = {}
+# conversation_id -> Player
+_players: Dict[str, "Player"] = {}
+
+
+class CassetteMiss(LookupError):
+    pass
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def cassette_path(conversation_id: str) -> str:
+    return os.path.join(_setting("DELIBERATION_CASSETTE_DIR", "cassettes"), f"{conversation_id}.jsonl.gz")
+
+
+def request_key(spec: dict, messages, temperature: float) -> str:
+    payload = json.dumps([spec["provider"], spec["model"], temperature,
+                          [[m.type, getattr(m, "name", None), str(m.content)] for m in messages]])
+    return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def _append(path: str, record: dict):
+    line = (json.dumps(record, separators=(",", ":"), ensure_ascii=False) + "\n").encode("utf-8")
+    with _write_lock:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path, "ab") as fh:
+            fh.write(line)
+
+
+def start_recording(conversation_id: str, header: dict):
+    """
+    Starts a cassette run for the deliberation about to run (no-op unless
+    DELIBERATION_RECORD_CASSETTES is on, or while replaying).
+    """
+    if not _setting("DELIBERATION_RECORD_CASSETTES", False) or conversation_id in _players:
+        return
+    from utils.security import get_api_keys
+
+    path = cassette_path(conversation_id)
+    # Key names only: a replay supplies the same names so the same models resolve
+    keys = sorted(name for name, value in get_api_keys(conversation_id).items() if value)
+    _append(path, {"type": "run", "conversation_id": conversation_id, "keys": keys,
+                   "recorded_at": time.time(), **header})
+    _recording[conversation_id] = (path, time.perf_counter())
+
+
+def stop_recording(conversation_id: str):
+    _recording.pop(conversation_id, None)
+
+
+def _record(conversation_id: str, upstream, spec: dict, messages, temperature: float, **limits):
+    path, run_started = _recording[conversation_id]
+    record = {"type": "turn", "at": round(time.perf_counter() - run_started, 4),
+              "key": request_key(spec, messages, temperature), "provider": spec["provider"],
+              "model": spec["model"], "temperature": temperature, **limits,
+              "items": [], "closed": True, "error": None}
+    waited = time.perf_counter()
+    try:
+        for text, usage in upstream:
+            item = [round((time.perf_counter() - waited) * 1000, 2), text]
+            if usage:
+                item.append(usage)
+            record["items"].append(item)
+            yield text, usage
+            waited = time.perf_counter()
+        record["closed"] = False
+    except GeneratorExit:
+        raise
+    except Exception as e:
+        record["closed"] = False
+        record["error"] = str(e)
+        raise
+    finally:
+        upstream.close()
+        try:
+            _append(path, record)
+        except OSError as e:
+            print(f"Error writing cassette {path}: {e}")
+
+
+def load(path: str) -> List[dict]:
+    """
+    Runs in a cassette: [{"header": {...}, "turns": [...]}, ...].
+    """
+    runs = []
+    with gzip.open(path, "rt", encoding="utf-8") as fh:
+        for line in fh:
+            record = json.loads(line)
+            if record["type"] == "run":
+                runs.append({"header": record, "turns": []})
+            elif runs:
+                runs[-1]["turns"].append(record)
+    return runs
+
+
+class Player:
+    """
+    Serves one recorded run's turns in place of the provider clients.
+    """
+
+    def __init__(self, turns: List[dict], speed: float = 1.0):
+        self.turns = turns
+        self.speed = speed
+        self.used = [False] * len(turns)
+        self.misses = 0
+        self.fuzzy = 0
+        self._lock = threading.Lock()
+
+    def take(self, spec: dict, messages, temperature: float) -> Optional[dict]:
+        key = request_key(spec, messages, temperature)
+        exact = lambda t: t["key"] == key
+        same_model = lambda t: (t["provider"], t["model"]) == (spec["provider"], spec["model"])
+        with self._lock:
+            for index, match in enumerate((exact, same_model, lambda t: True)):
+                for position, turn in enumerate(self.turns):
+                    if not self.used[position] and match(turn):
+                        self.used[position] = True
+                        if index:
+                            self.fuzzy += 1
+                        return turn
+            self.misses += 1
+        return None
+
+    def stream(self, spec: dict, messages, temperature: float, **limits):
+        turn = self.take(spec, messages, temperature)
+        if turn is None:
+            raise CassetteMiss(f"No recorded turn left for {spec['provider']}/{spec['model']}")
+        started = time.perf_counter()
+        due = 0.0
+        for item in turn["items"]:
+            if self.speed:
+                due += item[0] / 1000 / self.speed
+                delay = started + due - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+            yield item[1], item[2] if len(item) > 2 else None
+        if turn.get("error"):
+            raise RuntimeError(turn["error"])
+
+
+def replay(conversation_id: str, player: Player):
+    _players[conversation_id] = player
+
+
+def stop_replay(conversation_id: str):
+    _players.pop(conversation_id, None)
+
+
+def replaying(conversation_id: str) -> bool:
+    return conversation_id in _players
+
+
+def open_stream(conversation_id: str, stream_chat, spec: dict, api_key, messages, temperature: float,
+                max_tokens: int = None, timeout: float = None):
+    """
+    stream_chat(...) for a turn, or its recorded / replayed equivalent.
+    """
+    player = _players.get(conversation_id)
+    if player is not None:
+        return player.stream(spec, messages, temperature)
+    upstream = stream_chat(spec, api_key, messages, temperature, max_tokens=max_tokens, timeout=timeout)
+    if conversation_id in _recording:
+        return _record(conversation_id, upstream, spec, messages, temperature,
+                       max_tokens=max_tokens, timeout=timeout)
+    return upstream
@@ -0,0 +1,108 @@
+
+import math
+import re
+from collections import Counter
+from typing import Dict, List, Tuple
+
+from django.conf import settings
+
+from agents.roster import DEFAULT_ARBITER, resolve_model
+
+# Self-consistency: instead of seats taking turns over several rounds, k
+# answers are drawn independently and in parallel (seats round-robin, each
+# with a different temperature) and the Arbiter reconciles them in one pass.
+# Every sample is stored as its own round, so history, follow-ups and the
+# stream work exactly as for the round-based mode.
+#
+# Both modes record an agreement rate on the Arbiter message: the share of
+# the final answers (the samples, or the last round's seat turns) that agree
+# with the largest group of mutually similar answers. Similarity is lexical
+# (word and word-pair cosine), a cheap proxy that is comparable across modes.
+
+STRATEGIES = ["rounds", "self_consistency"]
+
+SAMPLE_TEMPERATURES = [0.3, 0.7, 1.0]
+
+_WORD = re.compile(r"\w+")
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def sample_spec(roster: dict, keys: Dict[str, str], index: int) -> Tuple[dict, dict, float]:
+    """
+    (seat, model spec, temperature) of sample `index`. Samples are final
+    answers, so seats use their last-round ("last") models; the seat returned
+    only has those left, for routing to pick from. A seat that comes round
+    again gets the next temperature, so no two samples share both.
+    """
+    seats = roster["seats"]
+    temperatures = _setting("DELIBERATION_SAMPLE_TEMPERATURES", SAMPLE_TEMPERATURES)
+    seat = final_models(seats[index % len(seats)])
+    temperature = temperatures[(index + index // len(seats)) % len(temperatures)]
+    return seat, resolve_model(seat, keys, 1, 1), temperature
+
+
+def final_models(seat: dict) -> dict:
+    """
+    The seat without round-numbered model selectors, so that resolving it
+    as round 1 of 1 tries "last", then "first" and "default".
+    """
+    return {**seat, "models": {k: v for k, v in seat["models"].items() if not k.isdigit()}}
+
+
+def sample_plan(roster: dict, keys: Dict[str, str], samples: int) -> List[list]:
+    """
+    [seat, sample, provider, model, temperature] for every sample plus the
+    Arbiter, the self-consistency counterpart of roster.resolved_providers.
+    """
+    plan = []
+    for index in range(samples):
+        seat, spec, temperature = sample_spec(roster, keys, index)
+        plan.append([seat["name"], index + 1, spec["provider"], spec["model"], temperature])
+    spec = resolve_model(roster.get("arbiter", DEFAULT_ARBITER), keys, samples, samples)
+    plan.append(["arbiter", 0, spec["provider"], spec["model"], None])
+    return plan
+
+
+def _terms(text: str) -> Counter:
+    words = _WORD.findall(text.lower())
+    return Counter(words + [f"{a} {b}" for a, b in zip(words, words[1:])])
+
+
+def similarity(a: Counter, b: Counter) -> float:
+    """
+    Cosine similarity of two term counts (sublinear tf).
+    """
+    if not a or not b:
+        return 0.0
+    wa = {t: 1 + math.log(c) for t, c in a.items()}
+    wb = {t: 1 + math.log(c) for t, c in b.items()}
+    dot = sum(w * wb[t] for t, w in wa.items() if t in wb)
+    return dot / (math.sqrt(sum(w * w for w in wa.values())) * math.sqrt(sum(w * w for w in wb.values())))
+
+
+def agreement(answers: List[str]) -> Dict[str, float]:
+    """
+    {"agreement_rate", "mean_similarity"} over a set of answers.
+    Two answers agree when their similarity reaches
+    DELIBERATION_AGREEMENT_THRESHOLD.
+    """
+    terms = [_terms(a) for a in answers if a and a.strip()]
+    if len(terms) < 2:
+        return {"agreement_rate": 1.0, "mean_similarity": 1.0}
+    threshold = _setting("DELIBERATION_AGREEMENT_THRESHOLD", 0.5)
+    agreeing = [1] * len(terms)
+    pairs = []
+    for i in range(len(terms)):
+        for j in range(i + 1, len(terms)):
+            score = similarity(terms[i], terms[j])
+            pairs.append(score)
+            if score >= threshold:
+                agreeing[i] += 1
+                agreeing[j] += 1
+    return {
+        "agreement_rate": round(max(agreeing) / len(terms), 4),
+        "mean_similarity": round(sum(pairs) / len(pairs), 4),
+    }
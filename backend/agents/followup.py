@@ -0,0 +1,155 @@
+
+import re
+from typing import List, Optional
+
+from django.conf import settings
+
+from agents.roster import roster_names
+from deliberations.models import Conversation, Message
+
+# A follow-up continues a finished conversation without replaying its
+# transcript. Earlier exchanges are compacted into one seed message: each
+# question, a one-line summary per seat turn, and the Arbiter's answer.
+# Earlier exchanges lose their round summaries first, then drop out entirely,
+# so the seed stays under DELIBERATION_FOLLOW_UP_CONTEXT_CHARS; the latest
+# Arbiter answer is always kept.
+#
+# A new question close to an earlier one (deliberations/similarity.py) can be
+# seeded the same way with that deliberation's question and answer.
+
+FOLLOW_UP_HEADER = "PREVIOUS DELIBERATION (compacted):"
+FOLLOW_UP_QUESTION = "FOLLOW-UP QUESTION:"
+RELATED_HEADER = "RELATED PAST DELIBERATION:"
+
+_MARKUP = re.compile(r"[#*`>]+")
+_SENTENCE_END = re.compile(r"[.!?](?=\s)")
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def compact(text: str, limit: int) -> str:
+    """
+    Flattens a turn to plain text and cuts it at the last sentence end that
+    fits in `limit` characters (or the last word, if no sentence does).
+    """
+    text = " ".join(_MARKUP.sub("", text).split())
+    if len(text) <= limit:
+        return text
+    cut = text[:limit]
+    ends = [m.end() for m in _SENTENCE_END.finditer(cut)]
+    if ends and ends[-1] > limit // 3:
+        return cut[:ends[-1]]
+    return cut.rsplit(" ", 1)[0] + " ..."
+
+
+def next_round(conversation_id: str) -> int:
+    """
+    First round number of a follow-up: rounds keep counting across exchanges.
+    An answer reused from an earlier deliberation has no seat rounds of its
+    own and counts as round 1.
+    """
+    last = (Message.objects.filter(conversation_id=conversation_id)
+            .order_by('-round_number').values_list('round_number', flat=True).first())
+    if not last and Message.objects.filter(conversation_id=conversation_id, agent_name='arbiter').exists():
+        last = 1
+    return (last or 0) + 1
+
+
+def previous_roster(conversation_id: str) -> Optional[str]:
+    """
+    Roster the conversation last ran with, if it is still configured.
+    """
+    metadata = (Message.objects.filter(conversation_id=conversation_id)
+                .exclude(agent_name='user').order_by('-timestamp')
+                .values_list('metadata', flat=True).first())
+    roster = (metadata or {}).get("roster")
+    return roster if roster in roster_names() else None
+
+
+def _exchanges(conversation_id: str) -> List[dict]:
+    """
+    Stored messages split into exchanges: {"question", "rounds", "answer"}.
+    Conversations started before questions were stored fall back to the title.
+    """
+    rows = (Message.objects.filter(conversation_id=conversation_id)
+            .order_by('timestamp')
+            .values_list('agent_name', 'content', 'round_number', 'metadata'))
+    exchanges = []
+    current = None
+    for agent_name, content, round_num, metadata in rows.iterator():
+        if agent_name == 'user' or current is None:
+            question = content if agent_name == 'user' else (
+                Conversation.objects.filter(id=conversation_id).values_list('title', flat=True).first() or "")
+            current = {"question": question, "rounds": {}, "answer": None}
+            exchanges.append(current)
+            if agent_name == 'user':
+                continue
+        if agent_name == 'arbiter':
+            current["answer"] = content
+        elif not (metadata or {}).get("error"):
+            current["rounds"].setdefault(round_num, []).append((agent_name, content))
+    # The follow-up being started has no turns yet
+    if exchanges and not exchanges[-1]["rounds"] and exchanges[-1]["answer"] is None:
+        exchanges.pop()
+    return exchanges
+
+
+def _render(exchange: dict, with_rounds: bool) -> str:
+    turn_chars = _setting("DELIBERATION_FOLLOW_UP_TURN_CHARS", 300)
+    lines = [f"Question: {exchange['question']}"]
+    if with_rounds:
+        for round_num in sorted(exchange["rounds"]):
+            lines.append(f"Round {round_num}:")
+            for agent_name, content in exchange["rounds"][round_num]:
+                lines.append(f"- {agent_name}: {compact(content, turn_chars)}")
+    if exchange["answer"]:
+        lines.append(f"Arbiter answer:\n{exchange['answer']}")
+    else:
+        lines.append("Arbiter answer: (none, the deliberation did not finish)")
+    return "\n".join(lines)
+
+
+def follow_up_context(conversation_id: str) -> str:
+    exchanges = _exchanges(conversation_id)
+    if not exchanges:
+        return ""
+    limit = _setting("DELIBERATION_FOLLOW_UP_CONTEXT_CHARS", 6000)
+    blocks = [_render(e, True) for e in exchanges]
+
+    def over():
+        return sum(len(b) for b in blocks) > limit
+
+    # Shed detail oldest first: earlier round summaries, then earlier
+    # exchanges, then the latest exchange's rounds
+    earlier = range(len(exchanges) - 1)
+    for index in earlier:
+        if over():
+            blocks[index] = _render(exchanges[index], False)
+    for index in earlier:
+        if over():
+            blocks[index] = ""
+    if over():
+        blocks[-1] = _render(exchanges[-1], False)
+    return "\n\n".join(b for b in blocks if b)
+
+
+def follow_up_seed(conversation_id: str, question: str) -> str:
+    """
+    Content of the single human message a follow-up graph run starts from.
+    """
+    context = follow_up_context(conversation_id)
+    if not context:
+        return question
+    return f"{FOLLOW_UP_HEADER}\n{context}\n\n{FOLLOW_UP_QUESTION}\n{question}"
+
+
+def related_seed(related_id: str, question: str) -> str:
+    """
+    Seed for a new question that resembles an earlier deliberation.
+    """
+    exchanges = _exchanges(related_id)
+    if not exchanges or not exchanges[0]["answer"]:
+        return question
+    return f"{RELATED_HEADER}\n{_render(exchanges[0], False)}\n\nQUESTION:\n{question}"
@@ -1,60 +1,123 @@
 
-from langgraph.graph import StateGraph, END
+import threading
+
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
 from langgraph.checkpoint.memory import MemorySaver
 
 from agents.state import AgentState
+from utils import tracing
+from agents.roster import get_roster, default_roster_name
+from agents.budget import can_afford_round
 from agents.nodes import (
-    call_openai_node,
-    call_gemini_node,
-    call_deepseek_node,
-    arbiter_node,
+    make_seat_node,
+    make_sample_node,
+    make_arbiter_node,
     update_round_node
 )
 
-def router(state: AgentState):
-    current_round = state.get("current_round", 1)
-    max_rounds = state.get("max_rounds", 3)
-    
-    if current_round > max_rounds:
-        return "arbiter"
-    return "openai"
+def traced(name: str, node):
+    """
+    Records each run of a graph node as a span (utils/tracing.py).
+    """
+    def traced_node(state: AgentState):
+        with tracing.span(state.get("conversation_id"), f"node {name}", round=state.get("current_round")):
+            return node(state)
+    traced_node.__name__ = getattr(node, "__name__", name)
+    return traced_node
+
+def make_router(first_seat: str, seat_count: int):
+    def router(state: AgentState):
+        current_round = state.get("current_round", 1)
+        max_rounds = state.get("max_rounds", 3)
+
+        if current_round > max_rounds:
+            return "arbiter"
+        # Drop the remaining rounds if the latency budget can't cover another one
+        if not can_afford_round(state, seat_count):
+            return "arbiter"
+        return first_seat
+    return router
+
+def build_graph(roster_name: str = None):
+    roster = get_roster(roster_name)
+    seat_names = [seat["name"] for seat in roster["seats"]]
 
-def build_graph():
     workflow = StateGraph(AgentState)
-    
-    # Add Nodes
-    workflow.add_node("openai", call_openai_node)
-    workflow.add_node("gemini", call_gemini_node)
-    workflow.add_node("deepseek", call_deepseek_node)
-    workflow.add_node("update_round", update_round_node)
-    workflow.add_node("arbiter", arbiter_node)
-    
-    # Define Edges (Sequential Flow: OpenAI -> Gemini -> DeepSeek -> Update -> Check)
-    workflow.set_entry_point("openai") # Start directly with OpenAI? No, need to check round first?
-    # Actually, usually we set entry to a router or the first node.
-    # Let's set entry to a conditional edge or a dummy start. 
-    # But for simplicity, we can let user input handle init. 
-    # Default entry: OpenAI.
-    
-    workflow.add_edge("openai", "gemini")
-    workflow.add_edge("gemini", "deepseek")
-    workflow.add_edge("deepseek", "update_round")
-    
+
+    # Add Nodes: one per roster seat, in speaking order
+    for index, name in enumerate(seat_names):
+        workflow.add_node(name, traced(name, make_seat_node(roster, index)))
+    workflow.add_node("update_round", traced("update_round", update_round_node))
+    workflow.add_node("arbiter", traced("arbiter", make_arbiter_node(roster)))
+
+    # Define Edges (Sequential Flow: Seat 1 -> Seat 2 -> ... -> Update -> Check)
+    workflow.set_entry_point(seat_names[0])
+    for current, following in zip(seat_names, seat_names[1:]):
+        workflow.add_edge(current, following)
+    workflow.add_edge(seat_names[-1], "update_round")
+
     # Conditional Edge from Update Round
     workflow.add_conditional_edges(
         "update_round",
-        router,
+        make_router(seat_names[0], len(seat_names)),
         {
-            "openai": "openai",
+            seat_names[0]: seat_names[0],
             "arbiter": "arbiter"
         }
     )
-    
+
     workflow.add_edge("arbiter", END)
-    
+
     # Checkpointer
     memory = MemorySaver()
-    
+
     return workflow.compile(checkpointer=memory)
 
-agent_graph = build_graph()
+def fan_out_samples(state: AgentState):
+    """
+    One sample node run per round still to come; they all run in parallel.
+    """
+    first_round = state["current_round"]
+    return [
+        Send("sample", {**state, "sample": index, "current_round": round_num})
+        for index, round_num in enumerate(range(first_round, state["max_rounds"] + 1))
+    ]
+
+def build_self_consistency_graph(roster_name: str = None):
+    """
+    Self-consistency topology: independent samples in parallel, then a single
+    Arbiter pass that reconciles them (agents/consistency.py).
+    """
+    roster = get_roster(roster_name)
+
+    workflow = StateGraph(AgentState)
+    workflow.add_node("sample", traced("sample", make_sample_node(roster)))
+    workflow.add_node("arbiter", traced("arbiter", make_arbiter_node(roster, strategy="self_consistency")))
+
+    # START -> sample x k (parallel) -> Arbiter, once every sample is in
+    workflow.add_conditional_edges(START, fan_out_samples, ["sample"])
+    workflow.add_edge("sample", "arbiter")
+    workflow.add_edge("arbiter", END)
+
+    return workflow.compile(checkpointer=MemorySaver())
+
+GRAPH_BUILDERS = {
+    "rounds": build_graph,
+    "self_consistency": build_self_consistency_graph,
+}
+
+# Compiled lazily on first use (one graph per roster and strategy) so importing
+# this module (or anything that imports it) does not pay for graph construction.
+_agent_graphs = {}
+_agent_graph_lock = threading.Lock()
+
+def get_agent_graph(roster_name: str = None, strategy: str = "rounds"):
+    cache_key = (roster_name or default_roster_name(), strategy)
+    graph = _agent_graphs.get(cache_key)
+    if graph is None:
+        with _agent_graph_lock:
+            graph = _agent_graphs.get(cache_key)
+            if graph is None:
+                graph = _agent_graphs[cache_key] = GRAPH_BUILDERS[strategy](cache_key[0])
+    return graph
@@ -1,15 +1,30 @@
 
+import threading
+import time
 from typing import Dict, Any, List
-from google import genai
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
 from langchain_core.messages import HumanMessage, AIMessage, SystemMessage
 from django.conf import settings
+from django.db import connection
 
 # Local imports
 from utils.security import get_api_keys
 from utils.stream import publish_update, publish_chunk
-from agents.prompts import DELIBERATION_PROMPT, ARBITER_PROMPT
+from utils.cancellation import DeliberationCancelled, get_token
+from utils import tracing
+from agents.prompts import DELIBERATION_PROMPT, ARBITER_PROMPT, SAMPLE_PROMPT, RECONCILE_PROMPT
+from agents.providers import stream_chat
+from agents import budget, cassettes, routing
+from agents.consistency import agreement, sample_spec
+from agents.roster import (
+    DEFAULT_ARBITER,
+    FIRST_TURN_INSTRUCTION,
+    SEAT_TEMPERATURE,
+    ARBITER_TEMPERATURE,
+    seat_labels,
+    spec_key_name,
+    spec_label,
+    model_cost,
+)
 from agents.state import AgentState
 
 # Django imports (Needs to be run inside Django context)
@@ -18,22 +33,23 @@ try:
 except ImportError:
     pass # Handle potential import error if run outside Django context
 
-def save_and_publish(state: AgentState, agent_name: str, content: str):
+def save_and_publish(state: AgentState, agent_name: str, content: str, metadata: Dict[str, Any] = None):
     conversation_id = state.get("conversation_id")
     round_num = state.get("current_round", 0)
-    
+
     if not conversation_id:
         return
 
     # Save to DB
     try:
-        convo = Conversation.objects.get(id=conversation_id)
-        msg = Message.objects.create(
-            conversation=convo,
-            agent_name=agent_name.lower(),
-            content=content,
-            round_number=round_num
-        )
+        with tracing.span(conversation_id, "db insert", agent=agent_name):
+            Message.objects.create(
+                conversation_id=conversation_id,
+                agent_name=agent_name.lower(),
+                content=content,
+                round_number=round_num,
+                metadata=metadata or {}
+            )
     except Exception as e:
         print(f"Error saving message: {e}")
 
@@ -51,339 +67,322 @@ def get_keys(state: AgentState) -> Dict[str, str]:
         return {}
     return get_api_keys(conversation_id)
 
-def get_agent_names(keys: Dict[str, str]) -> Dict[str, str]:
-    return {
-        "openai": "llama 3.2" if not keys.get("openai") else "openai",
-        "gemini": "qwen 2.5" if not keys.get("gemini") else "gemini",
-        "deepseek": "phi 3" if not keys.get("deepseek") else "deepseek",
-    }
+def history_text(messages: List) -> str:
+    return "\n".join([f"{getattr(m, 'name', None) or 'Participant'}: {m.content}" for m in messages])
+
+def stream_turn(state: AgentState, agent_name: str, spec: dict, keys: Dict[str, str], messages: List,
+                temperature: float, round_num: int, fallback: str, time_slice=None):
+    """
+    Streams one model turn to the conversation channel.
+    Returns (content, metadata); metadata holds the per-turn model, latency
+    and token usage that ends up in Message.metadata.
+    With a time_slice (deadline, seconds) from agents.budget the turn gets a
+    matching max_tokens cap and is cut off gracefully at the deadline.
+    Raises DeliberationCancelled if the conversation is cancelled mid-stream.
+    """
+    convo_id = state.get("conversation_id")
+    key_name = spec_key_name(spec)
+    api_key = keys.get(key_name) if key_name else None
+
+    cancel = get_token(convo_id) if convo_id else None
+    if cancel:
+        cancel.raise_if_cancelled(force=True)
+
+    deadline = max_tokens = timeout = None
+    if time_slice:
+        deadline, timeout = time_slice
+        max_tokens = budget.max_tokens_for(spec, timeout)
 
-def call_openai_node(state: AgentState):
-    keys = get_keys(state)
-    openai_key = keys.get("openai")
-    
-    names = get_agent_names(keys)
-    agent_name = names["openai"]
-    
-    if not openai_key:
-        print(f"DEBUG: OpenAI key missing, attempt Local Model ({agent_name})")
-        llm = ChatOllama(
-            model="llama3.2:1b",
-            base_url="http://host.docker.internal:11434",
-            temperature=0.7
-        )
-    else:
-        llm = ChatOpenAI(api_key=openai_key, model="gpt-4o", temperature=0.7)
-    
-    peers = f"{names['gemini']}, {names['deepseek']}"
-    
-    # Lead Agent (Usually Llama in Round 1) gets a special turn instruction
-    turn_instruction = "You are the FIRST speaker. Provide an initial analysis." if state["current_round"] == 1 else "Review the discussion so far."
-    
-    prompt = DELIBERATION_PROMPT.format(
-        agent_name=agent_name,
-        peers=peers,
-        question=state["question"],
-        round_number=state["current_round"],
-        max_rounds=state["max_rounds"],
-        turn_instruction=turn_instruction
-    )
-    
-    messages = [SystemMessage(content=prompt)] + state["messages"]
-    
-    # Stream the response
     content = ""
-    convo_id = state["conversation_id"]
-    round_num = state["current_round"]
-    
+    usage = None
+    chunks = 0
+    ttft = None
+    error = None
+    truncated = False
+    # perf_counter marks for the timeline: first chunk of any kind, last token
+    first_chunk_at = last_token_at = None
+    publish_s = 0.0
+    started = time.perf_counter()
+    # The provider stream, or its recording / replay (agents/cassettes.py)
+    stream = cassettes.open_stream(convo_id, stream_chat, spec, api_key, messages, temperature,
+                                   max_tokens=max_tokens, timeout=timeout)
     try:
-        for chunk in llm.stream(messages):
-            token = chunk.content
+        for token, chunk_usage in stream:
+            if first_chunk_at is None:
+                first_chunk_at = time.perf_counter()
+            if cancel and cancel.cancelled():
+                # Stop paying for tokens nobody will read
+                stream.close()
+                raise DeliberationCancelled(cancel.reason)
+            if deadline and time.time() >= deadline:
+                # Out of time: keep what we have and move on
+                stream.close()
+                truncated = True
+                break
+            if chunk_usage:
+                usage = chunk_usage
+            if not token:
+                continue
+            if ttft is None:
+                ttft = time.perf_counter() - started
+            chunks += 1
             content += token
+            published = time.perf_counter()
             publish_chunk(convo_id, agent_name, token, round_num)
-        
+            last_token_at = time.perf_counter()
+            publish_s += last_token_at - published
+
         if not content.strip():
-            content = "Acknowledged. Proceeding with the analysis."
+            content = fallback
             publish_chunk(convo_id, agent_name, content, round_num)
-
-        response_msg = AIMessage(content=content, name=agent_name)
+    except DeliberationCancelled:
+        raise
     except Exception as e:
-        content = f"Local Error: {str(e)}"
-        response_msg = AIMessage(content=content, name=agent_name)
-    
-    save_and_publish(state, agent_name, content)
-    return {"messages": [response_msg]}
-
-def call_gemini_node(state: AgentState):
-    keys = get_keys(state)
-    gemini_key = keys.get("gemini")
-    
-    names = get_agent_names(keys)
-    agent_name = names["gemini"]
-    
-    if gemini_key:
-        try:
-            client = genai.Client(api_key=gemini_key)
-            peers = f"{names['openai']}, {names['deepseek']}"
-            turn_instruction = "Review the previous agent's findings."
-            prompt = DELIBERATION_PROMPT.format(
-                agent_name=agent_name,
-                peers=peers,
-                question=state["question"],
-                round_number=state["current_round"],
-                max_rounds=state["max_rounds"],
-                turn_instruction=turn_instruction
-            )
-
-            # Format history for Gemini
-            history_text = "\n".join([f"{m.name if hasattr(m, 'name') else 'Participant'}: {m.content}" for m in state["messages"]])
-            payload = f"{prompt}\n\nDISCUSSION HISTORY:\n{history_text}"
-            
-            # Stream Gemini
-            content = ""
-            convo_id = state["conversation_id"]
-            round_num = state["current_round"]
-            
-            for chunk in client.models.generate_content_stream(
-                model="gemini-2.0-flash",
-                contents=payload
-            ):
-                token = chunk.text
-                content += token
-                publish_chunk(convo_id, agent_name, token, round_num)
-                
+        if deadline and time.time() >= deadline:
+            # Client timeout hit the deadline before/while streaming
+            truncated = True
             if not content.strip():
-                content = "I agree with the consensus and have nothing further to add."
+                content = fallback
                 publish_chunk(convo_id, agent_name, content, round_num)
+        else:
+            error = str(e)
+            content = f"{spec_label(spec)} Error: {error}"
+    ended = time.perf_counter()
+    elapsed = ended - started
 
-            response_msg = AIMessage(content=content, name=agent_name)
-        except Exception as e:
-            content = f"Gemini Error: {str(e)}"
-            response_msg = AIMessage(content=content, name=agent_name)
-    else:
-        print(f"DEBUG: Gemini key missing, using Local ({agent_name})")
-        try:
-            llm = ChatOllama(
-                model="qwen2.5:1.5b",
-                base_url="http://host.docker.internal:11434",
-                temperature=0.7
-            )
-            peers = f"{names['openai']}, {names['deepseek']}"
-            turn_instruction = "Review the previous agent's findings."
-            prompt = DELIBERATION_PROMPT.format(
-                agent_name=agent_name,
-                peers=peers,
-                question=state["question"],
-                round_number=state["current_round"],
-                max_rounds=state["max_rounds"],
-                turn_instruction=turn_instruction
-            )
-            messages = [SystemMessage(content=prompt)] + state["messages"]
-            
-            # Stream Local Gemini (Qwen)
-            content = ""
-            convo_id = state["conversation_id"]
-            round_num = state["current_round"]
-            for chunk in llm.stream(messages):
-                token = chunk.content
-                content += token
-                publish_chunk(convo_id, agent_name, token, round_num)
-                
-            if not content.strip():
-                content = "I agree with the consensus and have nothing further to add."
-                publish_chunk(convo_id, agent_name, content, round_num)
+    # LLM call with connect / first token / streaming phases, per-token publishes summed up
+    llm_span = tracing.add_span(convo_id, f"llm {agent_name}", started, ended, provider=spec["provider"],
+                                model=spec["model"], round=round_num, chunks=chunks, error=error,
+                                publish_ms=round(publish_s * 1000, 3))
+    if llm_span:
+        first_token_at = started + ttft if ttft is not None else None
+        tracing.add_span(convo_id, "llm.connect", started, first_chunk_at, parent=llm_span)
+        tracing.add_span(convo_id, "llm.first_token", first_chunk_at, first_token_at, parent=llm_span)
+        tracing.add_span(convo_id, "llm.stream", first_token_at, last_token_at, parent=llm_span)
 
-            response_msg = AIMessage(content=content, name=agent_name)
+    # Providers that do not report usage get a rough estimate (~4 chars/token)
+    usage_estimated = not usage
+    if usage_estimated:
+        usage = {
+            "input_tokens": sum(len(str(m.content)) for m in messages) // 4,
+            "output_tokens": chunks,
+        }
+    input_tokens = int(usage.get("input_tokens", 0))
+    output_tokens = int(usage.get("output_tokens", 0))
+
+    metadata = {
+        "roster": state.get("roster") or "default",
+        "provider": spec["provider"],
+        "model": spec["model"],
+        "temperature": temperature,
+        "latency_ms": round(elapsed * 1000),
+        "ttft_ms": round(ttft * 1000) if ttft is not None else None,
+        "chunks": chunks,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "usage_estimated": usage_estimated,
+        "cost_usd": round(model_cost(spec["model"], input_tokens, output_tokens), 6),
+    }
+    if time_slice:
+        metadata["budget_s"] = round(timeout, 2)
+        metadata["max_tokens"] = max_tokens
+        metadata["truncated"] = truncated
+    if error:
+        metadata["error"] = error
+
+    # Shared per-model statistics for adaptive routing; replays would skew them
+    if not cassettes.replaying(convo_id):
+        try:
+            routing.record(spec, metadata)
         except Exception as e:
-            content = f"Local Error ({agent_name}): {str(e)}"
-            response_msg = AIMessage(content=content, name=agent_name)
-
-    save_and_publish(state, agent_name, content)
-    return {"messages": [response_msg]}
-
-def call_deepseek_node(state: AgentState):
-    keys = get_keys(state)
-    deepseek_key = keys.get("deepseek")
-    
-    names = get_agent_names(keys)
-    agent_name = names["deepseek"]
-    
-    if deepseek_key:
-        # Using OpenAI compatible endpoint for DeepSeek V3/R1
-        llm = ChatOpenAI(
-            api_key=deepseek_key, 
-            base_url="https://api.deepseek.com/v1",
-            model="deepseek-chat", 
-            temperature=0.7
+            print(f"Error recording model stats: {e}")
+    return content, metadata
+
+def make_seat_node(roster: dict, seat_index: int):
+    """
+    Builds the graph node for one roster seat.
+    """
+    seat = roster["seats"][seat_index]
+
+    def seat_node(state: AgentState):
+        keys = get_keys(state)
+        round_num = state["current_round"]
+        max_rounds = state["max_rounds"]
+
+        # Peers are named after their preferred models; with adaptive routing
+        # this seat may get another allowed model (agents/routing.py)
+        labels = seat_labels(roster, keys, round_num, max_rounds)
+        spec, decision = routing.route(seat, keys, round_num, max_rounds)
+        agent_name = spec_label(spec)
+        peers = ", ".join(label for name, label in labels.items() if name != seat["name"])
+
+        # Lead Agent gets a special turn instruction in Round 1
+        if seat_index == 0 and round_num == 1:
+            turn_instruction = roster.get("first_turn_instruction", FIRST_TURN_INSTRUCTION)
+        else:
+            turn_instruction = seat["turn_instruction"]
+
+        prompt = DELIBERATION_PROMPT.format(
+            agent_name=agent_name,
+            peers=peers,
+            question=state["question"],
+            round_number=round_num,
+            max_rounds=max_rounds,
+            turn_instruction=turn_instruction
         )
-    else:
-        print(f"DEBUG: DeepSeek key missing, using Local ({agent_name})")
-        llm = ChatOllama(
-            model="phi3:mini", 
-            base_url="http://host.docker.internal:11434",
-            temperature=0.7
+        messages = [SystemMessage(content=prompt)] + state["messages"]
+
+        content, metadata = stream_turn(
+            state, agent_name, spec, keys, messages,
+            temperature=spec.get("temperature", SEAT_TEMPERATURE),
+            round_num=round_num,
+            fallback=seat["fallback"],
+            time_slice=budget.seat_slice(state, seat_index, len(roster["seats"])),
         )
-    
-    peers = f"{names['openai']}, {names['gemini']}"
-    turn_instruction = "Review the perspectives from your peers."
-    prompt = DELIBERATION_PROMPT.format(
-        agent_name=agent_name,
-        peers=peers,
-        question=state["question"],
-        round_number=state["current_round"],
-        max_rounds=state["max_rounds"],
-        turn_instruction=turn_instruction
-    )
-
-    messages = [SystemMessage(content=prompt)] + state["messages"]
-    
-    # Stream DeepSeek
-    content = ""
-    convo_id = state["conversation_id"]
-    round_num = state["current_round"]
-    try:
-        for chunk in llm.stream(messages):
-            token = chunk.content
-            content += token
-            publish_chunk(convo_id, agent_name, token, round_num)
-            
-        if not content.strip():
-            content = "My analysis aligns with the current debate."
-            publish_chunk(convo_id, agent_name, content, round_num)
+        metadata["seat"] = seat["name"]
+        if decision:
+            metadata["routing"] = decision
 
-        response_msg = AIMessage(content=content, name=agent_name)
-    except Exception as e:
-        content = f"Error (DeepSeek/Local): {str(e)}"
-        response_msg = AIMessage(content=content, name=agent_name)
-    
-    save_and_publish(state, agent_name, content)
-    return {"messages": [response_msg]}
-
-
-def arbiter_node(state: AgentState):
-    keys = get_keys(state)
-    openai_key = keys.get("openai") # Use OpenAI for Arbiter usually
-    
-    agent_name = "Arbiter"
-    
-    names = get_agent_names(keys)
-    participants = f"{names['openai']}, {names['gemini']}, {names['deepseek']}"
-    
-    convo_id = state.get("conversation_id")
-    try:
-        if openai_key:
-            llm = ChatOpenAI(
-                api_key=openai_key,
-                model="gpt-4o",
-                temperature=0.2
-            )
-            prompt = ARBITER_PROMPT.format(
-                participants=participants,
-                question=state["question"]
+        save_and_publish(state, agent_name, content, metadata)
+        return {"messages": [AIMessage(content=content, name=agent_name)]}
+
+    seat_node.__name__ = f"{seat['name']}_node"
+    return seat_node
+
+def make_sample_node(roster: dict):
+    """
+    Builds the self-consistency sample node. The graph fans it out once per
+    sample (agents/graph.py); each copy gets its own `sample` index and round.
+    """
+    def sample_node(state: AgentState):
+        keys = get_keys(state)
+        index = state["sample"]
+        round_num = state["current_round"]
+        samples = state["max_rounds"] - round_num + index + 1
+
+        seat, _, temperature = sample_spec(roster, keys, index)
+        spec, decision = routing.route(seat, keys, 1, 1)
+        agent_name = spec_label(spec)
+        prompt = SAMPLE_PROMPT.format(agent_name=agent_name, sample=index + 1, samples=samples)
+        messages = [SystemMessage(content=prompt)] + state["messages"]
+
+        try:
+            content, metadata = stream_turn(
+                state, agent_name, spec, keys, messages,
+                temperature=temperature,
+                round_num=round_num,
+                fallback=seat["fallback"],
+                time_slice=budget.parallel_slice(state),
             )
+            metadata["seat"] = seat["name"]
+            metadata["strategy"] = "self_consistency"
+            metadata["sample"] = index + 1
+            if decision:
+                metadata["routing"] = decision
+
+            save_and_publish(state, agent_name, content, metadata)
+        finally:
+            # Samples run on the graph's worker threads, each with its own DB connection
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+        return {"messages": [AIMessage(content=content, name=agent_name)]}
+
+    return sample_node
+
+def make_arbiter_node(roster: dict, strategy: str = "rounds"):
+    arbiter = roster.get("arbiter", DEFAULT_ARBITER)
+
+    def arbiter_node(state: AgentState):
+        agent_name = "Arbiter"
+        convo_id = state.get("conversation_id")
+        try:
+            keys = get_keys(state)
+            max_rounds = state["max_rounds"]
+            turns = [m for m in state["messages"] if isinstance(m, AIMessage)]
+
+            if strategy == "self_consistency":
+                # Every sample is a complete answer
+                last_round = max_rounds
+                final_turns = turns
+                prompt = RECONCILE_PROMPT.format(
+                    samples=len(turns),
+                    participants=", ".join(dict.fromkeys(m.name for m in turns)),
+                    question=state["question"]
+                )
+                answers = "\n\n".join(f"ANSWER {n} ({m.name}):\n{m.content}" for n, m in enumerate(turns, 1))
+                history = f"INDEPENDENT ANSWERS:\n{answers}"
+            else:
+                # The router skips remaining rounds when the latency budget runs out
+                last_round = min(state.get("current_round", max_rounds + 1) - 1, max_rounds)
+                # The last round's seat turns are the seats' final answers
+                final_turns = turns[-len(roster["seats"]):]
+
+                labels = seat_labels(roster, keys, last_round, max_rounds)
+                prompt = ARBITER_PROMPT.format(
+                    participants=", ".join(labels.values()),
+                    question=state["question"]
+                )
+                history = f"DISCUSSION HISTORY:\n{history_text(state['messages'])}"
+            spec, decision = routing.route(arbiter, keys, max_rounds, max_rounds)
+
             # Standard history formatting for all models
-            history_text = "\n".join([f"{m.name if hasattr(m, 'name') else 'Participant'}: {m.content}" for m in state["messages"]])
             messages = [
                 SystemMessage(content=prompt),
-                HumanMessage(content=f"DISCUSSION HISTORY:\n{history_text}\n\nFinal Synthesis:")
+                HumanMessage(content=f"{history}\n\nFinal Synthesis:")
             ]
-            
-            # Stream Cloud Arbiter
-            content = ""
-            for chunk in llm.stream(messages):
-                token = chunk.content
-                content += token
-                publish_chunk(convo_id, agent_name, token, 0)
-            
-            if not content.strip():
-                content = "I have reviewed the deliberation and synthesized the consensus as provided in the summary."
-                publish_chunk(convo_id, agent_name, content, 0)
-                
-            response_msg = AIMessage(content=content, name=agent_name)
-        elif keys.get("gemini"):
-            print("DEBUG: OpenAI missing for Arbiter, falling back to Gemini")
-            client = genai.Client(api_key=keys.get("gemini"))
-            prompt = ARBITER_PROMPT.format(
-                participants=participants,
-                question=state["question"]
-            )
-            
-            # Format history for Gemini
-            history_text = "\n".join([f"{m.name if hasattr(m, 'name') else 'Participant'}: {m.content}" for m in state["messages"]])
-            payload = f"{prompt}\n\nDISCUSSION HISTORY:\n{history_text}\n\nFinal Synthesis:"
-
-            # Stream Gemini Arbiter
-            content = ""
-            for chunk in client.models.generate_content_stream(
-                model="gemini-2.0-flash",
-                contents=payload
-            ):
-                token = chunk.text
-                content += token
-                publish_chunk(convo_id, agent_name, token, 0)
-            
-            if not content.strip():
-                content = "I have reviewed the deliberation and synthesized the consensus as provided in the summary."
-                publish_chunk(convo_id, agent_name, content, 0)
 
-            response_msg = AIMessage(content=content, name=agent_name)
-        else:
-            print("DEBUG: Cloud keys missing, using Local (Llama 3.2 3B) for Arbiter")
-            llm = ChatOllama(
-                model="llama3.2:3b",
-                base_url="http://host.docker.internal:11434",
-                temperature=0.2
+            content, metadata = stream_turn(
+                state, agent_name, spec, keys, messages,
+                temperature=spec.get("temperature", ARBITER_TEMPERATURE),
+                round_num=0,
+                fallback=arbiter["fallback"],
+                time_slice=budget.arbiter_slice(state),
             )
-            prompt = ARBITER_PROMPT.format(
-                participants=participants,
-                question=state["question"]
-            )
-            # Standard history formatting for Local Arbiter
-            history_text = "\n".join([f"{m.name if hasattr(m, 'name') else 'Participant'}: {m.content}" for m in state["messages"]])
-            messages = [
-                SystemMessage(content=prompt),
-                HumanMessage(content=f"DISCUSSION HISTORY:\n{history_text}\n\nFinal Synthesis:")
-            ]
-            
-            # Stream Local Arbiter
-            content = ""
-            for chunk in llm.stream(messages):
-                token = chunk.content
-                content += token
-                publish_chunk(convo_id, agent_name, token, 0)
-                
-            if not content.strip():
-                content = "I have reviewed the deliberation and synthesized the consensus as provided in the summary."
-                publish_chunk(convo_id, agent_name, content, 0)
+            if metadata.get("error"):
+                raise RuntimeError(metadata["error"])
+            metadata["seat"] = "arbiter"
+            metadata["strategy"] = strategy
+            if decision:
+                metadata["routing"] = decision
+            if strategy == "self_consistency":
+                metadata["samples"] = len(turns)
+            if last_round < max_rounds:
+                metadata["dropped_rounds"] = max_rounds - last_round
+            metadata.update(agreement([m.content for m in final_turns]))
+            if state.get("started_at"):
+                metadata["elapsed_ms"] = round((time.time() - state["started_at"]) * 1000)
 
-            response_msg = AIMessage(content=content, name=agent_name)
+            # Save to DB with round 0
+            try:
+                with tracing.span(convo_id, "db insert", agent=agent_name):
+                    Message.objects.create(
+                        conversation_id=convo_id,
+                        agent_name=agent_name.lower(),
+                        content=content,
+                        round_number=0,
+                        metadata=metadata
+                    )
+            except Exception as e:
+                print(f"Error saving arbiter message: {e}")
 
-        # Save to DB with round 0
-        try:
-            convo = Conversation.objects.get(id=convo_id)
-            Message.objects.create(
-                conversation=convo,
-                agent_name=agent_name.lower(),
-                content=content,
-                round_number=0
-            )
+            publish_update(convo_id, {
+                "type": "final",
+                "result": content
+            })
+            return {"messages": [AIMessage(content=content, name=agent_name)], "final_answer": content}
+
+        except DeliberationCancelled:
+            raise
         except Exception as e:
-            print(f"Error saving arbiter message: {e}")
-
-        publish_update(convo_id, {
-            "type": "final",
-            "result": content
-        })
-        return {"messages": [response_msg], "final_answer": content}
-            
-    except Exception as e:
-        print(f"Error in Arbiter: {str(e)}")
-        error_msg = f"Arbiter Error: {str(e)}"
-        publish_update(convo_id, {
-            "type": "final",
-            "result": error_msg
-        })
-        return {"messages": [AIMessage(content=error_msg, name=agent_name)], "final_answer": error_msg}
+            print(f"Error in Arbiter: {str(e)}")
+            error_msg = f"Arbiter Error: {str(e)}"
+            publish_update(convo_id, {
+                "type": "final",
+                "result": error_msg
+            })
+            return {"messages": [AIMessage(content=error_msg, name=agent_name)], "final_answer": error_msg}
+
+    return arbiter_node
 
 
 def update_round_node(state: AgentState):
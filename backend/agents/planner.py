@@ -0,0 +1,175 @@
+
+import json
+import math
+import os
+import re
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+from agents.roster import roster_names
+
+# Upfront round planning. Most questions don't need the 3 rounds users pick by
+# default; before a deliberation starts, a cheap local classifier estimates
+# how hard the question is from lexical cues and its length / structure, and
+# maps the difficulty to a tier:
+#
+#   simple     factual / definitional (1 round by default)
+#   moderate   a few aspects to weigh (2 rounds)
+#   complex    design, trade-offs, multi-part questions (the requested rounds)
+#
+# The planned rounds never exceed the ones requested (DELIBERATION_TIER_ROUNDS
+# caps per tier), and a tier may also switch to another roster when the
+# request did not name one (DELIBERATION_TIER_ROSTERS, e.g. simple=light).
+#
+# The classifier is a logistic model over features(). It starts from
+# hand-set DEFAULT_WEIGHTS; `manage.py round_plan_report --fit <file>` fits
+# weights on past deliberations instead, which are picked up from
+# DELIBERATION_PLANNER_WEIGHTS. With DELIBERATION_ROUND_PLANNING = "shadow"
+# plans are recorded but not applied, so the full deliberations show how many
+# rounds each question actually needed (see round_plan_report).
+#
+# The plan is stored on the question Message (metadata["plan"]). Plain Python
+# only: it runs in the web tier.
+
+MODES = ["off", "shadow", "on"]
+TIERS = ["simple", "moderate", "complex"]
+
+COMPLEX_CUES = {
+    "why", "how", "should", "design", "architecture", "compare", "comparison", "tradeoff", "tradeoffs",
+    "trade", "versus", "vs", "evaluate", "analyze", "analyse", "strategy", "optimize", "optimise", "prove",
+    "implications", "risks", "pros", "cons", "recommend", "approach", "impact", "justify", "critique",
+    "alternatives", "migrate", "scale", "ethical", "predict",
+}
+SIMPLE_CUES = {"define", "definition", "translate", "spell", "capital", "convert", "synonym", "acronym", "date"}
+CONNECTIVES = {"and", "or", "but", "while", "whereas", "although", "however", "if", "unless", "given", "assuming"}
+
+_WORD = re.compile(r"[\w'-]+")
+_SENTENCE = re.compile(r"[.!?]+(?:\s|$)")
+_LIST_ITEM = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s+", re.MULTILINE)
+_FACTOID = re.compile(r"^\s*(?:who|when|where|which)\b|^\s*what\s+(?:is|are|was|were)\b"
+                      r"|^\s*how\s+(?:many|much|old|long|far|tall)\b", re.IGNORECASE)
+_CODE = re.compile(r"```|`[^`]+`|\b(?:def|class|function|SELECT|import)\b|[{};]\s*$", re.MULTILINE)
+
+# Logistic weights over features(); the bias keeps a short plain question simple
+DEFAULT_WEIGHTS = {
+    "bias": -2.4,
+    "weights": {
+        "log_words": 0.9,
+        "sentences": 0.25,
+        "questions": 0.35,
+        "complex_cues": 0.8,
+        "simple_cues": -0.9,
+        "factoid": -1.6,
+        "connectives": 0.3,
+        "list_items": 0.4,
+        "code": 1.0,
+        "numbers": 0.1,
+    },
+}
+
+_loaded = {"path": None, "mtime": None, "model": None}
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def features(question: str) -> Dict[str, float]:
+    words = [w.lower() for w in _WORD.findall(question)]
+    return {
+        "log_words": math.log1p(len(words)),
+        "sentences": min(len(_SENTENCE.findall(question)) or 1, 10),
+        "questions": min(question.count("?"), 5),
+        "complex_cues": min(sum(w in COMPLEX_CUES for w in words), 5),
+        "simple_cues": min(sum(w in SIMPLE_CUES for w in words), 3),
+        "factoid": float(bool(_FACTOID.match(question))),
+        "connectives": min(sum(w in CONNECTIVES for w in words), 8),
+        "list_items": min(len(_LIST_ITEM.findall(question)), 10),
+        "code": float(bool(_CODE.search(question))),
+        "numbers": min(sum(w.isdigit() for w in words), 10),
+    }
+
+
+def load_model() -> dict:
+    """
+    Fitted weights from DELIBERATION_PLANNER_WEIGHTS (reloaded when the file
+    changes), or DEFAULT_WEIGHTS.
+    """
+    path = _setting("DELIBERATION_PLANNER_WEIGHTS", "")
+    if not path or not os.path.exists(path):
+        return DEFAULT_WEIGHTS
+    mtime = os.path.getmtime(path)
+    if _loaded["path"] != path or _loaded["mtime"] != mtime:
+        try:
+            with open(path) as fh:
+                model = json.load(fh)
+            model["weights"] = {k: float(v) for k, v in model["weights"].items()}
+            model["bias"] = float(model["bias"])
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Error loading planner weights {path}: {e}")
+            model = DEFAULT_WEIGHTS
+        _loaded.update(path=path, mtime=mtime, model=model)
+    return _loaded["model"]
+
+
+def difficulty(feats: Dict[str, float], model: dict = None) -> float:
+    """
+    Estimated probability that the question needs more than one round.
+    """
+    model = model or load_model()
+    z = model["bias"] + sum(w * feats.get(name, 0.0) for name, w in model["weights"].items())
+    return 1 / (1 + math.exp(-max(min(z, 30), -30)))
+
+
+def tier_for(score: float) -> str:
+    simple_below, complex_from = _setting("DELIBERATION_PLANNER_THRESHOLDS", (0.35, 0.65))
+    if score < simple_below:
+        return "simple"
+    return "moderate" if score < complex_from else "complex"
+
+
+def plan_rounds(question: str, requested: int, roster: Optional[str] = None) -> dict:
+    """
+    The plan for a new question: {"tier", "difficulty", "requested_rounds",
+    "planned_rounds", "roster"}. `roster` is the one the request named; a
+    tier roster only applies when it named none.
+    """
+    score = difficulty(features(question))
+    tier = tier_for(score)
+    tier_rounds = _setting("DELIBERATION_TIER_ROUNDS", {"simple": 1, "moderate": 2, "complex": 5})
+    if not roster:
+        roster = _setting("DELIBERATION_TIER_ROSTERS", {}).get(tier)
+        if roster not in roster_names():
+            roster = None
+    return {
+        "tier": tier,
+        "difficulty": round(score, 4),
+        "requested_rounds": requested,
+        "planned_rounds": max(1, min(requested, int(tier_rounds.get(tier, requested)))),
+        "roster": roster,
+    }
+
+
+def fit(samples: List[tuple], epochs: int = 400, rate: float = 0.1, l2: float = 0.01) -> dict:
+    """
+    Logistic regression on (features, needed more than one round) pairs, by
+    batch gradient descent from DEFAULT_WEIGHTS. Returns the weights file
+    contents.
+    """
+    names = list(DEFAULT_WEIGHTS["weights"])
+    bias = DEFAULT_WEIGHTS["bias"]
+    weights = dict(DEFAULT_WEIGHTS["weights"])
+    n = len(samples)
+    for _ in range(epochs):
+        grad_bias = 0.0
+        grads = dict.fromkeys(names, 0.0)
+        for feats, label in samples:
+            error = difficulty(feats, {"bias": bias, "weights": weights}) - float(label)
+            grad_bias += error
+            for name in names:
+                grads[name] += error * feats.get(name, 0.0)
+        bias -= rate * grad_bias / n
+        for name in names:
+            weights[name] -= rate * (grads[name] / n + l2 * weights[name])
+    return {"bias": round(bias, 4), "weights": {k: round(v, 4) for k, v in weights.items()}, "samples": n}
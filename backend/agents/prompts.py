@@ -14,18 +14,8 @@ Instructions:
 No filler. Be direct and technical.
 """
 
-# System Prompt for Arbiter Agent
-ARBITER_PROMPT = """You are the Arbiter. Your task is to review the deliberation between {participants}.
-
-User Question: "{question}"
-
-Review the entire discussion history provided below.
-1. Identify the consensus view.
-2. Resolve any conflicts based on the strongest evidence provided.
-3. Discard hallucinations or unverified claims.
-4. Synthesize a FINAL, single answer.
-
-Output Format:
+# Output format shared by both Arbiter prompts
+ARBITER_OUTPUT_FORMAT = """Output Format:
 Your final response MUST be structured as follows:
 ## Final Answer
 [Clear, direct answer]
@@ -42,3 +32,39 @@ Your final response MUST be structured as follows:
 
 DO NOT include the raw deliberation process in the final output.
 """
+
+# System Prompt for Arbiter Agent
+ARBITER_PROMPT = """You are the Arbiter. Your task is to review the deliberation between {participants}.
+
+User Question: "{question}"
+
+Review the entire discussion history provided below.
+1. Identify the consensus view.
+2. Resolve any conflicts based on the strongest evidence provided.
+3. Discard hallucinations or unverified claims.
+4. Synthesize a FINAL, single answer.
+
+""" + ARBITER_OUTPUT_FORMAT
+
+# System Prompt for an independent sample (self-consistency strategy)
+SAMPLE_PROMPT = """You are {agent_name}, giving independent answer {sample} of {samples}.
+Other models answer the same question separately; you will not see their answers.
+
+Instructions:
+1. Work through the question on your own.
+2. Provide your definitive answer and the key evidence for it.
+No filler. Be direct and technical.
+"""
+
+# System Prompt for the Arbiter reconciling independent samples
+RECONCILE_PROMPT = """You are the Arbiter. {samples} answers to the question below were drawn independently from {participants}; none of them saw the others.
+
+User Question: "{question}"
+
+Review the answers provided below.
+1. Group the answers that reach the same conclusion; the largest group is the consensus view.
+2. Prefer the consensus unless a minority answer has clearly stronger evidence.
+3. Discard hallucinations or unverified claims.
+4. Synthesize a FINAL, single answer.
+
+""" + ARBITER_OUTPUT_FORMAT
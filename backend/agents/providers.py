@@ -0,0 +1,117 @@
+
+# Provider SDKs are heavy (google.genai, langchain_openai, langchain_ollama pull in
+# httpx, pydantic models, tokenizers...). They are only imported when a node
+# actually needs a client, so the web tier never pays for them.
+
+OLLAMA_BASE_URL = "http://host.docker.internal:11434"
+
+
+def get_openai_chat(**kwargs):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(**kwargs)
+
+
+def get_ollama_chat(**kwargs):
+    from langchain_ollama import ChatOllama
+    kwargs.setdefault("base_url", OLLAMA_BASE_URL)
+    return ChatOllama(**kwargs)
+
+
+def get_genai_client(api_key: str):
+    from google import genai
+    return genai.Client(api_key=api_key)
+
+DEEPSEEK_BASE_URL = "https://api.deepseek.com/v1"
+
+
+def build_chat_model(spec: dict, api_key, temperature: float, max_tokens: int = None, timeout: float = None):
+    """
+    LangChain chat model for an openai / deepseek / ollama model spec.
+    max_tokens / timeout are only set when a latency budget applies.
+    """
+    provider = spec["provider"]
+    if provider in ("openai", "deepseek"):
+        kwargs = {"api_key": api_key, "model": spec["model"], "temperature": temperature, "stream_usage": True}
+        if provider == "deepseek":
+            # OpenAI compatible endpoint for DeepSeek V3/R1
+            kwargs["base_url"] = DEEPSEEK_BASE_URL
+        if max_tokens:
+            kwargs["max_tokens"] = max_tokens
+        if timeout:
+            kwargs["timeout"] = timeout
+            kwargs["max_retries"] = 0
+        return get_openai_chat(**kwargs)
+    if provider == "ollama":
+        kwargs = {"model": spec["model"], "temperature": temperature}
+        if max_tokens:
+            kwargs["num_predict"] = max_tokens
+        if timeout:
+            kwargs["client_kwargs"] = {"timeout": timeout}
+        return get_ollama_chat(**kwargs)
+    raise ValueError(f"Unknown provider: {provider}")
+
+
+def genai_payload(messages) -> str:
+    """
+    Gemini gets a single prompt: the system prompt followed by the discussion.
+    A lone unnamed human message (the Arbiter's request) is passed through as is.
+    """
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    system = "\n\n".join(m.content for m in messages if isinstance(m, SystemMessage))
+    rest = [m for m in messages if not isinstance(m, SystemMessage)]
+    if len(rest) == 1 and isinstance(rest[0], HumanMessage) and not rest[0].name:
+        body = rest[0].content
+    else:
+        history = "\n".join(f"{getattr(m, 'name', None) or 'Participant'}: {m.content}" for m in rest)
+        body = f"DISCUSSION HISTORY:\n{history}"
+    return f"{system}\n\n{body}"
+
+
+def stream_chat(spec: dict, api_key, messages, temperature: float, max_tokens: int = None, timeout: float = None):
+    """
+    Streams a chat completion for `spec`, yielding (text, usage) pairs.
+    usage is None except on chunks that carry token counts
+    ({"input_tokens": .., "output_tokens": ..}); the last one wins.
+
+    Closing this generator closes the upstream HTTP stream right away.
+    """
+    if spec["provider"] == "gemini":
+        client = get_genai_client(api_key=api_key)
+        config = {"temperature": temperature}
+        if max_tokens:
+            config["max_output_tokens"] = max_tokens
+        if timeout:
+            config["http_options"] = {"timeout": int(timeout * 1000)}
+        upstream = client.models.generate_content_stream(
+            model=spec["model"],
+            contents=genai_payload(messages),
+            config=config,
+        )
+        try:
+            for chunk in upstream:
+                usage = None
+                meta = getattr(chunk, "usage_metadata", None)
+                if meta is not None and meta.candidates_token_count:
+                    usage = {
+                        "input_tokens": meta.prompt_token_count or 0,
+                        "output_tokens": meta.candidates_token_count or 0,
+                    }
+                yield chunk.text or "", usage
+        finally:
+            _close(upstream)
+        return
+
+    llm = build_chat_model(spec, api_key, temperature, max_tokens=max_tokens, timeout=timeout)
+    upstream = llm.stream(messages)
+    try:
+        for chunk in upstream:
+            yield chunk.content, chunk.usage_metadata
+    finally:
+        _close(upstream)
+
+
+def _close(upstream):
+    close = getattr(upstream, "close", None)
+    if close is not None:
+        close()
@@ -0,0 +1,313 @@
+
+import json
+import os
+from typing import Dict, List, Optional
+
+from django.conf import settings
+
+# An agent roster describes the seats of a deliberation and which model each
+# seat uses in each round. It is plain data (no SDK imports) so the web tier
+# can validate roster names and resolve providers without loading the agents.
+#
+# Seat:
+#   name               graph node name, unique within the roster
+#   turn_instruction   instruction given to the seat every round
+#   fallback           content used when the model returns nothing
+#   models             {round selector: [model spec, ...]}
+#
+# Round selectors are tried in order: the exact round number ("2"), "last"
+# (final round), "first" (round 1), then "default". Within a selector the
+# first model spec whose API key was supplied wins, so lists should end with
+# a local (ollama) model that needs no key.
+#
+# Model spec:
+#   provider      openai | deepseek | gemini | ollama
+#   model         provider model id
+#   label         name shown in the UI / stored as Message.agent_name
+#   temperature   optional, defaults to the seat (0.7) or arbiter (0.2) value
+#   quality       optional 0-100, defaults to PROVIDER_QUALITY; adaptive routing
+#                 (agents/routing.py) only trades quality for speed within a
+#                 slack, and never below a seat's optional "min_quality"
+
+PROVIDER_KEYS = {
+    "openai": "openai",
+    "deepseek": "deepseek",
+    "gemini": "gemini",
+    "ollama": None,
+}
+
+# Default model quality per provider, used by adaptive routing
+PROVIDER_QUALITY = {
+    "openai": 80,
+    "deepseek": 80,
+    "gemini": 80,
+    "ollama": 50,
+}
+
+SEAT_TEMPERATURE = 0.7
+ARBITER_TEMPERATURE = 0.2
+
+FIRST_TURN_INSTRUCTION = "You are the FIRST speaker. Provide an initial analysis."
+
+# USD per 1M (input, output) tokens, used for per-deliberation cost reports.
+# Local models are free. Override/extend with settings.DELIBERATION_MODEL_PRICING.
+MODEL_PRICING = {
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.0-flash-lite": (0.075, 0.30),
+    "deepseek-chat": (0.27, 1.10),
+}
+
+DEFAULT_ARBITER = {
+    "fallback": "I have reviewed the deliberation and synthesized the consensus as provided in the summary.",
+    "models": {
+        "default": [
+            {"provider": "openai", "model": "gpt-4o"},
+            {"provider": "gemini", "model": "gemini-2.0-flash"},
+            {"provider": "ollama", "model": "llama3.2:3b", "label": "llama 3.2"},
+        ],
+    },
+}
+
+BUILTIN_ROSTERS = {
+    # The original three seats
+    "default": {
+        "seats": [
+            {
+                "name": "openai",
+                "turn_instruction": "Review the discussion so far.",
+                "fallback": "Acknowledged. Proceeding with the analysis.",
+                "models": {
+                    "default": [
+                        {"provider": "openai", "model": "gpt-4o"},
+                        {"provider": "ollama", "model": "llama3.2:1b", "label": "llama 3.2"},
+                    ],
+                },
+            },
+            {
+                "name": "gemini",
+                "turn_instruction": "Review the previous agent's findings.",
+                "fallback": "I agree with the consensus and have nothing further to add.",
+                "models": {
+                    "default": [
+                        {"provider": "gemini", "model": "gemini-2.0-flash"},
+                        {"provider": "ollama", "model": "qwen2.5:1.5b", "label": "qwen 2.5"},
+                    ],
+                },
+            },
+            {
+                "name": "deepseek",
+                "turn_instruction": "Review the perspectives from your peers.",
+                "fallback": "My analysis aligns with the current debate.",
+                "models": {
+                    "default": [
+                        {"provider": "deepseek", "model": "deepseek-chat"},
+                        {"provider": "ollama", "model": "phi3:mini", "label": "phi 3"},
+                    ],
+                },
+            },
+        ],
+        "arbiter": DEFAULT_ARBITER,
+    },
+    # Small/fast models draft, the larger ones only take the final round
+    "tiered": {
+        "seats": [
+            {
+                "name": "openai",
+                "turn_instruction": "Review the discussion so far.",
+                "fallback": "Acknowledged. Proceeding with the analysis.",
+                "models": {
+                    "default": [
+                        {"provider": "openai", "model": "gpt-4o-mini"},
+                        {"provider": "ollama", "model": "llama3.2:1b", "label": "llama 3.2"},
+                    ],
+                    "last": [
+                        {"provider": "openai", "model": "gpt-4o"},
+                        {"provider": "ollama", "model": "llama3.2:3b", "label": "llama 3.2"},
+                    ],
+                },
+            },
+            {
+                "name": "gemini",
+                "turn_instruction": "Review the previous agent's findings.",
+                "fallback": "I agree with the consensus and have nothing further to add.",
+                "models": {
+                    "default": [
+                        {"provider": "gemini", "model": "gemini-2.0-flash-lite"},
+                        {"provider": "ollama", "model": "qwen2.5:0.5b", "label": "qwen 2.5"},
+                    ],
+                    "last": [
+                        {"provider": "gemini", "model": "gemini-2.0-flash"},
+                        {"provider": "ollama", "model": "qwen2.5:1.5b", "label": "qwen 2.5"},
+                    ],
+                },
+            },
+            {
+                "name": "deepseek",
+                "turn_instruction": "Review the perspectives from your peers.",
+                "fallback": "My analysis aligns with the current debate.",
+                "models": {
+                    "default": [
+                        {"provider": "deepseek", "model": "deepseek-chat"},
+                        {"provider": "ollama", "model": "phi3:mini", "label": "phi 3"},
+                    ],
+                },
+            },
+        ],
+        "arbiter": DEFAULT_ARBITER,
+    },
+    # Small models only, for questions planned as simple (agents/planner.py)
+    "light": {
+        "seats": [
+            {
+                "name": "openai",
+                "turn_instruction": "Review the discussion so far.",
+                "fallback": "Acknowledged. Proceeding with the analysis.",
+                "models": {
+                    "default": [
+                        {"provider": "openai", "model": "gpt-4o-mini"},
+                        {"provider": "ollama", "model": "llama3.2:1b", "label": "llama 3.2"},
+                    ],
+                },
+            },
+            {
+                "name": "gemini",
+                "turn_instruction": "Review the previous agent's findings.",
+                "fallback": "I agree with the consensus and have nothing further to add.",
+                "models": {
+                    "default": [
+                        {"provider": "gemini", "model": "gemini-2.0-flash-lite"},
+                        {"provider": "ollama", "model": "qwen2.5:0.5b", "label": "qwen 2.5"},
+                    ],
+                },
+            },
+        ],
+        "arbiter": {
+            "fallback": DEFAULT_ARBITER["fallback"],
+            "models": {
+                "default": [
+                    {"provider": "openai", "model": "gpt-4o-mini"},
+                    {"provider": "gemini", "model": "gemini-2.0-flash-lite"},
+                    {"provider": "ollama", "model": "llama3.2:3b", "label": "llama 3.2"},
+                ],
+            },
+        },
+    },
+}
+
+
+class RosterError(ValueError):
+    pass
+
+
+def _configured_rosters() -> Dict[str, dict]:
+    rosters = dict(BUILTIN_ROSTERS)
+    rosters.update(getattr(settings, "DELIBERATION_ROSTERS", {}) or {})
+    path = getattr(settings, "DELIBERATION_ROSTERS_FILE", "")
+    if path and os.path.exists(path):
+        with open(path) as fh:
+            rosters.update(json.load(fh))
+    return rosters
+
+
+def roster_names() -> List[str]:
+    return sorted(_configured_rosters())
+
+
+def default_roster_name() -> str:
+    return getattr(settings, "DELIBERATION_DEFAULT_ROSTER", "default")
+
+
+def get_roster(name: Optional[str] = None) -> dict:
+    name = name or default_roster_name()
+    rosters = _configured_rosters()
+    if name not in rosters:
+        raise RosterError(f"Unknown roster: {name}")
+    roster = rosters[name]
+    if not roster.get("seats"):
+        raise RosterError(f"Roster {name} has no seats")
+    return roster
+
+
+def candidates_for_round(entry: dict, round_num: int, max_rounds: int) -> List[dict]:
+    """
+    Returns the model specs a seat (or the arbiter) may use in `round_num`.
+    """
+    models = entry["models"]
+    selectors = [str(round_num)]
+    if round_num == max_rounds:
+        selectors.append("last")
+    if round_num == 1:
+        selectors.append("first")
+    selectors.append("default")
+    for selector in selectors:
+        if selector in models:
+            return models[selector]
+    raise RosterError(f"No models configured for round {round_num} of {entry.get('name', 'arbiter')}")
+
+
+def spec_key_name(spec: dict) -> Optional[str]:
+    return spec.get("key", PROVIDER_KEYS.get(spec["provider"]))
+
+
+def allowed_candidates(candidates: List[dict], keys: Dict[str, str]) -> List[dict]:
+    """
+    Filters model specs down to the ones the supplied API keys unlock.
+    """
+    allowed = []
+    for spec in candidates:
+        key_name = spec_key_name(spec)
+        if key_name is None or keys.get(key_name):
+            allowed.append(spec)
+    return allowed
+
+
+def resolve_model(entry: dict, keys: Dict[str, str], round_num: int, max_rounds: int) -> dict:
+    allowed = allowed_candidates(candidates_for_round(entry, round_num, max_rounds), keys)
+    if not allowed:
+        raise RosterError(f"No usable model for {entry.get('name', 'arbiter')} in round {round_num}")
+    return allowed[0]
+
+
+def model_quality(spec: dict) -> int:
+    return spec.get("quality", PROVIDER_QUALITY.get(spec["provider"], 50))
+
+
+def spec_label(spec: dict) -> str:
+    return spec.get("label") or spec["provider"]
+
+
+def seat_labels(roster: dict, keys: Dict[str, str], round_num: int, max_rounds: int) -> Dict[str, str]:
+    """
+    Seat name -> display name for the models resolved in `round_num`.
+    """
+    return {
+        seat["name"]: spec_label(resolve_model(seat, keys, round_num, max_rounds))
+        for seat in roster["seats"]
+    }
+
+
+def model_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    pricing = dict(MODEL_PRICING)
+    pricing.update(getattr(settings, "DELIBERATION_MODEL_PRICING", {}) or {})
+    if model not in pricing:
+        return 0.0
+    price_in, price_out = pricing[model]
+    return (input_tokens * price_in + output_tokens * price_out) / 1_000_000
+
+
+def resolved_providers(roster: dict, keys: Dict[str, str], max_rounds: int) -> List[list]:
+    """
+    [seat, round, provider, model] for every turn the keys would unlock,
+    Arbiter included (round 0). Two requests with the same plan run the same
+    models, which is what single-flight sharing is keyed on.
+    """
+    plan = []
+    for round_num in range(1, max_rounds + 1):
+        for seat in roster["seats"]:
+            spec = resolve_model(seat, keys, round_num, max_rounds)
+            plan.append([seat["name"], round_num, spec["provider"], spec["model"]])
+    spec = resolve_model(roster.get("arbiter", DEFAULT_ARBITER), keys, max_rounds, max_rounds)
+    plan.append(["arbiter", 0, spec["provider"], spec["model"]])
+    return plan
@@ -0,0 +1,151 @@
+
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+import redis
+from django.conf import settings
+
+from agents.roster import (
+    allowed_candidates,
+    candidates_for_round,
+    model_quality,
+    resolve_model,
+)
+
+# Latency-aware model routing. Every finished turn updates rolling (EWMA)
+# statistics for its (provider, model) in Redis, shared by all workers: time
+# to first token, streaming tokens/second, answer length and error rate.
+#
+# With DELIBERATION_ROUTING = "adaptive" each turn picks, among the models the
+# request's API keys unlock for that seat and round, the one expected to
+# finish first: (ttft + tokens / tps) / (1 - error rate). Quality constraints
+# come first: models erroring more than DELIBERATION_ROUTING_MAX_ERROR_RATE
+# are skipped, and only models within DELIBERATION_ROUTING_QUALITY_SLACK of
+# the best remaining quality (roster.model_quality; a seat may also set
+# "min_quality") compete on speed. Each of those first gets
+# DELIBERATION_ROUTING_MIN_SAMPLES turns to build up statistics, and a small
+# share of turns (DELIBERATION_ROUTING_EXPLORE) goes to a random model of
+# sufficient quality, skipped ones included, so the statistics stay current.
+#
+# "fixed" (the default) keeps the roster's first usable model. The decision
+# and the estimates behind it are stored in Message.metadata["routing"].
+
+# Redis client for the shared model statistics
+redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+
+# EWMA update of one model's statistics; empty values are left alone
+_RECORD_SCRIPT = redis_client.register_script("""
+local alpha = tonumber(ARGV[1])
+local fields = {'error_rate', 'ttft', 'tps', 'tokens'}
+for i, field in ipairs(fields) do
+    local x = ARGV[i + 1]
+    if x ~= '' then
+        x = tonumber(x)
+        local current = redis.call('HGET', KEYS[1], field)
+        if current then
+            x = alpha * x + (1 - alpha) * tonumber(current)
+        end
+        redis.call('HSET', KEYS[1], field, tostring(x))
+    end
+end
+redis.call('HINCRBY', KEYS[1], 'n', 1)
+redis.call('HSET', KEYS[1], 'updated', ARGV[6])
+redis.call('EXPIRE', KEYS[1], ARGV[7])
+return 1
+""")
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def stats_key(spec: dict) -> str:
+    return f"model_stats:{spec['provider']}:{spec['model']}"
+
+
+def record(spec: dict, metadata: dict):
+    """
+    Folds a finished turn (stream_turn metadata) into the model's statistics.
+    """
+    error = bool(metadata.get("error"))
+    ttft = tps = tokens = ""
+    if not error and metadata.get("ttft_ms") is not None:
+        ttft = metadata["ttft_ms"] / 1000
+        streaming = (metadata["latency_ms"] - metadata["ttft_ms"]) / 1000
+        if metadata.get("output_tokens", 0) > 1 and streaming > 0:
+            tps = metadata["output_tokens"] / streaming
+        # A cut-off answer says nothing about how long the model's answers are
+        if not metadata.get("truncated"):
+            tokens = metadata.get("output_tokens") or ""
+    _RECORD_SCRIPT(
+        keys=[stats_key(spec)],
+        args=[_setting("DELIBERATION_ROUTING_ALPHA", 0.2), int(error), ttft, tps, tokens,
+              int(time.time()), _setting("DELIBERATION_ROUTING_STATS_TTL", 7 * 24 * 3600)],
+    )
+
+
+def load_stats(specs: List[dict]) -> List[Dict[str, float]]:
+    pipe = redis_client.pipeline()
+    for spec in specs:
+        pipe.hgetall(stats_key(spec))
+    return [{k.decode(): float(v) for k, v in raw.items()} for raw in pipe.execute()]
+
+
+def estimate(spec: dict, stats: Dict[str, float]) -> Dict[str, float]:
+    """
+    Expected seconds for a turn on `spec`, with the figures it is based on.
+    """
+    ttft = stats.get("ttft", _setting("DELIBERATION_ROUTING_PRIOR_TTFT", 1.0))
+    tps = stats.get("tps") or spec.get("tokens_per_second") or _setting("DELIBERATION_TOKENS_PER_SECOND", 30)
+    tokens = stats.get("tokens", _setting("DELIBERATION_ROUTING_PRIOR_TOKENS", 300))
+    error_rate = stats.get("error_rate", 0.0)
+    expected = (ttft + tokens / tps) / max(1 - error_rate, 0.05)
+    return {"expected_s": round(expected, 3), "ttft_s": round(ttft, 3), "tps": round(tps, 1),
+            "error_rate": round(error_rate, 3), "n": int(stats.get("n", 0))}
+
+
+def route(entry: dict, keys: Dict[str, str], round_num: int, max_rounds: int) -> Tuple[dict, Optional[dict]]:
+    """
+    (model spec, routing decision) for a seat or the Arbiter this turn. The
+    decision is None with fixed routing.
+    """
+    if _setting("DELIBERATION_ROUTING", "fixed") != "adaptive":
+        return resolve_model(entry, keys, round_num, max_rounds), None
+    allowed = allowed_candidates(candidates_for_round(entry, round_num, max_rounds), keys)
+    if len(allowed) < 2:
+        return resolve_model(entry, keys, round_num, max_rounds), {"reason": "only"}
+    try:
+        stats = load_stats(allowed)
+    except redis.RedisError as e:
+        print(f"Error loading model stats: {e}")
+        return allowed[0], {"reason": "no_stats"}
+
+    options = [(spec, estimate(spec, s), model_quality(spec)) for spec, s in zip(allowed, stats)]
+    # Quality constraints first: healthy models close to the best quality available
+    max_error = _setting("DELIBERATION_ROUTING_MAX_ERROR_RATE", 0.5)
+    healthy = [o for o in options if o[1]["error_rate"] <= max_error] or options
+    floor = max(max(o[2] for o in healthy) - _setting("DELIBERATION_ROUTING_QUALITY_SLACK", 10),
+                entry.get("min_quality", _setting("DELIBERATION_ROUTING_MIN_QUALITY", 0)))
+    eligible = [o for o in healthy if o[2] >= floor] or healthy[:1]
+
+    # Exploring also probes unhealthy models, so they can recover
+    explorable = [o for o in options if o[2] >= floor]
+    warming = [o for o in eligible if o[1]["n"] < _setting("DELIBERATION_ROUTING_MIN_SAMPLES", 3)]
+    if warming:
+        chosen, reason = warming[0], "warmup"
+    elif len(explorable) > 1 and random.random() < _setting("DELIBERATION_ROUTING_EXPLORE", 0.05):
+        chosen, reason = random.choice(explorable), "explore"
+    else:
+        # min() keeps roster order on ties
+        chosen, reason = min(eligible, key=lambda o: o[1]["expected_s"]), "fastest"
+    if reason == "fastest" and not any(o[0] is allowed[0] for o in healthy):
+        reason = "avoid_errors"
+
+    decision = {
+        "reason": reason,
+        "candidates": [{"model": f"{spec['provider']}/{spec['model']}", "quality": quality,
+                        "eligible": any(o[0] is spec for o in eligible), **figures}
+                       for spec, figures, quality in options],
+    }
+    return chosen[0], decision
@@ -10,7 +10,13 @@ class AgentState(TypedDict):
     messages: Annotated[list[BaseMessage], operator.add]
     current_round: int
     max_rounds: int
-    participants: list[str] # ["OpenAI", "Gemini", "DeepSeek"]
+    participants: list[str] # Roster seat names, e.g. ["openai", "gemini", "deepseek"]
     final_answer: Optional[str]
     question: str
     conversation_id: str
+    roster: str # Name of the agent roster (see agents/roster.py)
+    deadline: Optional[float] # Epoch seconds the deliberation should finish by (latency budget)
+    arbiter_reserve: float # Seconds of the budget kept for the Arbiter
+    strategy: str # "rounds" or "self_consistency" (see agents/consistency.py)
+    started_at: Optional[float] # Epoch seconds the graph run started (for end-to-end latency)
+    sample: Optional[int] # Index of an independent sample (self-consistency fan-out only)
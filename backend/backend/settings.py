@@ -143,3 +143,148 @@ CHANNEL_LAYERS = {
 
 # Key Encryption (for session/redis storage)
 FERNET_KEY = os.getenv('FERNET_KEY', 'ChangeMeInProductionUsingFernetGenerateKey==')
+
+# Analytics export (/api/export/ and `manage.py export_deliberations`)
+# The HTTP endpoint stays disabled until a token is configured.
+EXPORT_API_TOKEN = os.getenv('EXPORT_API_TOKEN', '')
+EXPORT_WATERMARK_LAG_SECONDS = int(os.getenv('EXPORT_WATERMARK_LAG_SECONDS', '60'))
+
+# Agent rosters (see agents/roster.py). Rosters from DELIBERATION_ROSTERS_FILE
+# (JSON: {"name": {"seats": [...], "arbiter": {...}}}) extend the built-in ones.
+DELIBERATION_DEFAULT_ROSTER = os.getenv('DELIBERATION_DEFAULT_ROSTER', 'default')
+DELIBERATION_ROSTERS_FILE = os.getenv('DELIBERATION_ROSTERS_FILE', '')
+
+# Cancel a running deliberation when no SSE client has been seen for this many
+# seconds (0 disables auto-cancel; keep it well above the 15s SSE ping).
+DELIBERATION_AUTO_CANCEL_GRACE_SECONDS = int(os.getenv('DELIBERATION_AUTO_CANCEL_GRACE_SECONDS', '0'))
+
+# Latency budget (seconds, per request via `latency_budget`; 0 = unlimited).
+# The Arbiter keeps a reserved slice, the rest is spread across seat turns.
+DELIBERATION_DEFAULT_LATENCY_BUDGET = float(os.getenv('DELIBERATION_DEFAULT_LATENCY_BUDGET', '0'))
+DELIBERATION_ARBITER_RESERVE_FRACTION = float(os.getenv('DELIBERATION_ARBITER_RESERVE_FRACTION', '0.3'))
+DELIBERATION_ARBITER_MIN_SECONDS = float(os.getenv('DELIBERATION_ARBITER_MIN_SECONDS', '10'))
+DELIBERATION_MIN_TURN_SECONDS = float(os.getenv('DELIBERATION_MIN_TURN_SECONDS', '3'))
+# Expected output throughput used to turn a time slice into max_tokens
+# (model specs can override it with "tokens_per_second")
+DELIBERATION_TOKENS_PER_SECOND = float(os.getenv('DELIBERATION_TOKENS_PER_SECOND', '30'))
+DELIBERATION_MIN_TURN_TOKENS = int(os.getenv('DELIBERATION_MIN_TURN_TOKENS', '64'))
+
+# Single-flight: identical concurrent requests (same normalized question,
+# rounds, roster and resolved providers) share one deliberation. Opt-in per
+# request with `share_inflight`; this is the default when it is omitted.
+DELIBERATION_SINGLE_FLIGHT = os.getenv('DELIBERATION_SINGLE_FLIGHT', 'False') == 'True'
+DELIBERATION_SINGLE_FLIGHT_TTL = int(os.getenv('DELIBERATION_SINGLE_FLIGHT_TTL', '1800'))
+
+# Follow-up questions (/api/conversation/<id>/follow-up/) run this many extra
+# rounds by default, seeded with the Arbiter answer and compacted round
+# summaries (each seat turn cut to ~TURN_CHARS, the whole seed to CONTEXT_CHARS).
+DELIBERATION_FOLLOW_UP_ROUNDS = int(os.getenv('DELIBERATION_FOLLOW_UP_ROUNDS', '1'))
+DELIBERATION_FOLLOW_UP_TURN_CHARS = int(os.getenv('DELIBERATION_FOLLOW_UP_TURN_CHARS', '300'))
+DELIBERATION_FOLLOW_UP_CONTEXT_CHARS = int(os.getenv('DELIBERATION_FOLLOW_UP_CONTEXT_CHARS', '6000'))
+
+# Similarity index over past questions (deliberations/similarity.py), kept on
+# local disk and shared by web and worker. With `reuse` = "answer" a
+# near-identical question gets the earlier Arbiter answer back without a new
+# deliberation; "context" (or an "answer" near miss) hands the closest earlier
+# answer to the agents instead. Rebuild with `manage.py build_similarity_index`.
+DELIBERATION_SIMILARITY_DIR = os.getenv('DELIBERATION_SIMILARITY_DIR', str(BASE_DIR / 'var' / 'similarity'))
+DELIBERATION_REUSE = os.getenv('DELIBERATION_REUSE', 'off')
+DELIBERATION_REUSE_ANSWER_THRESHOLD = float(os.getenv('DELIBERATION_REUSE_ANSWER_THRESHOLD', '0.85'))
+DELIBERATION_REUSE_CONTEXT_THRESHOLD = float(os.getenv('DELIBERATION_REUSE_CONTEXT_THRESHOLD', '0.6'))
+# Posting entries scanned per lookup, and new entries kept outside the
+# posting lists before they are merged in
+DELIBERATION_SIMILARITY_POSTINGS_BUDGET = int(os.getenv('DELIBERATION_SIMILARITY_POSTINGS_BUDGET', '20000'))
+DELIBERATION_SIMILARITY_DELTA_NNZ = int(os.getenv('DELIBERATION_SIMILARITY_DELTA_NNZ', '100000'))
+
+# Deliberation strategy when a request does not pick one: "rounds" (seats take
+# turns for max_rounds) or "self_consistency" (DELIBERATION_SAMPLES independent
+# answers in parallel, reconciled by the Arbiter in one pass). Samples cycle
+# through the seats and DELIBERATION_SAMPLE_TEMPERATURES. Both record an
+# agreement rate (share of final answers whose lexical similarity to the
+# largest agreeing group reaches DELIBERATION_AGREEMENT_THRESHOLD); compare
+# the two with `manage.py roster_report`.
+DELIBERATION_DEFAULT_STRATEGY = os.getenv('DELIBERATION_DEFAULT_STRATEGY', 'rounds')
+DELIBERATION_SAMPLES = int(os.getenv('DELIBERATION_SAMPLES', '3'))
+DELIBERATION_SAMPLE_TEMPERATURES = [float(t) for t in os.getenv('DELIBERATION_SAMPLE_TEMPERATURES', '0.3,0.7,1.0').split(',')]
+DELIBERATION_AGREEMENT_THRESHOLD = float(os.getenv('DELIBERATION_AGREEMENT_THRESHOLD', '0.5'))
+
+# Record each provider stream (chunks and their timing) to gzip cassettes in
+# DELIBERATION_CASSETTE_DIR (agents/cassettes.py). Rerun them offline with
+# `manage.py replay_deliberation <cassette> [--speed N]` to compare changes to
+# the nodes / stream relay without provider variance.
+DELIBERATION_RECORD_CASSETTES = os.getenv('DELIBERATION_RECORD_CASSETTES', 'False') == 'True'
+DELIBERATION_CASSETTE_DIR = os.getenv('DELIBERATION_CASSETTE_DIR', str(BASE_DIR / 'var' / 'cassettes'))
+
+# Per-run span tree (queue wait, graph nodes, LLM phases, Redis publishes, DB
+# writes) stored with the conversation and served by
+# /api/conversation/<id>/timeline/. With DELIBERATION_TRACE_OTLP_FILE set,
+# traces are also appended there as OTLP/JSON lines (no collector needed).
+DELIBERATION_TRACING = os.getenv('DELIBERATION_TRACING', 'True') == 'True'
+DELIBERATION_TRACE_OTLP_FILE = os.getenv('DELIBERATION_TRACE_OTLP_FILE', '')
+
+# Model routing per turn (agents/routing.py): "fixed" uses each seat's first
+# usable model; "adaptive" picks the allowed model expected to finish first
+# from EWMA stats (TTFT, tokens/s, length, error rate) shared in Redis,
+# within DELIBERATION_ROUTING_QUALITY_SLACK of the best quality available.
+DELIBERATION_ROUTING = os.getenv('DELIBERATION_ROUTING', 'fixed')
+DELIBERATION_ROUTING_ALPHA = float(os.getenv('DELIBERATION_ROUTING_ALPHA', '0.2'))
+DELIBERATION_ROUTING_QUALITY_SLACK = int(os.getenv('DELIBERATION_ROUTING_QUALITY_SLACK', '10'))
+DELIBERATION_ROUTING_MIN_QUALITY = int(os.getenv('DELIBERATION_ROUTING_MIN_QUALITY', '0'))
+DELIBERATION_ROUTING_MAX_ERROR_RATE = float(os.getenv('DELIBERATION_ROUTING_MAX_ERROR_RATE', '0.5'))
+DELIBERATION_ROUTING_EXPLORE = float(os.getenv('DELIBERATION_ROUTING_EXPLORE', '0.05'))
+DELIBERATION_ROUTING_PRIOR_TTFT = float(os.getenv('DELIBERATION_ROUTING_PRIOR_TTFT', '1.0'))
+DELIBERATION_ROUTING_PRIOR_TOKENS = int(os.getenv('DELIBERATION_ROUTING_PRIOR_TOKENS', '300'))
+DELIBERATION_ROUTING_STATS_TTL = int(os.getenv('DELIBERATION_ROUTING_STATS_TTL', str(7 * 24 * 3600)))
+DELIBERATION_ROUTING_MIN_SAMPLES = int(os.getenv('DELIBERATION_ROUTING_MIN_SAMPLES', '3'))
+
+# Message retention (deliberations/archive.py): finished conversations idle
+# for DELIBERATION_ARCHIVE_AFTER_DAYS move into one compressed archive row
+# each; history and follow-ups keep working. Opt-in (0 keeps everything):
+# exports, roster_report and round_plan_report only read the message table,
+# so archived conversations drop out of them. The
+# compaction job runs every DELIBERATION_COMPACTION_INTERVAL seconds on
+# Celery beat (or `manage.py compact_messages`), also deleting traces older
+# than DELIBERATION_TRACE_RETENTION_DAYS and, after `manage.py
+# partition_messages` (PostgreSQL), keeping monthly message partitions
+# created DELIBERATION_PARTITION_MONTHS_AHEAD months ahead.
+DELIBERATION_ARCHIVE_AFTER_DAYS = int(os.getenv('DELIBERATION_ARCHIVE_AFTER_DAYS', '0'))
+DELIBERATION_ARCHIVE_BATCH = int(os.getenv('DELIBERATION_ARCHIVE_BATCH', '500'))
+DELIBERATION_ARCHIVE_COMPRESSION_LEVEL = int(os.getenv('DELIBERATION_ARCHIVE_COMPRESSION_LEVEL', '9'))
+DELIBERATION_TRACE_RETENTION_DAYS = int(os.getenv('DELIBERATION_TRACE_RETENTION_DAYS', '30'))
+DELIBERATION_PARTITION_MONTHS_AHEAD = int(os.getenv('DELIBERATION_PARTITION_MONTHS_AHEAD', '2'))
+DELIBERATION_COMPACTION_INTERVAL = float(os.getenv('DELIBERATION_COMPACTION_INTERVAL', '3600'))
+CELERY_BEAT_SCHEDULE = {
+    'compact-messages': {
+        'task': 'deliberations.tasks.compact_messages_task',
+        'schedule': DELIBERATION_COMPACTION_INTERVAL,
+    },
+}
+
+# Upfront round planning (agents/planner.py): a local lexical classifier rates
+# each new question simple / moderate / complex and plans at most
+# DELIBERATION_TIER_ROUNDS rounds for it (never more than requested); a tier
+# may also get its own roster when the request names none. "shadow" (the
+# default) records the plan on the question without applying it, "on"
+# applies it. Compare plans with what deliberations needed, and fit the
+# classifier's weights (DELIBERATION_PLANNER_WEIGHTS), with
+# `manage.py round_plan_report [--fit <file>]`.
+DELIBERATION_ROUND_PLANNING = os.getenv('DELIBERATION_ROUND_PLANNING', 'shadow')
+DELIBERATION_PLANNER_WEIGHTS = os.getenv('DELIBERATION_PLANNER_WEIGHTS', '')
+DELIBERATION_PLANNER_THRESHOLDS = tuple(float(t) for t in os.getenv('DELIBERATION_PLANNER_THRESHOLDS', '0.35,0.65').split(','))
+DELIBERATION_TIER_ROUNDS = {tier: int(rounds) for tier, rounds in (
+    pair.split('=') for pair in os.getenv('DELIBERATION_TIER_ROUNDS', 'simple=1,moderate=2,complex=5').split(',') if pair)}
+DELIBERATION_TIER_ROSTERS = dict(
+    pair.split('=') for pair in os.getenv('DELIBERATION_TIER_ROSTERS', 'simple=light').split(',') if pair)
+
+# Admission control (utils/admission.py): at most DELIBERATION_WORKER_SLOTS
+# deliberations run at once per Celery queue (set it to worker processes x
+# concurrency) and DELIBERATION_MAX_QUEUED more may wait for a slot; they get
+# their queue position and an estimated start (also pushed as "queued" events
+# on the stream). Further requests get 429 with Retry-After. Estimates use
+# the queue's typical run time (EWMA, PRIOR_RUN_SECONDS until measured).
+DELIBERATION_QUEUE = os.getenv('DELIBERATION_QUEUE', 'celery')
+DELIBERATION_WORKER_SLOTS = int(os.getenv('DELIBERATION_WORKER_SLOTS', '4'))
+DELIBERATION_MAX_QUEUED = int(os.getenv('DELIBERATION_MAX_QUEUED', '50'))
+DELIBERATION_ADMISSION_PRIOR_RUN_SECONDS = float(os.getenv('DELIBERATION_ADMISSION_PRIOR_RUN_SECONDS', '60'))
+DELIBERATION_ADMISSION_ALPHA = float(os.getenv('DELIBERATION_ADMISSION_ALPHA', '0.2'))
+DELIBERATION_ADMISSION_STALE_SECONDS = int(os.getenv('DELIBERATION_ADMISSION_STALE_SECONDS', '1800'))
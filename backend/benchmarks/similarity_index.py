@@ -0,0 +1,137 @@
+"""
+Lookup latency of the similarity index (deliberations/similarity.py).
+
+    python -m benchmarks.similarity_index --docs 1000000 --queries 2000
+
+Builds an index of --docs synthetic questions (Zipf-distributed vocabulary,
+so common words have very long posting lists) in a temporary directory, or
+reuses --path if it already holds one. It then times --queries lookups:
+half are reworded copies of indexed questions (a word dropped, two words
+swapped, a typo), half are fresh questions.
+
+Reports: build time, index size on disk, p50/p90/p99 lookup latency and how
+often the reworded question's original came back as the best match.
+"""
+import argparse
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+import uuid
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from deliberations.similarity import SimilarityIndex  # noqa: E402
+
+VOCABULARY = 50000
+
+
+def make_words(rng):
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    words = set()
+    while len(words) < VOCABULARY:
+        words.add("".join(rng.choice(letters) for _ in range(rng.randint(3, 10))))
+    return sorted(words)
+
+
+def make_question(rng, words, cum_weights):
+    return " ".join(rng.choices(words, cum_weights=cum_weights, k=rng.randint(6, 18))) + "?"
+
+
+def reword(rng, question):
+    words = question.rstrip("?").split()
+    if len(words) > 4:
+        words.pop(rng.randrange(len(words)))
+    i = rng.randrange(len(words) - 1)
+    words[i], words[i + 1] = words[i + 1], words[i]
+    j = rng.randrange(len(words))
+    if len(words[j]) > 3:
+        k = rng.randrange(len(words[j]) - 1)
+        words[j] = words[j][:k] + words[j][k + 1] + words[j][k] + words[j][k + 2:]
+    return " ".join(words) + "?"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--path", help="Index directory (kept); default: a temporary one")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    words = make_words(rng)
+    cum_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(len(words))))
+    path = args.path or tempfile.mkdtemp(prefix="similarity-")
+    index = SimilarityIndex(path)
+
+    # Questions are regenerated from the seed instead of being held in memory
+    def docs():
+        doc_rng = random.Random(args.seed + 1)
+        for n in range(args.docs):
+            yield str(uuid.UUID(int=n + 1)), make_question(doc_rng, words, cum_weights)
+
+    build_s = None
+    if len(index) != args.docs:
+        started = time.perf_counter()
+        index.rebuild(docs)
+        build_s = time.perf_counter() - started
+
+    # Sample indexed questions to reword
+    sample = set(rng.sample(range(args.docs), min(args.queries // 2, args.docs)))
+    originals = [(convo_id, q) for n, (convo_id, q) in enumerate(docs()) if n in sample]
+    queries = [(convo_id, reword(rng, q)) for convo_id, q in originals]
+    queries += [(None, make_question(rng, words, cum_weights)) for _ in range(args.queries - len(queries))]
+    rng.shuffle(queries)
+
+    index.search(queries[0][1])  # map the files
+    latencies_ms = []
+    found = 0
+    for expected, question in queries:
+        started = time.perf_counter()
+        results = index.search(question, limit=1)
+        latencies_ms.append((time.perf_counter() - started) * 1000)
+        if expected and results and results[0][0] == expected:
+            found += 1
+
+    size = sum(f.stat().st_size for f in Path(path).iterdir() if f.is_file())
+    report = {
+        "docs": len(index),
+        "build_s": build_s,
+        "index_mb": size / 1024 / 1024,
+        "queries": len(queries),
+        "latency_ms_p50": percentile(latencies_ms, 50),
+        "latency_ms_p90": percentile(latencies_ms, 90),
+        "latency_ms_p99": percentile(latencies_ms, 99),
+        "latency_ms_mean": statistics.mean(latencies_ms),
+        "reworded_recall_at_1": found / len(originals) if originals else None,
+        "path": path,
+    }
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for key, value in report.items():
+        if isinstance(value, float):
+            value = f"{value:.3f}"
+        print(f"{key:<24}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,304 @@
+"""
+Load test for the SSE relay (MessageStreamView) against a local Redis.
+
+    python -m benchmarks.sse_load --create 20 --clients 2000 --token-rate 40 --duration 30 \\
+        --server-pid $(pgrep -f 'runserver|gunicorn' | tr '\\n' ',')
+
+Opens --clients concurrent SSE connections spread over the conversations,
+then replays synthetic deliberation traffic (token frames, a message frame
+per turn, round updates, a final frame) into Redis at --token-rate tokens/s
+per conversation, exactly as the worker would publish it. No Celery worker
+or model provider is involved.
+
+Every token carries "<seq>:<publish time ns>" as its content, which lets the
+clients measure publish-to-client latency and count dropped frames (gaps in
+the sequence after the first frame a client received).
+
+Reports: connections established / failed, peak concurrent streams, p50/p90/
+p99 latency, dropped frames, and peak RSS / open file descriptors of this
+process and of the server process(es) given with --server-pid.
+"""
+import argparse
+import asyncio
+import json
+import os
+import resource
+import statistics
+import sys
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import httpx  # noqa: E402
+import redis.asyncio as aioredis  # noqa: E402
+from django.conf import settings  # noqa: E402
+
+from utils.stream import channel_name, encode_chunk, encode_update  # noqa: E402
+
+AGENTS = ["loadtest-a", "loadtest-b", "loadtest-c"]
+TOKENS_PER_TURN = 120
+
+
+# --- process stats ---
+
+def proc_stats(pid) -> dict:
+    """
+    RSS (MB) and open fds of a process, from /proc (Linux only).
+    """
+    stats = {"rss_mb": None, "fds": None}
+    try:
+        with open(f"/proc/{pid}/status") as fh:
+            for line in fh:
+                if line.startswith("VmRSS:"):
+                    stats["rss_mb"] = int(line.split()[1]) / 1024
+        stats["fds"] = len(os.listdir(f"/proc/{pid}/fd"))
+    except (FileNotFoundError, PermissionError, ProcessLookupError):
+        pass
+    return stats
+
+
+class Stats:
+    def __init__(self):
+        self.connected = 0
+        self.failed = 0
+        self.open_streams = 0
+        self.peak_streams = 0
+        self.frames = 0
+        self.dropped = 0
+        self.latencies_ms = []
+        self.connect_ms = []
+        self.errors = {}
+        self.peak = {}
+
+    def error(self, exc):
+        name = type(exc).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def sample(self, pids):
+        for label, pid in [("client", os.getpid())] + [(f"server:{p}", p) for p in pids]:
+            current = proc_stats(pid)
+            peak = self.peak.setdefault(label, {"rss_mb": 0, "fds": 0})
+            for key, value in current.items():
+                if value is not None and value > peak[key]:
+                    peak[key] = value
+
+
+# --- clients ---
+
+async def sse_client(http, url, stats: Stats, ready: asyncio.Event, stop: asyncio.Event):
+    started = time.perf_counter()
+    last_seq = None
+    try:
+        async with http.stream("GET", url, headers={"Accept": "text/event-stream"}) as response:
+            if response.status_code != 200:
+                stats.failed += 1
+                stats.errors[f"HTTP {response.status_code}"] = stats.errors.get(f"HTTP {response.status_code}", 0) + 1
+                return
+            stats.connected += 1
+            stats.open_streams += 1
+            stats.peak_streams = max(stats.peak_streams, stats.open_streams)
+            stats.connect_ms.append((time.perf_counter() - started) * 1000)
+            ready.set()
+            try:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: ") or line == "data: connected" or line == "data: pong":
+                        continue
+                    received_ns = time.time_ns()
+                    data = json.loads(line[6:])
+                    stats.frames += 1
+                    kind = data.get("type")
+                    if kind == "token":
+                        seq, sent_ns = data["content"].split(":")
+                        seq = int(seq)
+                        stats.latencies_ms.append((received_ns - int(sent_ns)) / 1e6)
+                        if last_seq is not None and seq > last_seq + 1:
+                            stats.dropped += seq - last_seq - 1
+                        last_seq = seq
+                    elif kind in ("final", "cancelled"):
+                        break
+                    if stop.is_set():
+                        break
+            finally:
+                stats.open_streams -= 1
+    except Exception as e:
+        stats.failed += 1
+        stats.error(e)
+
+
+# --- publishers ---
+
+async def publisher(r, conversation_id, token_rate, duration, start: asyncio.Event):
+    """
+    Replays one deliberation's worth of traffic at `token_rate` tokens/s.
+    """
+    await start.wait()
+    channel = channel_name(conversation_id)
+    interval = 1.0 / token_rate
+    seq = 0
+    round_num = 1
+    deadline = time.perf_counter() + duration
+    next_at = time.perf_counter()
+    while time.perf_counter() < deadline:
+        agent = AGENTS[(seq // TOKENS_PER_TURN) % len(AGENTS)]
+        await r.publish(channel, encode_chunk(agent, f"{seq}:{time.time_ns()}", round_num))
+        seq += 1
+        if seq % TOKENS_PER_TURN == 0:
+            await r.publish(channel, encode_update({"type": "message", "agent": agent, "content": "...", "round": round_num}))
+            if agent == AGENTS[-1]:
+                round_num += 1
+                await r.publish(channel, encode_update({"type": "round_update", "round": round_num}))
+        next_at += interval
+        delay = next_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+    await r.publish(channel, encode_update({"type": "final", "result": "load test finished"}))
+    return seq
+
+
+def create_conversations(count: int):
+    from deliberations.models import Conversation
+    return [str(Conversation.objects.create(title="SSE load test").id) for _ in range(count)]
+
+
+def delete_conversations(conversation_ids):
+    from deliberations.models import Conversation
+    Conversation.objects.filter(id__in=conversation_ids).delete()
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(pct / 100 * len(ordered)))]
+
+
+async def run(args, conversation_ids, server_pids):
+    stats = Stats()
+    ready = asyncio.Event()
+    stop = asyncio.Event()
+    start_publishing = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=0)
+    timeout = httpx.Timeout(connect=args.connect_timeout, read=None, write=10.0, pool=None)
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as http:
+        r = aioredis.from_url(args.redis_url)
+
+        clients = []
+        ramp_delay = args.ramp / args.clients if args.ramp else 0
+        for i in range(args.clients):
+            convo_id = conversation_ids[i % len(conversation_ids)]
+            url = f"{args.base_url.rstrip('/')}/api/conversation/{convo_id}/stream/"
+            clients.append(asyncio.create_task(sse_client(http, url, stats, ready, stop)))
+            if ramp_delay:
+                await asyncio.sleep(ramp_delay)
+
+        # Give the clients time to subscribe before traffic starts
+        settle_until = time.perf_counter() + args.settle
+        while time.perf_counter() < settle_until and stats.connected + stats.failed < args.clients:
+            stats.sample(server_pids)
+            await asyncio.sleep(0.1)
+
+        publishers = [
+            asyncio.create_task(publisher(r, cid, args.token_rate, args.duration, start_publishing))
+            for cid in conversation_ids
+        ]
+        started = time.perf_counter()
+        start_publishing.set()
+        while not all(p.done() for p in publishers):
+            stats.sample(server_pids)
+            await asyncio.sleep(0.5)
+        published = sum(p.result() for p in publishers)
+        elapsed = time.perf_counter() - started
+
+        # Let in-flight frames drain, then stop whoever is left
+        try:
+            await asyncio.wait_for(asyncio.gather(*clients), timeout=args.drain)
+        except asyncio.TimeoutError:
+            stop.set()
+            for task in clients:
+                task.cancel()
+        stats.sample(server_pids)
+        await r.aclose()
+
+    return stats, published, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--redis-url", default=settings.CELERY_BROKER_URL,
+                        help="Redis the server relays from (default: CELERY_BROKER_URL)")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--create", type=int, metavar="N", help="Create N throwaway conversations through the ORM (deleted afterwards)")
+    group.add_argument("--conversation-ids", help="Comma separated ids of existing conversations")
+    parser.add_argument("--clients", type=int, default=500, help="Concurrent SSE clients (spread over conversations)")
+    parser.add_argument("--token-rate", type=float, default=30, help="Tokens/s published per conversation")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds of traffic per conversation")
+    parser.add_argument("--ramp", type=float, default=5, help="Seconds over which clients connect")
+    parser.add_argument("--settle", type=float, default=10, help="Max seconds to wait for clients before publishing")
+    parser.add_argument("--drain", type=float, default=10, help="Seconds to wait for clients after the final frame")
+    parser.add_argument("--connect-timeout", type=float, default=30)
+    parser.add_argument("--server-pid", default="", help="Comma separated server PIDs to sample RSS / fds from")
+    parser.add_argument("--json", action="store_true", help="Print the report as JSON")
+    args = parser.parse_args()
+
+    # Thousands of sockets need more than the usual 1024 fds
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    if args.create:
+        conversation_ids = create_conversations(args.create)
+    else:
+        conversation_ids = [c.strip() for c in args.conversation_ids.split(",") if c.strip()]
+    server_pids = [int(p) for p in args.server_pid.split(",") if p.strip()]
+
+    try:
+        stats, published, elapsed = asyncio.run(run(args, conversation_ids, server_pids))
+    finally:
+        # Throwaway conversations would otherwise show up in history, exports and the similarity index
+        if args.create:
+            delete_conversations(conversation_ids)
+
+    clients_per_convo = args.clients / len(conversation_ids)
+    report = {
+        "conversations": len(conversation_ids),
+        "clients": args.clients,
+        "connected": stats.connected,
+        "failed": stats.failed,
+        "peak_concurrent_streams": stats.peak_streams,
+        "connect_ms_p50": percentile(stats.connect_ms, 50),
+        "connect_ms_p99": percentile(stats.connect_ms, 99),
+        "tokens_published": published,
+        "publish_rate_per_s": published / elapsed if elapsed else 0,
+        "frames_received": stats.frames,
+        "expected_token_deliveries": round(published * clients_per_convo),
+        "token_deliveries": len(stats.latencies_ms),
+        "dropped_frames": stats.dropped,
+        "latency_ms_p50": percentile(stats.latencies_ms, 50),
+        "latency_ms_p90": percentile(stats.latencies_ms, 90),
+        "latency_ms_p99": percentile(stats.latencies_ms, 99),
+        "latency_ms_max": max(stats.latencies_ms) if stats.latencies_ms else None,
+        "latency_ms_mean": statistics.mean(stats.latencies_ms) if stats.latencies_ms else None,
+        "errors": stats.errors,
+        "peak_process_stats": stats.peak,
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for key, value in report.items():
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        print(f"{key:<28}{value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Import-time / memory benchmark for the web and worker entry points.
+
+    python -m benchmarks.startup --repeat 5
+
+Each entry point runs in a fresh interpreter that reports its own wall time
+and peak RSS, plus which heavy agent-stack modules ended up in sys.modules.
+No database, Redis or model provider is contacted.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+HEAVY_MODULES = [
+    "langgraph",
+    "langchain_core",
+    "langchain_openai",
+    "langchain_ollama",
+    "google.genai",
+]
+
+SETUP = "import django; django.setup()"
+
+ENTRY_POINTS = {
+    # What a gunicorn/runserver process loads before serving requests
+    "web": SETUP + "\nfrom django.core.wsgi import get_wsgi_application; get_wsgi_application()\nimport backend.urls",
+    # Any manage.py command (migrate, export_deliberations, ...)
+    "manage": SETUP + "\nfrom django.core.management import get_commands; get_commands()",
+    # Celery worker after task autodiscovery, before the first task
+    "worker": SETUP + "\nimport backend.celery\nimport deliberations.tasks",
+    # Worker after the first deliberation has built the graph
+    "worker-ready": SETUP + "\nimport deliberations.tasks\nfrom agents.graph import get_agent_graph; get_agent_graph()",
+}
+
+CHILD_TEMPLATE = """
+import json, resource, sys, time
+_t0 = time.perf_counter()
+{code}
+_elapsed = time.perf_counter() - _t0
+print(json.dumps({{
+    "seconds": _elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "loaded": [m for m in {heavy!r} if m in sys.modules],
+}}))
+"""
+
+
+def run_once(code: str) -> dict:
+    env = dict(os.environ)
+    env.setdefault("DJANGO_SETTINGS_MODULE", "backend.settings")
+    child = CHILD_TEMPLATE.format(code=code, heavy=HEAVY_MODULES)
+    out = subprocess.run(
+        [sys.executable, "-c", child],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True,
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--entry", action="append", choices=sorted(ENTRY_POINTS), help="Entry point(s) to run (default: all)")
+    parser.add_argument("--json", action="store_true", help="Print raw JSON results")
+    args = parser.parse_args()
+
+    results = {}
+    for name in args.entry or list(ENTRY_POINTS):
+        runs = [run_once(ENTRY_POINTS[name]) for _ in range(args.repeat)]
+        results[name] = {
+            "median_seconds": statistics.median(r["seconds"] for r in runs),
+            "median_max_rss_mb": statistics.median(r["max_rss_mb"] for r in runs),
+            "loaded": runs[-1]["loaded"],
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'entry':<14}{'import s':>10}{'max RSS MB':>12}  heavy modules loaded")
+    for name, r in results.items():
+        loaded = ", ".join(r["loaded"]) or "-"
+        print(f"{name:<14}{r['median_seconds']:>10.3f}{r['median_max_rss_mb']:>12.1f}  {loaded}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+
+import json
+import zlib
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from . import partitions
+from .models import Conversation, ConversationArchive, Message, Trace
+
+# Retention for the message table. Finished conversations with no message
+# newer than DELIBERATION_ARCHIVE_AFTER_DAYS have their messages moved into a
+# single ConversationArchive row (one JSON line per message, zlib-compressed)
+# and deleted from the message table. Readers of a conversation's messages
+# (history, the stream's closing frame, answer reuse) fall back to the
+# archive, and a follow-up restores the messages first, so an archived
+# conversation behaves like any other. Exports and the roster / round plan
+# reports cover the message table only, which is why archiving is off unless
+# DELIBERATION_ARCHIVE_AFTER_DAYS is set.
+#
+# The compaction job (tasks.compact_messages_task, run by Celery beat every
+# DELIBERATION_COMPACTION_INTERVAL seconds, or `manage.py compact_messages`)
+# archives up to DELIBERATION_ARCHIVE_BATCH conversations per run, deletes
+# traces older than DELIBERATION_TRACE_RETENTION_DAYS and, once the message
+# table is partitioned (deliberations/partitions.py), creates upcoming monthly
+# partitions and drops old ones that archiving has emptied.
+
+FINISHED = ('completed', 'cancelled', 'failed')
+FIELDS = ('id', 'agent_name', 'content', 'round_number', 'timestamp', 'is_internal_thought', 'metadata')
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def encode(rows: List[dict]) -> bytes:
+    lines = [json.dumps({**row, "timestamp": row["timestamp"].isoformat()}, separators=(",", ":"),
+                        ensure_ascii=False) for row in rows]
+    return zlib.compress("\n".join(lines).encode("utf-8"), _setting("DELIBERATION_ARCHIVE_COMPRESSION_LEVEL", 9))
+
+
+def decode(data) -> List[dict]:
+    rows = []
+    # Not splitlines(): message text may contain Unicode line separators
+    for line in zlib.decompress(bytes(data)).decode("utf-8").split("\n"):
+        if line:
+            row = json.loads(line)
+            row["timestamp"] = datetime.fromisoformat(row["timestamp"])
+            rows.append(row)
+    return rows
+
+
+def archived_messages(conversation_id: str) -> Optional[List[Message]]:
+    """
+    A conversation's archived messages, oldest first, as unsaved Message
+    instances; None if it is not archived.
+    """
+    data = ConversationArchive.objects.filter(conversation_id=conversation_id).values_list('data', flat=True).first()
+    if data is None:
+        return None
+    return [Message(conversation_id=conversation_id, **row) for row in decode(data)]
+
+
+def archive_conversation(conversation_id: str) -> int:
+    """
+    Moves a finished conversation's messages into its archive. Returns how
+    many were moved (0 if it is not finished or has none left).
+    """
+    with transaction.atomic():
+        # Holds off a follow-up reopening the conversation meanwhile
+        convo = Conversation.objects.select_for_update().filter(id=conversation_id, status__in=FINISHED).first()
+        if convo is None:
+            return 0
+        rows = list(Message.objects.filter(conversation_id=conversation_id)
+                    .order_by('timestamp', 'id').values(*FIELDS))
+        if not rows:
+            return 0
+        existing = ConversationArchive.objects.filter(conversation_id=conversation_id).first()
+        if existing is not None:
+            rows = decode(existing.data) + rows
+        ConversationArchive.objects.update_or_create(conversation_id=conversation_id, defaults={
+            "message_count": len(rows),
+            "last_message_at": rows[-1]["timestamp"],
+            "codec": "zlib",
+            "data": encode(rows),
+        })
+        Message.objects.filter(conversation_id=conversation_id).delete()
+    return len(rows)
+
+
+def restore_conversation(conversation_id: str) -> int:
+    """
+    Moves archived messages back into the message table (before a follow-up).
+    Returns how many were restored.
+    """
+    with transaction.atomic():
+        archive = ConversationArchive.objects.select_for_update().filter(conversation_id=conversation_id).first()
+        if archive is None:
+            return 0
+        rows = decode(archive.data)
+        messages = [Message(conversation_id=conversation_id, **row) for row in rows]
+        Message.objects.bulk_create(messages)
+        # auto_now_add stamped them now; put the original times back
+        for message, row in zip(messages, rows):
+            message.timestamp = row["timestamp"]
+        Message.objects.bulk_update(messages, ['timestamp'], batch_size=_setting("DELIBERATION_ARCHIVE_BATCH", 500))
+        archive.delete()
+    return len(rows)
+
+
+def archivable(cutoff: datetime, limit: int) -> List[str]:
+    """
+    Ids of finished, unarchived conversations without messages after `cutoff`, oldest first.
+    """
+    return [str(convo_id) for convo_id in (
+        Conversation.objects.filter(status__in=FINISHED, created_at__lt=cutoff, archive__isnull=True)
+        .annotate(last_message=Max('messages__timestamp'))
+        .filter(last_message__lt=cutoff)
+        .order_by('created_at')
+        .values_list('id', flat=True)[:limit]
+    )]
+
+
+def archive_old_conversations(days: int, limit: int) -> dict:
+    cutoff = timezone.now() - timedelta(days=days)
+    archived = moved = 0
+    for convo_id in archivable(cutoff, limit):
+        try:
+            count = archive_conversation(convo_id)
+        except Exception as e:
+            print(f"Error archiving {convo_id}: {e}")
+            continue
+        if count:
+            archived += 1
+            moved += count
+    return {"conversations": archived, "messages": moved}
+
+
+def compact(days: int = None, limit: int = None) -> dict:
+    """
+    One run of the compaction job; returns what it did.
+    """
+    days = _setting("DELIBERATION_ARCHIVE_AFTER_DAYS", 0) if days is None else days
+    limit = limit or _setting("DELIBERATION_ARCHIVE_BATCH", 500)
+    result = {"archived": archive_old_conversations(days, limit) if days else None}
+
+    trace_days = _setting("DELIBERATION_TRACE_RETENTION_DAYS", 30)
+    if trace_days:
+        result["traces_deleted"] = Trace.objects.filter(
+            started_at__lt=timezone.now() - timedelta(days=trace_days)).delete()[0]
+
+    if partitions.is_partitioned():
+        result["partitions_created"] = partitions.ensure_partitions(
+            _setting("DELIBERATION_PARTITION_MONTHS_AHEAD", 2))
+        if days:
+            result["partitions_dropped"] = partitions.drop_empty_partitions(
+                timezone.now() - timedelta(days=days))
+    return result
@@ -0,0 +1,26 @@
+
+import time
+
+from backend.celery import app
+from utils.admission import default_queue
+
+# Tasks are sent by name so the web tier never imports deliberations.tasks
+# (and through it the agent graph and every provider SDK).
+RUN_DELIBERATION_TASK = 'deliberations.tasks.run_deliberation_task'
+
+
+def dispatch_deliberation(conversation_id: str, question: str, max_rounds: int, roster: str = None,
+                          latency_budget: float = None, first_round: int = 1, related: str = None,
+                          strategy: str = "rounds", queue: str = None):
+    # The deadline is fixed here so time spent queued counts against the budget
+    deadline = time.time() + latency_budget if latency_budget else None
+    # The worker reports start / end against the queue's admission bookkeeping (utils/admission.py)
+    queue = queue or default_queue()
+    return app.send_task(
+        RUN_DELIBERATION_TASK,
+        args=[conversation_id, question, max_rounds],
+        kwargs={"roster": roster, "latency_budget": latency_budget, "deadline": deadline,
+                "first_round": first_round, "related": related, "strategy": strategy,
+                "enqueued_at": time.time(), "queue": queue},
+        queue=queue,
+    )
@@ -0,0 +1,259 @@
+
+import importlib.util
+import io
+import json
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Conversation, Message
+
+
+DEFAULT_CHUNK_SIZE = 2000
+
+# Column order of each exported table. Rows are pulled with values_list()
+# so Django never builds model instances for them.
+TABLE_COLUMNS = {
+    "conversations": [
+        ("id", "id"),
+        ("created_at", "created_at"),
+        ("title", "title"),
+        ("is_completed", "is_completed"),
+        ("status", "status"),
+        ("updated_at", "updated_at"),
+    ],
+    "messages": [
+        ("id", "id"),
+        ("conversation_id", "conversation_id"),
+        ("conversation_title", "conversation__title"),
+        ("conversation_created_at", "conversation__created_at"),
+        ("agent_name", "agent_name"),
+        ("round_number", "round_number"),
+        ("timestamp", "timestamp"),
+        ("content", "content"),
+        ("is_internal_thought", "is_internal_thought"),
+        ("metadata", "metadata"),
+    ],
+}
+
+# Field used for the date range / watermark of each table. Conversations
+# change after they are created (status), so they are exported again
+# whenever they are updated.
+TABLE_TIME_FIELD = {
+    "conversations": "updated_at",
+    "messages": "timestamp",
+}
+
+
+# pyarrow is optional (without it exports fall back to NDJSON) and is only
+# imported when an Arrow/Parquet export actually runs.
+def arrow_available() -> bool:
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+def _arrow():
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+    return pyarrow, pyarrow.parquet
+
+
+def parse_bound(value):
+    """
+    Parses an ISO datetime or date (YYYY-MM-DD) into an aware datetime.
+    Returns None for empty values, raises ValueError for garbage.
+    """
+    if not value:
+        return None
+    dt = parse_datetime(value)
+    if dt is None:
+        d = parse_date(value)
+        if d is None:
+            raise ValueError(f"Invalid date/datetime: {value}")
+        dt = datetime(d.year, d.month, d.day)
+    if timezone.is_naive(dt):
+        dt = timezone.make_aware(dt, dt_timezone.utc)
+    return dt
+
+
+def default_until():
+    """
+    Upper bound used when the caller does not pass one.
+    Rows get their timestamp before the INSERT commits, so we stay a little
+    behind "now" to avoid skipping rows that commit after the export ran.
+    """
+    lag = getattr(settings, "EXPORT_WATERMARK_LAG_SECONDS", 60)
+    return timezone.now() - timedelta(seconds=lag)
+
+
+def iter_rows(table: str, since=None, until=None, chunk_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Yields one dict per row of `table` with time field in [since, until).
+    Uses a server-side cursor so memory stays flat regardless of the range.
+    """
+    columns = TABLE_COLUMNS[table]
+    time_field = TABLE_TIME_FIELD[table]
+    model = Conversation if table == "conversations" else Message
+
+    qs = model.objects.all()
+    if since is not None:
+        qs = qs.filter(**{f"{time_field}__gte": since})
+    if until is not None:
+        qs = qs.filter(**{f"{time_field}__lt": until})
+    # Order by the time field then PK so consecutive exports line up
+    qs = qs.order_by(time_field, "pk").values_list(*[src for _, src in columns])
+
+    names = [name for name, _ in columns]
+    for values in qs.iterator(chunk_size=chunk_size):
+        row = dict(zip(names, values))
+        if table == "messages":
+            row["conversation_id"] = str(row["conversation_id"])
+        else:
+            row["id"] = str(row["id"])
+        yield row
+
+
+def iter_batches(rows, batch_size: int = DEFAULT_CHUNK_SIZE):
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- NDJSON ---
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+def ndjson_lines(rows):
+    """
+    Yields one encoded NDJSON line per row.
+    """
+    for row in rows:
+        yield (json.dumps(row, default=_json_default, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def stream_ndjson(rows, batch_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Groups lines into larger writes so the HTTP layer is not flushing per row.
+    """
+    for batch in iter_batches(ndjson_lines(rows), batch_size):
+        yield b"".join(batch)
+
+
+def write_ndjson(rows, fh) -> int:
+    count = 0
+    for line in ndjson_lines(rows):
+        fh.write(line)
+        count += 1
+    return count
+
+
+# --- Arrow / Parquet ---
+
+def arrow_schema(table: str):
+    pa, _ = _arrow()
+    ts = pa.timestamp("us", tz="UTC")
+    if table == "conversations":
+        return pa.schema([
+            ("id", pa.string()),
+            ("created_at", ts),
+            ("title", pa.string()),
+            ("is_completed", pa.bool_()),
+            ("status", pa.string()),
+            ("updated_at", ts),
+        ])
+    return pa.schema([
+        ("id", pa.int64()),
+        ("conversation_id", pa.string()),
+        ("conversation_title", pa.string()),
+        ("conversation_created_at", ts),
+        ("agent_name", pa.string()),
+        ("round_number", pa.int32()),
+        ("timestamp", ts),
+        ("content", pa.string()),
+        ("is_internal_thought", pa.bool_()),
+        # Per-turn metadata is free-form, keep it as a JSON string column
+        ("metadata", pa.string()),
+    ])
+
+
+def _record_batch(table: str, schema, batch):
+    pa, _ = _arrow()
+    if table == "messages":
+        for row in batch:
+            row["metadata"] = json.dumps(row["metadata"] or {}, ensure_ascii=False)
+    return pa.RecordBatch.from_pylist(batch, schema=schema)
+
+
+class _DrainBuffer(io.RawIOBase):
+    """
+    Write-only sink that hands out what was written since the last drain.
+    Keeps its own position so Parquet footer offsets stay correct.
+    """
+    def __init__(self):
+        self._chunks = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        data = bytes(b)
+        self._chunks.append(data)
+        self._pos += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_arrow(table: str, rows, fmt: str = "arrow", batch_size: int = DEFAULT_CHUNK_SIZE):
+    """
+    Yields an Arrow IPC stream (fmt='arrow') or a Parquet file (fmt='parquet')
+    in pieces, one record batch / row group at a time.
+    """
+    pa, pq = _arrow()
+    schema = arrow_schema(table)
+    sink = _DrainBuffer()
+    if fmt == "parquet":
+        writer = pq.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    try:
+        for batch in iter_batches(rows, batch_size):
+            writer.write_batch(_record_batch(table, schema, batch))
+            data = sink.drain()
+            if data:
+                yield data
+    finally:
+        writer.close()
+    data = sink.drain()
+    if data:
+        yield data
+
+
+def write_parquet(table: str, rows, path, batch_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    _, pq = _arrow()
+    schema = arrow_schema(table)
+    count = 0
+    with pq.ParquetWriter(str(path), schema, compression="zstd") as writer:
+        for batch in iter_batches(rows, batch_size):
+            writer.write_batch(_record_batch(table, schema, batch))
+            count += len(batch)
+    return count
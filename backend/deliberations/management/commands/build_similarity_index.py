@@ -0,0 +1,52 @@
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef, Subquery, JSONField, TextField
+
+from deliberations import export, similarity
+from deliberations.models import Conversation, Message
+
+
+def first_exchanges(chunk_size: int):
+    """
+    (conversation_id, question) of every completed deliberation whose first
+    Arbiter answer is reusable, oldest first (archived ones last).
+    """
+    first = Message.objects.filter(conversation=OuterRef('pk')).order_by('timestamp')
+    rows = (Conversation.objects.filter(status='completed')
+            .annotate(question=Subquery(first.filter(agent_name='user').values('content')[:1], output_field=TextField()),
+                      answer_meta=Subquery(first.filter(agent_name='arbiter').values('metadata')[:1], output_field=JSONField()))
+            .filter(answer_meta__isnull=False)
+            .order_by('created_at')
+            .values_list('id', 'question', 'title', 'answer_meta'))
+    for convo_id, question, title, answer_meta in rows.iterator(chunk_size=chunk_size):
+        if similarity.answer_is_reusable(answer_meta or {}):
+            yield str(convo_id), question or title
+    # Archived conversations have no message rows left for the query above
+    archived = (Conversation.objects.filter(status='completed', archive__isnull=False)
+                .order_by('created_at').values_list('id', flat=True))
+    for convo_id in archived.iterator(chunk_size=chunk_size):
+        found = similarity.question_and_answer(str(convo_id))
+        if found and similarity.answer_is_reusable(found[2]):
+            yield str(convo_id), found[0]
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the similarity index over past deliberations, or merges pending rows into it (--merge)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--merge', action='store_true',
+                            help="Only fold rows added since the last merge into the posting lists.")
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        index = similarity.get_index()
+        started = time.perf_counter()
+        if options['merge']:
+            index.merge()
+            self.stdout.write(f"Merged {index.path} ({len(index)} rows) in {time.perf_counter() - started:.1f}s")
+            return
+
+        added = index.rebuild(lambda: first_exchanges(options['chunk_size']))
+        self.stdout.write(f"Indexed {added} deliberations into {index.path} in {time.perf_counter() - started:.1f}s")
@@ -0,0 +1,31 @@
+
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deliberations import archive
+
+
+class Command(BaseCommand):
+    help = ("Runs the message compaction job once: archives old finished conversations, deletes old traces "
+            "and maintains the message table's partitions (if it is partitioned).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=None,
+                            help="Archive conversations idle for this many days "
+                                 "(default DELIBERATION_ARCHIVE_AFTER_DAYS; 0 skips archiving).")
+        parser.add_argument('--limit', type=int, default=None,
+                            help="Conversations archived per run (default DELIBERATION_ARCHIVE_BATCH).")
+        parser.add_argument('--restore', metavar='CONVERSATION_ID',
+                            help="Move one archived conversation's messages back into the message table instead.")
+
+    def handle(self, *args, **options):
+        if options['restore']:
+            restored = archive.restore_conversation(options['restore'])
+            if not restored:
+                raise CommandError(f"{options['restore']} is not archived")
+            self.stdout.write(f"Restored {restored} messages")
+            return
+        if options['days'] is not None and options['days'] < 0:
+            raise CommandError("--days must be >= 0")
+        self.stdout.write(json.dumps(archive.compact(options['days'], options['limit']), indent=2))
@@ -0,0 +1,46 @@
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DatabaseError
+
+from deliberations import partitions
+
+
+class Command(BaseCommand):
+    help = ("Converts the message table to monthly range partitions (PostgreSQL), or reports on them. "
+            "Message writes are blocked while rows are copied; run it in a quiet period.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--status', action='store_true', help="List the partitions and their row counts.")
+        parser.add_argument('--months-ahead', type=int, default=None,
+                            help="Months to create in advance (default DELIBERATION_PARTITION_MONTHS_AHEAD).")
+        parser.add_argument('--drop-old', action='store_true',
+                            help="Drop the unpartitioned table left by an earlier conversion.")
+
+    def handle(self, *args, **options):
+        if not partitions.supported():
+            raise CommandError("Partitioning the message table needs PostgreSQL")
+        if options['status']:
+            if not partitions.is_partitioned():
+                self.stdout.write(f"{partitions.TABLE} is not partitioned")
+            for name, rows in partitions.partition_sizes():
+                self.stdout.write(f"{name:<45}{rows:>12}")
+            return
+        if options['drop_old']:
+            dropped = partitions.drop_unpartitioned()
+            self.stdout.write(f"Dropped {partitions.UNPARTITIONED}" if dropped else "Nothing to drop")
+            return
+
+        months_ahead = options['months_ahead']
+        if months_ahead is None:
+            months_ahead = getattr(settings, 'DELIBERATION_PARTITION_MONTHS_AHEAD', 2)
+        if partitions.is_partitioned():
+            created = partitions.ensure_partitions(months_ahead)
+            self.stdout.write(f"Already partitioned; created {', '.join(created) or 'no new partitions'}")
+            return
+        try:
+            result = partitions.convert(months_ahead)
+        except (RuntimeError, DatabaseError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(f"Copied {result['rows']} messages into {len(result['partitions'])} partitions; "
+                          f"the old table is kept as {partitions.UNPARTITIONED} (drop it with --drop-old)")
@@ -0,0 +1,113 @@
+
+import json
+import statistics
+import time
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from agents import cassettes
+from deliberations.models import Conversation, Message
+from deliberations.tasks import run_deliberation_task
+from utils.security import store_api_keys
+
+
+def recorded_seconds(turns) -> float:
+    """
+    Wall time of a recorded run, up to the end of its last turn's stream.
+    """
+    return max((t["at"] + sum(item[0] for item in t["items"]) / 1000 for t in turns), default=0.0)
+
+
+class Command(BaseCommand):
+    help = ("Reruns recorded deliberations (DELIBERATION_RECORD_CASSETTES) in-process against their cassettes "
+            "instead of the providers, and reports timings for before/after comparisons.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('cassettes', nargs='+', help="Cassette files (<conversation_id>.jsonl.gz).")
+        parser.add_argument('--speed', type=float, default=1.0,
+                            help="Replay speed: 1 keeps the recorded timing, 10 is ten times faster, "
+                                 "0 does not wait at all (measures our own overhead only).")
+        parser.add_argument('--repeat', type=int, default=1)
+        parser.add_argument('--keep', action='store_true', help="Keep the replayed conversations.")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        if options['speed'] < 0:
+            raise CommandError("--speed must be >= 0")
+        report = []
+        for path in options['cassettes']:
+            try:
+                runs = cassettes.load(path)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Can't read {path}: {e}")
+            for _ in range(options['repeat']):
+                report.extend(self.replay(path, runs, options['speed'], options['keep']))
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        header = (f"{'cassette':<40}{'run':>5}{'turns':>7}{'recorded s':>12}{'replay s':>10}"
+                  f"{'overhead s':>12}{'ttft p50':>10}{'fuzzy':>7}{'miss':>6}")
+        self.stdout.write(header)
+        for row in report:
+            self.stdout.write(
+                f"{row['cassette'][-40:]:<40}{row['first_round']:>5}{row['turns']:>7}"
+                f"{row['recorded_s']:>12.2f}{row['replay_s']:>10.2f}{row['overhead_s']:>12.3f}"
+                f"{row['ttft_ms_p50'] or 0:>10.0f}{row['fuzzy']:>7}{row['misses']:>6}"
+            )
+
+    def replay(self, path, runs, speed, keep):
+        convo_id = str(uuid.uuid4())
+        rows = []
+        try:
+            for run in runs:
+                header = run["header"]
+                if header.get("first_round", 1) == 1:
+                    Conversation.objects.create(id=convo_id, title=header["question"][:50])
+                Message.objects.create(conversation_id=convo_id, agent_name='user', content=header["question"],
+                                       round_number=0, metadata={"replay_of": header["conversation_id"]})
+                # Dummy keys with the recorded names resolve the same models
+                store_api_keys(convo_id, {name: "replay" for name in header.get("keys", [])})
+
+                player = cassettes.Player(run["turns"], speed=speed)
+                cassettes.replay(convo_id, player)
+                latency_budget = header.get("latency_budget")
+                first_round = header.get("first_round", 1)
+                run_at = timezone.now()
+                started = time.perf_counter()
+                try:
+                    run_deliberation_task(
+                        convo_id, header["question"], header["max_rounds"], roster=header.get("roster"),
+                        latency_budget=latency_budget,
+                        deadline=time.time() + latency_budget if latency_budget else None,
+                        first_round=first_round, strategy=header.get("strategy", "rounds"))
+                finally:
+                    cassettes.stop_replay(convo_id)
+                elapsed = time.perf_counter() - started
+
+                recorded = recorded_seconds(run["turns"])
+                # This run's turns only: seats from its first round on, and its own Arbiter answer
+                ttfts = [m["ttft_ms"] for m in Message.objects.filter(conversation_id=convo_id)
+                         .filter(Q(round_number__gte=first_round) | Q(agent_name='arbiter', timestamp__gte=run_at))
+                         .exclude(agent_name='user').values_list('metadata', flat=True)
+                         if m.get("ttft_ms") is not None]
+                rows.append({
+                    "cassette": path,
+                    "first_round": first_round,
+                    "turns": len(run["turns"]),
+                    "recorded_s": recorded,
+                    "replay_s": elapsed,
+                    # Time not explained by (scaled) provider waits
+                    "overhead_s": elapsed - (recorded / speed if speed else 0.0),
+                    "ttft_ms_p50": statistics.median(ttfts) if ttfts else None,
+                    "fuzzy": player.fuzzy,
+                    "misses": player.misses,
+                    "unused": player.used.count(False),
+                })
+        finally:
+            if not keep:
+                Conversation.objects.filter(id=convo_id).delete()
+        return rows
@@ -0,0 +1,88 @@
+
+import statistics
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from deliberations import export
+from deliberations.models import Message
+
+
+def percentile(values, pct):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = ("Reports latency, token cost and agreement per deliberation for each agent roster / tier config "
+            "and strategy (rounds or self_consistency).")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only include messages from this date/datetime on.")
+        parser.add_argument('--until', help="Only include messages before this date/datetime.")
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            since = export.parse_bound(options['since'])
+            until = export.parse_bound(options['until'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        qs = Message.objects.filter(metadata__has_key='roster')
+        if since:
+            qs = qs.filter(timestamp__gte=since)
+        if until:
+            qs = qs.filter(timestamp__lt=until)
+
+        # conversation -> running totals; only per-turn metadata is pulled
+        per_convo = defaultdict(lambda: {"roster": None, "strategy": "rounds", "latency_ms": 0, "elapsed_ms": 0,
+                                         "tokens": 0, "cost_usd": 0.0, "turns": 0, "finished": False,
+                                         "agreement": []})
+        rows = qs.values_list('conversation_id', 'agent_name', 'metadata').iterator(chunk_size=options['chunk_size'])
+        for convo_id, agent_name, meta in rows:
+            totals = per_convo[convo_id]
+            totals["roster"] = meta.get("roster")
+            totals["latency_ms"] += meta.get("latency_ms") or 0
+            totals["tokens"] += (meta.get("input_tokens") or 0) + (meta.get("output_tokens") or 0)
+            totals["cost_usd"] += meta.get("cost_usd") or 0.0
+            totals["turns"] += 1
+            if agent_name == 'arbiter':
+                totals["finished"] = True
+                totals["strategy"] = meta.get("strategy") or "rounds"
+                # Wall-clock time; parallel samples overlap, so summed turn latency overstates it
+                if totals["elapsed_ms"] is not None and meta.get("elapsed_ms") is not None:
+                    totals["elapsed_ms"] += meta["elapsed_ms"]
+                else:
+                    totals["elapsed_ms"] = None
+                if meta.get("agreement_rate") is not None:
+                    totals["agreement"].append(meta["agreement_rate"])
+
+        per_roster = defaultdict(list)
+        for totals in per_convo.values():
+            # Partial (cancelled / failed / in-flight) deliberations skew the numbers
+            if totals["finished"]:
+                per_roster[(totals["roster"], totals["strategy"])].append(totals)
+
+        if not per_roster:
+            self.stdout.write("No finished deliberations with per-turn metadata in range.")
+            return
+
+        header = (f"{'roster':<16}{'strategy':<18}{'n':>6}{'turns':>7}{'p50 s':>9}{'p95 s':>9}"
+                  f"{'agree':>7}{'mean tok':>10}{'mean $':>10}{'total $':>10}")
+        self.stdout.write(header)
+        for (roster, strategy), convos in sorted(per_roster.items()):
+            latencies = [(c["latency_ms"] if c["elapsed_ms"] is None else c["elapsed_ms"]) / 1000 for c in convos]
+            agreement = [rate for c in convos for rate in c["agreement"]]
+            self.stdout.write(
+                f"{roster:<16}{strategy:<18}{len(convos):>6}"
+                f"{statistics.mean(c['turns'] for c in convos):>7.1f}"
+                f"{percentile(latencies, 50):>9.1f}{percentile(latencies, 95):>9.1f}"
+                f"{(f'{statistics.mean(agreement):.2f}' if agreement else '-'):>7}"
+                f"{statistics.mean(c['tokens'] for c in convos):>10.0f}"
+                f"{statistics.mean(c['cost_usd'] for c in convos):>10.4f}"
+                f"{sum(c['cost_usd'] for c in convos):>10.2f}"
+            )
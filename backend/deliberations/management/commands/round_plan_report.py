@@ -0,0 +1,155 @@
+
+import json
+import statistics
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from agents import consistency, planner
+from deliberations import export
+from deliberations.models import Message
+
+# Rounds a deliberation needed: the first round whose seat turns already agree
+# (on average, lexically) with the Arbiter's final answer. A lexical proxy,
+# but the same one for every tier and plan.
+
+
+def needed_rounds(rounds: dict, answer: str) -> int:
+    threshold = getattr(settings, "DELIBERATION_AGREEMENT_THRESHOLD", 0.5)
+    for round_num in sorted(rounds):
+        scores = [consistency.agreement([turn, answer])["mean_similarity"]
+                  for turn in rounds[round_num] if turn.strip()]
+        if scores and statistics.mean(scores) >= threshold:
+            return round_num
+    return max(rounds, default=1)
+
+
+def planned_deliberations(qs, chunk_size: int):
+    """
+    One dict per planned deliberation (first exchange only): question, plan,
+    seat turns and cost per round, Arbiter answer.
+    """
+    planned = qs.filter(agent_name='user', metadata__has_key='plan').values('conversation_id')
+    rows = (Message.objects.filter(conversation_id__in=planned)
+            .order_by('conversation_id', 'timestamp')
+            .values_list('conversation_id', 'agent_name', 'content', 'round_number', 'metadata')
+            .iterator(chunk_size=chunk_size))
+    current = None
+    for convo_id, agent_name, content, round_num, meta in rows:
+        meta = meta or {}
+        if current is None or current["id"] != convo_id:
+            if current and current["answer"] is not None:
+                yield current
+            current = {"id": convo_id, "question": None, "plan": None, "rounds": defaultdict(list),
+                       "cost": defaultdict(float), "answer": None}
+        if current["answer"] is not None:
+            continue  # follow-ups are not planned
+        if agent_name == 'user':
+            current["question"], current["plan"] = content, meta.get("plan")
+        elif agent_name == 'arbiter':
+            current["answer"] = content
+            current["cost"][0] += meta.get("cost_usd") or 0.0
+        elif not meta.get("error"):
+            current["rounds"][round_num].append(content)
+            current["cost"][round_num] += meta.get("cost_usd") or 0.0
+    if current and current["answer"] is not None:
+        yield current
+
+
+class Command(BaseCommand):
+    help = ("Compares planned with requested rounds per difficulty tier (agents/planner.py): how many rounds "
+            "deliberations needed, how often the plan would have been enough and what it saves. "
+            "--fit writes planner weights fitted on shadow-mode deliberations.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only include deliberations from this date/datetime on.")
+        parser.add_argument('--until', help="Only include deliberations before this date/datetime.")
+        parser.add_argument('--chunk-size', type=int, default=export.DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--fit', metavar='PATH',
+                            help="Fit the planner on deliberations that ran their full requested rounds "
+                                 "and write the weights here (use as DELIBERATION_PLANNER_WEIGHTS).")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            since = export.parse_bound(options['since'])
+            until = export.parse_bound(options['until'])
+        except ValueError as e:
+            raise CommandError(str(e))
+        qs = Message.objects.all()
+        if since:
+            qs = qs.filter(timestamp__gte=since)
+        if until:
+            qs = qs.filter(timestamp__lt=until)
+
+        per_tier = defaultdict(list)
+        samples = []
+        for convo in planned_deliberations(qs, options['chunk_size']):
+            plan = convo["plan"]
+            ran = max(convo["rounds"], default=0)
+            if not ran:
+                continue
+            needed = needed_rounds(convo["rounds"], convo["answer"])
+            row = {
+                "requested": plan["requested_rounds"],
+                "planned": plan["planned_rounds"],
+                "ran": ran,
+                "needed": needed,
+                "applied": plan.get("applied", False),
+                "cost_usd": sum(convo["cost"].values()),
+                # Spent on rounds the plan would have skipped
+                "excess_cost_usd": sum(cost for r, cost in convo["cost"].items() if r > plan["planned_rounds"]),
+            }
+            per_tier[plan["tier"]].append(row)
+            # Only full runs show whether later rounds were needed
+            if not row["applied"] and ran > 1:
+                samples.append((planner.features(convo["question"] or ""), needed > 1))
+
+        if options['fit']:
+            if len(samples) < 20:
+                raise CommandError(f"Only {len(samples)} shadow deliberations with 2+ rounds; need at least 20")
+            weights = planner.fit(samples)
+            with open(options['fit'], 'w') as fh:
+                json.dump(weights, fh, indent=2)
+            self.stdout.write(f"Fitted on {len(samples)} deliberations; wrote {options['fit']}")
+            return
+
+        report = []
+        for tier in planner.TIERS + sorted(set(per_tier) - set(planner.TIERS)):
+            rows = per_tier.get(tier)
+            if not rows:
+                continue
+            # Shadow runs went past the plan, so they tell whether it would have been enough
+            judged = [r for r in rows if not r["applied"] and r["ran"] > r["planned"]]
+            applied = [r for r in rows if r["applied"]]
+            report.append({
+                "tier": tier,
+                "n": len(rows),
+                "applied": len(applied),
+                "requested": statistics.mean(r["requested"] for r in rows),
+                "planned": statistics.mean(r["planned"] for r in rows),
+                "ran": statistics.mean(r["ran"] for r in rows),
+                "needed": statistics.mean(r["needed"] for r in rows),
+                "sufficient_rate": (sum(r["planned"] >= r["needed"] for r in judged) / len(judged)) if judged else None,
+                "rounds_saved": sum(r["requested"] - r["ran"] for r in applied),
+                "cost_usd": sum(r["cost_usd"] for r in rows),
+                "avoidable_cost_usd": sum(r["excess_cost_usd"] for r in rows if not r["applied"]),
+            })
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+        if not report:
+            self.stdout.write("No finished deliberations with a round plan in range.")
+            return
+        header = (f"{'tier':<10}{'n':>6}{'applied':>9}{'req':>6}{'plan':>6}{'ran':>6}{'needed':>8}"
+                  f"{'enough':>8}{'saved rd':>10}{'total $':>10}{'avoidable $':>13}")
+        self.stdout.write(header)
+        for row in report:
+            enough = f"{row['sufficient_rate']:.0%}" if row['sufficient_rate'] is not None else "-"
+            self.stdout.write(
+                f"{row['tier']:<10}{row['n']:>6}{row['applied']:>9}{row['requested']:>6.1f}{row['planned']:>6.1f}"
+                f"{row['ran']:>6.1f}{row['needed']:>8.1f}{enough:>8}{row['rounds_saved']:>10}"
+                f"{row['cost_usd']:>10.4f}{row['avoidable_cost_usd']:>13.4f}"
+            )
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 23:31
+
+from django.db import migrations, models
+
+
+def backfill_status(apps, schema_editor):
+    Conversation = apps.get_model('deliberations', 'Conversation')
+    Conversation.objects.filter(is_completed=True).update(status='completed')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliberations', '0002_export_time_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='conversation',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('running', 'Running'), ('completed', 'Completed'), ('cancelled', 'Cancelled'), ('failed', 'Failed')], default='pending', max_length=20),
+        ),
+        migrations.RunPython(backfill_status, migrations.RunPython.noop),
+    ]
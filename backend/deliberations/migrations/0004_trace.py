@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-19 00:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('deliberations', '0003_conversation_status'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Trace',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('first_round', models.IntegerField(default=1)),
+                ('started_at', models.DateTimeField()),
+                ('spans', models.JSONField(default=list)),
+                ('conversation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='traces', to='deliberations.conversation')),
+            ],
+            options={
+                'ordering': ['started_at'],
+            },
+        ),
+    ]
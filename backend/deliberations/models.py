@@ -1,12 +1,32 @@
 
 from django.db import models
+from django.utils import timezone
 import uuid
 
+class ConversationQuerySet(models.QuerySet):
+    def update(self, **kwargs):
+        # QuerySet.update() skips auto_now; status changes must move updated_at
+        # (the incremental export's watermark) too
+        kwargs.setdefault('updated_at', timezone.now())
+        return super().update(**kwargs)
+
 class Conversation(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+        ('failed', 'Failed'),
+    ]
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
     title = models.CharField(max_length=255, blank=True)
     is_completed = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    objects = ConversationQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.title[:50]} ({self.id})"
@@ -25,7 +45,7 @@ class Message(models.Model):
     agent_name = models.CharField(max_length=50, choices=AGENT_CHOICES) 
     content = models.TextField()
     round_number = models.IntegerField(default=0) # 0 for initial question
-    timestamp = models.DateTimeField(auto_now_add=True)
+    timestamp = models.DateTimeField(auto_now_add=True, db_index=True)
     is_internal_thought = models.BooleanField(default=False)
     
     # Metadata for structured output from agents (e.g. confidence score)
@@ -33,6 +53,37 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # History reads: one conversation's messages in order
+            models.Index(fields=['conversation', 'timestamp'], name='message_convo_time_idx'),
+        ]
         
     def __str__(self):
         return f"Round {self.round_number} - {self.agent_name}: {self.content[:30]}..."
+
+class Trace(models.Model):
+    """
+    Span tree of one deliberation run (utils/tracing.py), served as a
+    waterfall by the timeline endpoint.
+    """
+    conversation = models.ForeignKey(Conversation, related_name='traces', on_delete=models.CASCADE)
+    first_round = models.IntegerField(default=1) # Follow-up runs start after the earlier rounds
+    started_at = models.DateTimeField() # When the run was enqueued
+    # [[id, parent_id, name, start_us, duration_us, {attributes}?], ...]
+    spans = models.JSONField(default=list)
+
+    class Meta:
+        ordering = ['started_at']
+
+class ConversationArchive(models.Model):
+    """
+    Messages of an old finished conversation, moved out of the message table
+    by the retention job (deliberations/archive.py) and stored compressed.
+    """
+    conversation = models.OneToOneField(Conversation, primary_key=True, related_name='archive', on_delete=models.CASCADE)
+    archived_at = models.DateTimeField(auto_now_add=True)
+    message_count = models.IntegerField(default=0)
+    last_message_at = models.DateTimeField(null=True)
+    codec = models.CharField(max_length=10, default='zlib')
+    # One JSON line per message (Message fields), compressed with `codec`
+    data = models.BinaryField()
@@ -0,0 +1,261 @@
+
+import re
+from datetime import date
+from typing import List, Optional
+
+from django.db import DatabaseError, connection, transaction
+from django.utils import timezone
+
+from .models import Message
+
+# Monthly range partitioning of the message table on PostgreSQL (declarative
+# partitioning, PostgreSQL 12+). Inserts always land in the current month's
+# partition, so its indexes stay small, and once the retention job
+# (deliberations/archive.py) has emptied an old month its partition is
+# dropped instead of vacuumed row by row.
+#
+# The table created by the migrations is a plain table; `manage.py
+# partition_messages` converts it in place (convert()). The partitioned table
+# has the same columns and index names, with (id, timestamp) as primary key
+# since PostgreSQL requires the partition key in it; ids keep coming from a
+# sequence, so the ORM (which still sees `id` as the key) is unaffected.
+# Partitions are named <table>_yYYYYmMM, plus a DEFAULT partition catching
+# rows outside them (e.g. messages of a conversation restored from its archive
+# after its month was dropped). The compaction job keeps
+# DELIBERATION_PARTITION_MONTHS_AHEAD months created in advance.
+
+TABLE = Message._meta.db_table
+DEFAULT_PARTITION = f"{TABLE}_default"
+UNPARTITIONED = f"{TABLE}_unpartitioned"
+
+_MONTHLY = re.compile(rf"^{TABLE}_y(\d{{4}})m(\d{{2}})$")
+_INDEX_TABLE = re.compile(rf" ON (ONLY )?(\S+\.)?\"?{TABLE}\"? ")
+
+
+def supported() -> bool:
+    return connection.vendor == 'postgresql'
+
+
+def _qn(name: str) -> str:
+    return connection.ops.quote_name(name)
+
+
+def _table_exists(cursor, name: str) -> bool:
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [_qn(name)])
+    return cursor.fetchone()[0]
+
+
+def is_partitioned() -> bool:
+    if not supported():
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))",
+                       [_qn(TABLE)])
+        return cursor.fetchone()[0]
+
+
+def month_start(day) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, n: int) -> date:
+    years, index = divmod(month.month - 1 + n, 12)
+    return date(month.year + years, index + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{TABLE}_y{month.year}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = _MONTHLY.match(name)
+    return date(int(match.group(1)), int(match.group(2)), 1) if match else None
+
+
+def _bound(month: date) -> str:
+    # timestamp is a timestamptz column; months are cut in UTC
+    return f"'{month.isoformat()} 00:00:00+00'"
+
+
+def partitions() -> List[str]:
+    """
+    Names of the message table's partitions (empty if it is not partitioned).
+    """
+    if not supported():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid "
+                       "WHERE i.inhparent = to_regclass(%s) ORDER BY c.relname", [_qn(TABLE)])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def partition_sizes() -> List[tuple]:
+    """
+    (partition, rows) for every partition, for `partition_messages --status`.
+    """
+    sizes = []
+    with connection.cursor() as cursor:
+        for name in partitions():
+            cursor.execute(f"SELECT count(*) FROM {_qn(name)}")
+            sizes.append((name, cursor.fetchone()[0]))
+    return sizes
+
+
+def _create_partition(cursor, month: date, has_default: bool):
+    name = partition_name(month)
+    low, high = _bound(month), _bound(add_months(month, 1))
+    # Built detached and then attached, so rows of that month that already
+    # went to the DEFAULT partition can be moved into it first
+    cursor.execute(f"CREATE TABLE {_qn(name)} (LIKE {_qn(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)")
+    if has_default:
+        cursor.execute(f"WITH moved AS (DELETE FROM {_qn(DEFAULT_PARTITION)} "
+                       f"WHERE timestamp >= {low} AND timestamp < {high} RETURNING *) "
+                       f"INSERT INTO {_qn(name)} SELECT * FROM moved")
+    cursor.execute(f"ALTER TABLE {_qn(TABLE)} ATTACH PARTITION {_qn(name)} FOR VALUES FROM ({low}) TO ({high})")
+
+
+def ensure_partitions(months_ahead: int) -> List[str]:
+    """
+    Creates the partitions of this month and the next `months_ahead` ones
+    that don't exist yet. Returns their names.
+    """
+    if not is_partitioned():
+        return []
+    existing = set(partitions())
+    created = []
+    this_month = month_start(timezone.now())
+    for n in range(months_ahead + 1):
+        month = add_months(this_month, n)
+        name = partition_name(month)
+        if name in existing:
+            continue
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                _create_partition(cursor, month, DEFAULT_PARTITION in existing)
+            created.append(name)
+        except DatabaseError as e:
+            print(f"Error creating partition {name}: {e}")
+    return created
+
+
+def drop_empty_partitions(before) -> List[str]:
+    """
+    Drops monthly partitions that ended before `before` and hold no rows
+    (anymore). Returns their names.
+    """
+    if not is_partitioned():
+        return []
+    cutoff = month_start(before)
+    dropped = []
+    for name in partitions():
+        month = partition_month(name)
+        if month is None or add_months(month, 1) > cutoff:
+            continue
+        try:
+            with transaction.atomic(), connection.cursor() as cursor:
+                # Locked first, so no row can arrive between the check and the drop
+                cursor.execute(f"LOCK TABLE {_qn(name)} IN ACCESS EXCLUSIVE MODE")
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {_qn(name)})")
+                if cursor.fetchone()[0]:
+                    continue
+                cursor.execute(f"ALTER TABLE {_qn(TABLE)} DETACH PARTITION {_qn(name)}")
+                cursor.execute(f"DROP TABLE {_qn(name)}")
+            dropped.append(name)
+        except DatabaseError as e:
+            print(f"Error dropping partition {name}: {e}")
+    return dropped
+
+
+def conversion_months(months_ahead: int) -> List[date]:
+    """
+    Months the converted table starts with: from the oldest message's month
+    up to `months_ahead` months from now.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT min(timestamp) FROM {_qn(TABLE)}")
+        oldest = cursor.fetchone()[0]
+    last = add_months(month_start(timezone.now()), months_ahead)
+    month = month_start(oldest) if oldest else month_start(timezone.now())
+    months = []
+    while month <= last:
+        months.append(month)
+        month = add_months(month, 1)
+    return months
+
+
+def convert(months_ahead: int) -> dict:
+    """
+    Replaces the plain message table with a partitioned copy in one
+    transaction. Writes to messages block while rows are copied; reads don't.
+    The old table is kept as <table>_unpartitioned until dropped.
+    """
+    if not supported():
+        raise RuntimeError("Partitioning needs PostgreSQL")
+    if is_partitioned():
+        raise RuntimeError(f"{TABLE} is already partitioned")
+    new = f"{TABLE}_partitioned"
+    sequence = f"{TABLE}_id_part_seq"
+    with transaction.atomic(), connection.cursor() as cursor:
+        if _table_exists(cursor, UNPARTITIONED):
+            raise RuntimeError(f"{UNPARTITIONED} is left from an earlier conversion; drop it first")
+        cursor.execute("SELECT count(*) FROM pg_constraint WHERE confrelid = to_regclass(%s)", [_qn(TABLE)])
+        if cursor.fetchone()[0]:
+            raise RuntimeError(f"Foreign keys point to {TABLE}; a partitioned table can't be referenced by id alone")
+        cursor.execute(f"LOCK TABLE {_qn(TABLE)} IN SHARE ROW EXCLUSIVE MODE")
+        months = conversion_months(months_ahead)
+
+        # Same columns; ids from a sequence (partitioned tables take no identity columns before PostgreSQL 17)
+        cursor.execute(f"CREATE TABLE {_qn(new)} (LIKE {_qn(TABLE)} INCLUDING DEFAULTS INCLUDING CONSTRAINTS "
+                       f"INCLUDING STORAGE) PARTITION BY RANGE (timestamp)")
+        cursor.execute(f"CREATE SEQUENCE {_qn(sequence)} OWNED BY {_qn(new)}.id")
+        cursor.execute(f"SELECT setval(%s, coalesce((SELECT max(id) FROM {_qn(TABLE)}), 0) + 1, false)", [sequence])
+        cursor.execute(f"ALTER TABLE {_qn(new)} ALTER COLUMN id SET DEFAULT nextval('{sequence}')")
+        cursor.execute(f"ALTER TABLE {_qn(new)} ADD CONSTRAINT {_qn(TABLE + '_pkey_part')} PRIMARY KEY (id, timestamp)")
+        for month in months:
+            low, high = _bound(month), _bound(add_months(month, 1))
+            cursor.execute(f"CREATE TABLE {_qn(partition_name(month))} PARTITION OF {_qn(new)} "
+                           f"FOR VALUES FROM ({low}) TO ({high})")
+        cursor.execute(f"CREATE TABLE {_qn(DEFAULT_PARTITION)} PARTITION OF {_qn(new)} DEFAULT")
+
+        cursor.execute(f"INSERT INTO {_qn(new)} SELECT * FROM {_qn(TABLE)}")
+        copied = cursor.rowcount
+
+        # Indexes and foreign keys move over under their original names, which
+        # later migrations refer to
+        cursor.execute("SELECT i.relname, pg_get_indexdef(i.oid), x.indisunique FROM pg_index x "
+                       "JOIN pg_class i ON i.oid = x.indexrelid WHERE x.indrelid = to_regclass(%s) "
+                       "AND NOT x.indisprimary", [_qn(TABLE)])
+        for name, definition, unique in cursor.fetchall():
+            if unique:
+                print(f"Skipping unique index {name}: it can't be enforced without the partition key")
+                continue
+            cursor.execute(f"ALTER INDEX {_qn(name)} RENAME TO {_qn(name[:59] + '_old')}")
+            cursor.execute(_INDEX_TABLE.sub(f" ON {_qn(new)} ", definition, count=1))
+        cursor.execute("SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+                       "WHERE conrelid = to_regclass(%s) AND contype = 'f'", [_qn(TABLE)])
+        for name, definition in cursor.fetchall():
+            # Dropped from the old table: its copies would otherwise block deleting conversations
+            cursor.execute(f"ALTER TABLE {_qn(TABLE)} DROP CONSTRAINT {_qn(name)}")
+            cursor.execute(f"ALTER TABLE {_qn(new)} ADD CONSTRAINT {_qn(name)} {definition}")
+        cursor.execute("SELECT conname FROM pg_constraint WHERE conrelid = to_regclass(%s) AND contype = 'p'",
+                       [_qn(TABLE)])
+        primary_key = cursor.fetchone()[0]
+        cursor.execute(f"ALTER TABLE {_qn(TABLE)} RENAME CONSTRAINT {_qn(primary_key)} "
+                       f"TO {_qn(primary_key[:59] + '_old')}")
+
+        cursor.execute(f"ALTER TABLE {_qn(TABLE)} RENAME TO {_qn(UNPARTITIONED)}")
+        cursor.execute(f"ALTER TABLE {_qn(new)} RENAME TO {_qn(TABLE)}")
+        cursor.execute(f"ALTER TABLE {_qn(TABLE)} RENAME CONSTRAINT {_qn(TABLE + '_pkey_part')} "
+                       f"TO {_qn(primary_key)}")
+    return {"rows": copied, "partitions": [partition_name(m) for m in months] + [DEFAULT_PARTITION]}
+
+
+def drop_unpartitioned() -> bool:
+    """
+    Drops the table left by convert(), once the partitioned one is trusted.
+    """
+    with connection.cursor() as cursor:
+        if not _table_exists(cursor, UNPARTITIONED):
+            return False
+        cursor.execute(f"DROP TABLE {_qn(UNPARTITIONED)}")
+    return True
@@ -1,11 +1,14 @@
 
 from rest_framework import serializers
 from .models import Conversation, Message
+from agents.roster import roster_names
+from agents.consistency import STRATEGIES
+from agents.planner import MODES as PLANNING_MODES
 
 class ConversationSerializer(serializers.ModelSerializer):
     class Meta:
         model = Conversation
-        fields = ['id', 'created_at', 'title', 'is_completed']
+        fields = ['id', 'created_at', 'title', 'is_completed', 'status']
 
 class MessageSerializer(serializers.ModelSerializer):
     class Meta:
@@ -16,3 +19,29 @@ class StartDeliberationSerializer(serializers.Serializer):
     question = serializers.CharField(max_length=5000)
     api_keys = serializers.DictField(child=serializers.CharField(required=False, allow_blank=True), required=True)
     max_rounds = serializers.IntegerField(min_value=1, max_value=5, default=3)
+    roster = serializers.CharField(max_length=64, required=False)
+    # End-to-end latency budget in seconds, spread across the remaining turns
+    latency_budget = serializers.FloatField(min_value=10, max_value=900, required=False)
+    # Attach to an identical in-flight deliberation instead of starting a new one
+    share_inflight = serializers.BooleanField(required=False)
+    # Reuse a near-duplicate past answer ("answer") or pass it to the agents as context
+    reuse = serializers.ChoiceField(choices=['off', 'answer', 'context'], required=False)
+    # "rounds" (seats take turns) or "self_consistency" (independent samples, one Arbiter pass)
+    strategy = serializers.ChoiceField(choices=STRATEGIES, required=False)
+    # Independent answers drawn by the self-consistency strategy
+    samples = serializers.IntegerField(min_value=2, max_value=9, required=False)
+    # Plan the rounds from the question's difficulty ("on"), only record the plan ("shadow"), or "off"
+    plan_rounds = serializers.ChoiceField(choices=PLANNING_MODES, required=False)
+
+    def validate_roster(self, value):
+        if value not in roster_names():
+            raise serializers.ValidationError(f"Unknown roster. Available: {', '.join(roster_names())}")
+        return value
+
+class FollowUpSerializer(StartDeliberationSerializer):
+    # Extra rounds to run on top of the finished ones (DELIBERATION_FOLLOW_UP_ROUNDS if omitted)
+    max_rounds = serializers.IntegerField(min_value=1, max_value=5, required=False)
+    # Follow-ups always continue their own conversation
+    share_inflight = None
+    reuse = None
+    plan_rounds = None
@@ -0,0 +1,499 @@
+"""
+Local similarity index over past deliberations (CPU only, no model calls).
+
+Each finished deliberation's question becomes a hashed TF-IDF vector: word
+unigrams, word bigrams and character trigrams, hashed into BUCKETS features,
+sublinear tf * idf, L2 normalized. Vectors live in memory-mapped NumPy files
+under DELIBERATION_SIMILARITY_DIR, shared by the web and worker processes:
+
+    ids.u8        conversation UUID bytes, 16 per row
+    row_ptr.i64   CSR row offsets into feat / weight
+    feat.u32      feature (bucket) ids, sorted within a row
+    weight.f16    feature weights
+    df.i32        per-bucket document frequencies (for idf)
+    post_*-<gen>  the same matrix transposed (posting lists per bucket)
+    manifest.json row / nnz counts and the live postings generation
+
+Only questions are indexed, not the final answers: a lookup compares a new
+question with past questions, and answer text in a row would pull the
+similarity of even an exact repeat below the reuse thresholds. The answer is
+read back from the conversation (question_and_answer) once a match is found,
+and only deliberations with a reusable answer are indexed.
+
+Rows are appended when a deliberation completes. New rows are scanned
+directly until they exceed DELIBERATION_SIMILARITY_DELTA_NNZ, then merged
+into the posting lists (a linear merge, no full re-sort).
+
+A lookup walks the posting lists of the query's rarest features first, up to
+DELIBERATION_SIMILARITY_POSTINGS_BUDGET entries, so common words never make
+it scan a large part of the index. The best candidates are then rescored with
+their exact cosine similarity from the row vectors.
+"""
+import fcntl
+import json
+import os
+import re
+import threading
+import uuid
+import zlib
+from collections import Counter
+from typing import Iterable, List, Optional, Tuple
+
+import numpy as np
+from django.conf import settings
+
+BUCKETS = 1 << 20
+_MASK = BUCKETS - 1
+_WORD = re.compile(r"\w+")
+
+MANIFEST = "manifest.json"
+EMPTY_MANIFEST = {"docs": 0, "nnz": 0, "df_docs": 0, "indexed_docs": 0, "indexed_nnz": 0, "generation": 0}
+
+# name -> dtype of the append-only row files
+ROW_FILES = {
+    "ids.u8": np.uint8,
+    "row_ptr.i64": np.int64,
+    "feat.u32": np.uint32,
+    "weight.f16": np.float16,
+}
+
+# Candidates rescored exactly after the posting-list pass
+RERANK = 32
+# Rows folded into the posting lists per merge step (bounds merge memory)
+MERGE_SLICE_NNZ = 20_000_000
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def features(text: str) -> Counter:
+    """
+    Hashed feature counts of a text: {bucket: count}.
+    """
+    words = _WORD.findall(text.lower())
+    grams = [f"w:{w}" for w in words]
+    grams += [f"b:{a} {b}" for a, b in zip(words, words[1:])]
+    for w in words:
+        padded = f" {w} "
+        grams += [f"c:{padded[i:i + 3]}" for i in range(len(padded) - 2)]
+    return Counter(zlib.crc32(g.encode()) & _MASK for g in grams)
+
+
+def _vector(counts: Counter, df, n_docs: int):
+    """
+    (sorted buckets, L2 normalized tf-idf weights) for feature counts.
+    """
+    buckets = np.fromiter(counts.keys(), np.int64, len(counts))
+    tf = 1 + np.log(np.fromiter(counts.values(), np.float64, len(counts)))
+    idf = np.log((1 + n_docs) / (1 + df[buckets].astype(np.float64))) + 1
+    weights = tf * idf
+    weights /= np.linalg.norm(weights)
+    order = np.argsort(buckets)
+    return buckets[order].astype(np.uint32), weights[order].astype(np.float32)
+
+
+class SimilarityIndex:
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime = None
+        # (manifest, maps), swapped as one so a search never mixes generations
+        self._state = (dict(EMPTY_MANIFEST), {})
+        self._map_keys = {}
+        self._refresh_lock = threading.Lock()
+
+    # --- files ---
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _postings(self, generation: int) -> dict:
+        return {
+            f"post_ptr-{generation}.i64": np.int64,
+            f"post_row-{generation}.i32": np.int32,
+            f"post_w-{generation}.f16": np.float16,
+        }
+
+    def _read_manifest(self) -> dict:
+        try:
+            with open(self._file(MANIFEST)) as fh:
+                return {**EMPTY_MANIFEST, **json.load(fh)}
+        except FileNotFoundError:
+            return dict(EMPTY_MANIFEST)
+
+    def _write_manifest(self, manifest: dict):
+        tmp = self._file(MANIFEST + ".tmp")
+        with open(tmp, "w") as fh:
+            json.dump(manifest, fh)
+        os.replace(tmp, self._file(MANIFEST))
+
+    def _map(self, name: str, dtype, mode: str = "r"):
+        path = self._file(name)
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            return np.empty(0, dtype)
+        mapped = np.memmap(path, dtype=dtype, mode=mode)
+        # Readers slice these per lookup; a plain ndarray view skips np.memmap's per-slice overhead
+        return mapped if mode != "r" else mapped.view(np.ndarray)
+
+    def _grow(self, name: str, dtype, length: int):
+        """
+        Makes an append-only file hold at least `length` items (doubling).
+        """
+        path = self._file(name)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        needed = length * np.dtype(dtype).itemsize
+        if size < needed:
+            with open(path, "ab") as fh:
+                fh.truncate(max(needed, size * 2, 1 << 16))
+
+    def _lock(self):
+        os.makedirs(self.path, exist_ok=True)
+        fh = open(self._file("lock"), "w")
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        return fh
+
+    def _df(self):
+        self._grow("df.i32", np.int32, BUCKETS)
+        return self._map("df.i32", np.int32, mode="r+")
+
+    # --- reading ---
+
+    def _refresh(self):
+        """
+        Re-maps the files when a writer has published a new manifest.
+        """
+        try:
+            mtime = os.stat(self._file(MANIFEST)).st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self._mtime:
+            return self._state
+        with self._refresh_lock:
+            previous = self._state[1]
+            for _ in range(3):
+                manifest = self._read_manifest()
+                postings = self._postings(manifest["generation"])
+                files = dict(ROW_FILES, **{"df.i32": np.int32}, **postings)
+                maps = {name: self._remap(name, dtype, previous.get(name)) for name, dtype in files.items()}
+                # A merge may have replaced this generation in the meantime
+                if not manifest["generation"] or len(maps[next(iter(postings))]):
+                    break
+            self._state = (manifest, maps)
+            self._mtime = mtime
+        return self._state
+
+    def _remap(self, name: str, dtype, current):
+        """
+        Keeps an existing mapping while its file has not been replaced or
+        grown: re-mapping would fault every page back in on the next lookup.
+        """
+        try:
+            stat = os.stat(self._file(name))
+        except FileNotFoundError:
+            return np.empty(0, dtype)
+        key = (stat.st_ino, stat.st_size)
+        if current is not None and self._map_keys.get(name) == key:
+            return current
+        self._map_keys[name] = key
+        return self._map(name, dtype)
+
+    def __len__(self):
+        return self._refresh()[0]["docs"]
+
+    def search(self, text: str, limit: int = 5) -> List[Tuple[str, float]]:
+        """
+        [(conversation_id, cosine similarity)] of the closest indexed questions.
+        """
+        manifest, maps = self._refresh()
+        if not manifest["docs"]:
+            return []
+        counts = features(text)
+        if not counts:
+            return []
+        q_feat, q_w = _vector(counts, maps["df.i32"], manifest["df_docs"])
+
+        rows, scores = [], []
+        # Posting lists, rarest features first, within the budget
+        gen = manifest["generation"]
+        if gen:
+            post_ptr = maps[f"post_ptr-{gen}.i64"]
+            post_row = maps[f"post_row-{gen}.i32"]
+            post_w = maps[f"post_w-{gen}.f16"]
+            starts = post_ptr[q_feat]
+            lengths = post_ptr[q_feat.astype(np.int64) + 1] - starts
+            budget = _setting("DELIBERATION_SIMILARITY_POSTINGS_BUDGET", 20000)
+            used = 0
+            for i in np.argsort(lengths, kind="stable"):
+                n = int(lengths[i])
+                if not n:
+                    continue
+                if used and used + n > budget:
+                    break
+                start = int(starts[i])
+                rows.append(post_row[start:start + n])
+                scores.append(post_w[start:start + n].astype(np.float32) * q_w[i])
+                used += n
+
+        # Rows added since the last merge are scanned directly
+        row_ptr, feat, weight = maps["row_ptr.i64"], maps["feat.u32"], maps["weight.f16"]
+        lo, hi = manifest["indexed_nnz"], manifest["nnz"]
+        if hi > lo:
+            delta = np.asarray(feat[lo:hi])
+            pos = np.flatnonzero(np.isin(delta, q_feat))
+            if pos.size:
+                first = manifest["indexed_docs"]
+                rows.append(np.searchsorted(row_ptr[first:manifest["docs"] + 1], pos + lo, side="right") - 1 + first)
+                scores.append(weight[lo:hi][pos].astype(np.float32) * q_w[np.searchsorted(q_feat, delta[pos])])
+
+        if not rows:
+            return []
+        candidates, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        partial = np.bincount(inverse, weights=np.concatenate(scores))
+        if len(candidates) > RERANK:
+            candidates = candidates[np.argpartition(-partial, RERANK)[:RERANK]]
+
+        # Exact cosine, including the common features the budget skipped
+        starts = row_ptr[candidates]
+        lengths = row_ptr[candidates + 1] - starts
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        row_feat = feat[offsets]
+        idx = np.minimum(np.searchsorted(q_feat, row_feat), len(q_feat) - 1)
+        contrib = np.where(q_feat[idx] == row_feat, weight[offsets].astype(np.float32) * q_w[idx], 0)
+        exact = np.bincount(np.repeat(np.arange(len(candidates)), lengths), weights=contrib,
+                            minlength=len(candidates))
+
+        ids = maps["ids.u8"]
+        best = {}
+        for i in np.argsort(-exact):
+            row = int(candidates[i])
+            convo_id = str(uuid.UUID(bytes=ids[row * 16:(row + 1) * 16].tobytes()))
+            # A conversation indexed twice keeps its best row
+            best.setdefault(convo_id, float(exact[i]))
+            if len(best) == limit:
+                break
+        return list(best.items())
+
+    # --- writing ---
+
+    def add_many(self, docs: Iterable[Tuple[str, str]], update_df: bool = True, batch_size: int = 10000,
+                 auto_merge: bool = True) -> int:
+        """
+        Appends (conversation_id, question) rows. Returns the number added.
+        """
+        added = 0
+        batch = []
+        for convo_id, text in docs:
+            counts = features(text)
+            if counts:
+                batch.append((uuid.UUID(str(convo_id)).bytes, counts))
+            if len(batch) >= batch_size:
+                added += self._append(batch, update_df, auto_merge)
+                batch = []
+        if batch:
+            added += self._append(batch, update_df, auto_merge)
+        return added
+
+    def add(self, conversation_id: str, question: str) -> bool:
+        return bool(self.add_many([(conversation_id, question)]))
+
+    def _append(self, batch, update_df: bool, auto_merge: bool = True) -> int:
+        with self._lock():
+            manifest = self._read_manifest()
+            df = self._df()
+            if update_df:
+                for _, counts in batch:
+                    df[np.fromiter(counts.keys(), np.int64, len(counts))] += 1
+                manifest["df_docs"] += len(batch)
+
+            docs, nnz = manifest["docs"], manifest["nnz"]
+            new_nnz = sum(len(counts) for _, counts in batch)
+            self._grow("ids.u8", np.uint8, (docs + len(batch)) * 16)
+            self._grow("row_ptr.i64", np.int64, docs + len(batch) + 1)
+            self._grow("feat.u32", np.uint32, nnz + new_nnz)
+            self._grow("weight.f16", np.float16, nnz + new_nnz)
+            maps = {name: self._map(name, dtype, mode="r+") for name, dtype in ROW_FILES.items()}
+
+            n_docs = max(manifest["df_docs"], 1)
+            for id_bytes, counts in batch:
+                buckets, weights = _vector(counts, df, n_docs)
+                maps["ids.u8"][docs * 16:(docs + 1) * 16] = np.frombuffer(id_bytes, np.uint8)
+                maps["feat.u32"][nnz:nnz + len(buckets)] = buckets
+                maps["weight.f16"][nnz:nnz + len(buckets)] = weights
+                nnz += len(buckets)
+                docs += 1
+                maps["row_ptr.i64"][docs] = nnz
+            for mapped in maps.values():
+                mapped.flush()
+            df.flush()
+
+            manifest["docs"], manifest["nnz"] = docs, nnz
+            if auto_merge and nnz - manifest["indexed_nnz"] > _setting("DELIBERATION_SIMILARITY_DELTA_NNZ", 100000):
+                self._merge(manifest)
+            self._write_manifest(manifest)
+        return len(batch)
+
+    def merge(self):
+        """
+        Folds rows added since the last merge into the posting lists.
+        """
+        with self._lock():
+            manifest = self._read_manifest()
+            # A large backlog (e.g. a rebuild) is merged in slices to bound memory
+            while manifest["nnz"] > manifest["indexed_nnz"]:
+                self._merge(manifest, max_nnz=MERGE_SLICE_NNZ)
+                self._write_manifest(manifest)
+
+    def _merge(self, manifest: dict, max_nnz: int = None):
+        """
+        Writes generation+1 of the posting lists (caller holds the lock and
+        writes the manifest). Every bucket keeps its old entries followed by
+        the new ones, so between buckets that got new entries the old data
+        moves by a constant offset and is copied block by block.
+        """
+        row_ptr = self._map("row_ptr.i64", np.int64)
+        feat = self._map("feat.u32", np.uint32)
+        weight = self._map("weight.f16", np.float16)
+        first, docs = manifest["indexed_docs"], manifest["docs"]
+        lo, hi = manifest["indexed_nnz"], manifest["nnz"]
+        if max_nnz and hi - lo > max_nnz:
+            docs = max(int(np.searchsorted(row_ptr[first:docs + 1], lo + max_nnz, side="right")) - 1 + first, first + 1)
+            hi = int(row_ptr[docs])
+
+        delta_feat = np.asarray(feat[lo:hi])
+        delta_row = np.repeat(np.arange(first, docs, dtype=np.int32), np.diff(row_ptr[first:docs + 1]))
+        order = np.argsort(delta_feat, kind="stable")
+        delta_feat, delta_row, delta_w = delta_feat[order], delta_row[order], np.asarray(weight[lo:hi])[order]
+        delta_count = np.bincount(delta_feat, minlength=BUCKETS)
+        delta_start = np.concatenate(([0], np.cumsum(delta_count)))
+
+        old_gen = manifest["generation"]
+        if old_gen:
+            old = self._postings(old_gen)
+            old_ptr, old_row, old_w = (self._map(name, dtype) for name, dtype in old.items())
+        else:
+            old_ptr, old_row, old_w = np.zeros(BUCKETS + 1, np.int64), np.empty(0, np.int32), np.empty(0, np.float16)
+        new_ptr = old_ptr + delta_start
+
+        gen = old_gen + 1
+        names = list(self._postings(gen))
+        np.asarray(new_ptr, np.int64).tofile(self._file(names[0]))
+        new_row = np.memmap(self._file(names[1]), dtype=np.int32, mode="w+", shape=(hi,))
+        new_w = np.memmap(self._file(names[2]), dtype=np.float16, mode="w+", shape=(hi,))
+
+        start = 0
+        for bucket in np.append(np.flatnonzero(delta_count), BUCKETS):
+            # Old entries of buckets start..bucket share one offset
+            end = min(bucket + 1, BUCKETS)
+            a, b = int(old_ptr[start]), int(old_ptr[end])
+            shift = int(new_ptr[start] - old_ptr[start])
+            new_row[a + shift:b + shift] = old_row[a:b]
+            new_w[a + shift:b + shift] = old_w[a:b]
+            if bucket < BUCKETS:
+                d0, d1 = int(delta_start[bucket]), int(delta_start[bucket + 1])
+                at = int(new_ptr[bucket + 1]) - (d1 - d0)
+                new_row[at:at + d1 - d0] = delta_row[d0:d1]
+                new_w[at:at + d1 - d0] = delta_w[d0:d1]
+            start = end
+        new_row.flush()
+        new_w.flush()
+
+        manifest["generation"] = gen
+        manifest["indexed_docs"], manifest["indexed_nnz"] = docs, hi
+        # Readers still holding the old generation keep their mappings
+        if old_gen:
+            for name in self._postings(old_gen):
+                os.remove(self._file(name))
+
+    def reset(self):
+        with self._lock():
+            for name in os.listdir(self.path):
+                if name != "lock":
+                    os.remove(self._file(name))
+
+    def rebuild(self, docs_factory, batch_size: int = 10000) -> int:
+        """
+        Rebuilds the index from scratch. `docs_factory()` must return a fresh
+        iterable of (conversation_id, question) on every call: document
+        frequencies are counted in a first pass so every row gets final idf.
+        """
+        self.reset()
+        with self._lock():
+            df = self._df()
+            n_docs = 0
+            for _, text in docs_factory():
+                counts = features(text)
+                if counts:
+                    df[np.fromiter(counts.keys(), np.int64, len(counts))] += 1
+                    n_docs += 1
+            df.flush()
+            self._write_manifest({**EMPTY_MANIFEST, "df_docs": n_docs})
+        added = self.add_many(docs_factory(), update_df=False, batch_size=batch_size, auto_merge=False)
+        self.merge()
+        return added
+
+
+# --- deliberations ---
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index() -> SimilarityIndex:
+    path = str(_setting("DELIBERATION_SIMILARITY_DIR", "") or os.path.join(settings.BASE_DIR, "var", "similarity"))
+    index = _indexes.get(path)
+    if index is None:
+        with _indexes_lock:
+            index = _indexes.setdefault(path, SimilarityIndex(path))
+    return index
+
+
+def question_and_answer(conversation_id: str) -> Optional[Tuple[str, str, dict]]:
+    """
+    (question, Arbiter answer, answer metadata) of a conversation's first exchange.
+    """
+    from .archive import archived_messages
+    from .models import Conversation, Message
+
+    answer = (Message.objects.filter(conversation_id=conversation_id, agent_name='arbiter')
+              .order_by('timestamp').values_list('content', 'metadata').first())
+    question = None
+    if not answer:
+        archived = archived_messages(conversation_id) or []
+        answer = next(((m.content, m.metadata) for m in archived if m.agent_name == 'arbiter'), None)
+        if not answer:
+            return None
+        question = next((m.content for m in archived if m.agent_name == 'user'), None)
+    question = (question
+                or Message.objects.filter(conversation_id=conversation_id, agent_name='user')
+                .order_by('timestamp').values_list('content', flat=True).first()
+                or Conversation.objects.filter(id=conversation_id).values_list('title', flat=True).first())
+    if not question:
+        return None
+    return question, answer[0], answer[1] or {}
+
+
+def answer_is_reusable(metadata: dict) -> bool:
+    # Failed, cut off or fallback (nothing streamed) answers are not worth reusing
+    return not (metadata.get("error") or metadata.get("truncated") or metadata.get("chunks") == 0
+                or metadata.get("reused_from"))
+
+
+def index_conversation(conversation_id: str) -> bool:
+    """
+    Adds a completed deliberation's question to the index (called by the worker).
+    """
+    found = question_and_answer(conversation_id)
+    if not found or not answer_is_reusable(found[2]):
+        return False
+    return get_index().add(conversation_id, found[0])
+
+
+def find_similar(question: str, threshold: float) -> Optional[Tuple[str, float]]:
+    """
+    (conversation_id, similarity) of the closest past deliberation at or
+    above `threshold`, or None.
+    """
+    for convo_id, score in get_index().search(question, limit=1):
+        if score >= threshold:
+            return convo_id, score
+    return None
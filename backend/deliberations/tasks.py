@@ -1,50 +1,145 @@
 
+import time
+
 from celery import shared_task
-from agents.graph import agent_graph
 from deliberations.models import Conversation, Message
-from utils.security import store_api_keys
 from utils.stream import publish_update
-from langchain_core.messages import HumanMessage
+from utils.cancellation import DeliberationCancelled, register_token, release_token
+from utils import admission, singleflight, tracing
 
 @shared_task
-def run_deliberation_task(conversation_id, question, max_rounds):
+def run_deliberation_task(conversation_id, question, max_rounds, roster=None, latency_budget=None, deadline=None,
+                          first_round=1, related=None, strategy="rounds", enqueued_at=None, queue=None):
+    from agents import cassettes
+
+    # Out of the queue: takes a worker slot (utils/admission.py). Cassette
+    # replays don't go through the queue and stay out of its bookkeeping.
+    run_started = time.time()
+    admitted = not cassettes.replaying(conversation_id)
+    if admitted:
+        admission.started(conversation_id, queue)
+    publish_update(conversation_id, {
+        "type": "started",
+        "queued_ms": round((run_started - enqueued_at) * 1000) if enqueued_at else None,
+    })
+
+    # Span tree of this run, from the moment it was enqueued (utils/tracing.py)
+    tracing.start(conversation_id, first_round, enqueued_at)
+
+    # The agent stack (LangGraph + provider SDKs) is only imported inside the
+    # worker, the first time a deliberation actually runs.
+    with tracing.span(conversation_id, "import agents"):
+        from agents.graph import get_agent_graph
+        from agents.roster import get_roster, default_roster_name
+        from agents.budget import arbiter_reserve
+        from agents.followup import follow_up_seed, related_seed
+        from langchain_core.messages import HumanMessage
+
     # Store keys first (if not already stored separately, but task might run on different worker)
     # Actually, keys should be stored by the View before calling task to ensure they are available.
     # But just in case, we can refresh them or access them here.
     
+    roster = roster or default_roster_name()
+
+    # A follow-up (first_round > 1) starts from a compacted summary of the
+    # earlier exchanges instead of their raw transcript. A new question may be
+    # seeded with a similar past deliberation's answer (`related`).
+    with tracing.span(conversation_id, "db seed"):
+        if first_round > 1:
+            seed = follow_up_seed(conversation_id, question)
+        elif related:
+            seed = related_seed(related, question)
+        else:
+            seed = question
+
     # Initialize State
     initial_state = {
-        "messages": [HumanMessage(content=question)],
-        "current_round": 1,
+        "messages": [HumanMessage(content=seed)],
+        "current_round": first_round,
         "max_rounds": max_rounds,
         # Logic in graph: current_round > max_rounds. 
         # If we want 3 full rounds of debate: max_rounds=3.
-        # Nodes: OpenAI -> Gemini -> DeepSeek -> Update (+1).
+        # Nodes: Seat 1 -> ... -> Seat N -> Update (+1).
         # So loop runs 3 times.
-        "participants": ["OpenAI", "Gemini", "DeepSeek"],
+        "participants": [seat["name"] for seat in get_roster(roster)["seats"]],
         "final_answer": None,
         "question": question,
-        "conversation_id": conversation_id
+        "conversation_id": conversation_id,
+        "roster": roster,
+        "deadline": deadline,
+        "arbiter_reserve": arbiter_reserve(latency_budget) if latency_budget else 0,
+        # Self-consistency runs one parallel sample per round (first_round..max_rounds)
+        "strategy": strategy,
+        "started_at": None,
     }
     
-    # Run Graph
-    # We use invoke for synchronous run in Celery worker
+    # Cancelled while still queued: don't start any LLM work
+    cancel = register_token(conversation_id)
+    outcome = "failed"
     try:
-        config = {"configurable": {"thread_id": conversation_id}}
-        final_state = agent_graph.invoke(initial_state, config=config)
-        
+        cancel.raise_if_cancelled(force=True)
+        with tracing.span(conversation_id, "db update", status="running"):
+            Conversation.objects.filter(id=conversation_id).update(status='running')
+
+        # Run Graph
+        # We use invoke for synchronous run in Celery worker
+        # Each follow-up gets its own thread so the checkpointer does not
+        # append the new run to the previous run's messages
+        thread_id = conversation_id if first_round == 1 else f"{conversation_id}:{first_round}"
+        config = {"configurable": {"thread_id": thread_id}}
+        cassettes.start_recording(conversation_id, {
+            "question": question, "max_rounds": max_rounds, "roster": roster, "strategy": strategy,
+            "first_round": first_round, "latency_budget": latency_budget, "related": related,
+        })
+        initial_state["started_at"] = time.time()
+        with tracing.span(conversation_id, "graph", roster=roster, strategy=strategy):
+            final_state = get_agent_graph(roster, strategy).invoke(initial_state, config=config)
+
         # Mark conversation as completed
-        try:
-            convo = Conversation.objects.get(id=conversation_id)
-            convo.is_completed = True
-            convo.save()
-        except:
-            pass
-            
+        with tracing.span(conversation_id, "db update", status="completed"):
+            Conversation.objects.filter(id=conversation_id).update(is_completed=True, status='completed')
+        outcome = "completed"
+
+        # Make the answer available to later near-duplicate questions
+        if first_round == 1 and not cassettes.replaying(conversation_id):
+            try:
+                with tracing.span(conversation_id, "similarity index"):
+                    from deliberations.similarity import index_conversation
+                    index_conversation(conversation_id)
+            except Exception as e:
+                print(f"Error indexing {conversation_id}: {e}")
+
+    except DeliberationCancelled as e:
+        print(f"Deliberation {conversation_id} cancelled ({e.reason})")
+        outcome = "cancelled"
+        Conversation.objects.filter(id=conversation_id).update(status='cancelled')
+        publish_update(conversation_id, {
+            "type": "cancelled",
+            "reason": e.reason
+        })
     except Exception as e:
         # Log error
+        Conversation.objects.filter(id=conversation_id).update(status='failed')
         publish_update(conversation_id, {
             "type": "error",
             "message": str(e)
         })
         raise e
+    finally:
+        if admitted:
+            # Only completed runs are representative of the queue's run time
+            admission.finished(conversation_id, queue,
+                               time.time() - run_started if outcome == "completed" else None)
+        release_token(conversation_id)
+        cassettes.stop_recording(conversation_id)
+        singleflight.release(conversation_id)
+        tracing.finish(conversation_id, status=outcome, roster=roster, strategy=strategy)
+
+@shared_task
+def compact_messages_task():
+    # Retention / partition upkeep for the message table (deliberations/archive.py),
+    # scheduled by Celery beat
+    from deliberations.archive import compact
+    result = compact()
+    print(f"Message compaction: {result}")
+    return result
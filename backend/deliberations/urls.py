@@ -1,9 +1,13 @@
 
 from django.urls import path
-from .views import StartDeliberationView, MessageStreamView, ConversationHistoryView
+from .views import StartDeliberationView, MessageStreamView, ConversationHistoryView, CancelDeliberationView, FollowUpView, TimelineView, ExportView
 
 urlpatterns = [
     path('conversation/start/', StartDeliberationView.as_view(), name='start_deliberation'),
     path('conversation/<str:conversation_id>/stream/', MessageStreamView.as_view(), name='message_stream'),
+    path('conversation/<str:conversation_id>/follow-up/', FollowUpView.as_view(), name='follow_up'),
+    path('conversation/<str:conversation_id>/cancel/', CancelDeliberationView.as_view(), name='cancel_deliberation'),
     path('conversation/<str:conversation_id>/history/', ConversationHistoryView.as_view(), name='conversation_history'),
+    path('conversation/<str:conversation_id>/timeline/', TimelineView.as_view(), name='conversation_timeline'),
+    path('export/', ExportView.as_view(), name='export'),
 ]
@@ -4,16 +4,69 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from django.shortcuts import get_object_or_404
-from django.http import StreamingHttpResponse
+from django.http import StreamingHttpResponse, JsonResponse
 
-import json
+import time
+import uuid
 import redis
 from django.conf import settings
 
 from .models import Conversation, Message
-from .serializers import StartDeliberationSerializer, MessageSerializer, ConversationSerializer
-from .tasks import run_deliberation_task
+from .serializers import StartDeliberationSerializer, FollowUpSerializer, MessageSerializer, ConversationSerializer
+from .dispatch import dispatch_deliberation
+from . import export
+from .archive import archived_messages, restore_conversation
 from utils.security import store_api_keys
+from utils.cancellation import request_cancel, clear_cancel, touch_subscriber
+from utils.stream import channel_name, decode_frame, dumps, FRAME_TAGS, TERMINAL_TAGS
+from utils import admission, singleflight, tracing
+from agents.roster import get_roster, default_roster_name, resolved_providers
+from agents.followup import next_round, previous_roster
+from agents.consistency import sample_plan
+from agents.planner import plan_rounds
+
+def find_similar(question: str, threshold: float):
+    """
+    (conversation_id, similarity) of the closest past deliberation, or None.
+    A missing or unreadable index never blocks starting a deliberation.
+    """
+    try:
+        # numpy is only loaded once reuse is actually used
+        from . import similarity
+        return similarity.find_similar(question, threshold)
+    except Exception as e:
+        print(f"Error searching similarity index: {e}")
+        return None
+
+def reuse_answer(prior_id: str, score: float, question: str):
+    """
+    Records a finished conversation answered with a past deliberation's
+    Arbiter answer. Returns its id, or None if that answer can't be reused.
+    """
+    from . import similarity
+    found = similarity.question_and_answer(prior_id)
+    if not found or not similarity.answer_is_reusable(found[2]):
+        return None
+    convo_id = str(uuid.uuid4())
+    Conversation.objects.create(id=convo_id, title=question[:50], status='completed', is_completed=True)
+    Message.objects.create(conversation_id=convo_id, agent_name='user', content=question, round_number=0)
+    Message.objects.create(conversation_id=convo_id, agent_name='arbiter', content=found[1], round_number=0,
+                           metadata={"seat": "arbiter", "reused_from": prior_id, "similarity": round(score, 4)})
+    return convo_id
+
+
+def queue_full(e: admission.QueueFull) -> Response:
+    return Response({"error": "Too many deliberations waiting, try again later", "retry_after": e.retry_after,
+                     "running": e.active, "queued": e.queued},
+                    status=status.HTTP_429_TOO_MANY_REQUESTS, headers={"Retry-After": str(e.retry_after)})
+
+
+def joinable(conversation_id: str) -> bool:
+    """
+    Whether a single-flight leader's conversation can still be attached to
+    (not gone, cancelled or failed).
+    """
+    return Conversation.objects.filter(id=conversation_id).exclude(status__in=('cancelled', 'failed')).exists()
 
 class StartDeliberationView(APIView):
     def post(self, request):
@@ -21,35 +74,163 @@ class StartDeliberationView(APIView):
         if serializer.is_valid():
             question = serializer.validated_data['question']
             keys = serializer.validated_data['api_keys']
-            
-            # Create Conversation
-            convo = Conversation.objects.create(title=question[:50])
-            convo_id = str(convo.id)
-            
-            # Store Keys Securely
-            store_api_keys(convo_id, keys)
-            
-            # Launch Celery Task
-            # Pass keys explicitly? Or rely on stored ones? 
-            # We already stored them. `run_deliberation_task` receives dict? 
-            # `run_deliberation_task` expects `api_keys` argument in my definition?
-            # Let's check `tasks.py`. Yes it takes `api_keys`.
-            # But safer to just pass ID and have task fetch them?
-            # Actually, passing dict to Celery persists keys in broker task payload (Redis).
-            # This is risky if broker is persistent or monitored.
-            # Best practice: Do NOT pass keys as task args if possible.
-            # I will modify `tasks.py` to fetch from `utils.security.get_api_keys(id)`.
-            # Since I already implemented `get_api_keys` logic inside `nodes.py` using `get_keys(state)`,
-            # I don't need to pass them to `run_deliberation_task`.
-            # I should update `tasks.py` signature to remove api_keys.
-            
             max_rounds = serializer.validated_data.get('max_rounds', 3)
-            
-            run_deliberation_task.delay(convo_id, question, max_rounds) # Pass conversational ID, question and max_rounds
-            
-            return Response({"conversation_id": convo_id}, status=status.HTTP_201_CREATED)
+            roster = serializer.validated_data.get('roster')
+            latency_budget = serializer.validated_data.get('latency_budget') or settings.DELIBERATION_DEFAULT_LATENCY_BUDGET or None
+            share = serializer.validated_data.get('share_inflight', settings.DELIBERATION_SINGLE_FLIGHT)
+            reuse = serializer.validated_data.get('reuse', settings.DELIBERATION_REUSE)
+            strategy = serializer.validated_data.get('strategy', settings.DELIBERATION_DEFAULT_STRATEGY)
+            # Each self-consistency sample is stored as its own round
+            if strategy == 'self_consistency':
+                max_rounds = serializer.validated_data.get('samples') or settings.DELIBERATION_SAMPLES
+
+            # Near-duplicate of a past deliberation: answer from it, or give it to the agents as context
+            related = None
+            if reuse in ('answer', 'context'):
+                match = find_similar(question, min(settings.DELIBERATION_REUSE_ANSWER_THRESHOLD,
+                                                   settings.DELIBERATION_REUSE_CONTEXT_THRESHOLD))
+                if match:
+                    prior_id, score = match
+                    if reuse == 'answer' and score >= settings.DELIBERATION_REUSE_ANSWER_THRESHOLD:
+                        reused_id = reuse_answer(prior_id, score, question)
+                        if reused_id:
+                            return Response({"conversation_id": reused_id, "reused_from": prior_id,
+                                             "similarity": round(score, 4)}, status=status.HTTP_201_CREATED)
+                    if score >= settings.DELIBERATION_REUSE_CONTEXT_THRESHOLD:
+                        related = {"related": prior_id, "similarity": round(score, 4)}
+
+            # Upfront round planning: fewer rounds (and possibly a lighter roster) for easy
+            # questions, never more than requested; "shadow" only records the plan
+            round_plan = None
+            planning = serializer.validated_data.get('plan_rounds', settings.DELIBERATION_ROUND_PLANNING)
+            if planning != 'off' and strategy == 'rounds':
+                round_plan = plan_rounds(question, max_rounds, roster)
+                round_plan["applied"] = planning == 'on'
+                if round_plan["applied"]:
+                    max_rounds = round_plan["planned_rounds"]
+                    roster = round_plan["roster"]
+
+            convo_id = str(uuid.uuid4())
+
+            # Single-flight: identical in-flight requests attach to the running deliberation
+            flight = None
+            if share:
+                if strategy == 'self_consistency':
+                    plan = sample_plan(get_roster(roster), keys, max_rounds)
+                else:
+                    plan = resolved_providers(get_roster(roster), keys, max_rounds)
+                flight = singleflight.flight_key(question, {
+                    "max_rounds": max_rounds,
+                    "roster": roster or default_roster_name(),
+                    "latency_budget": latency_budget,
+                    "strategy": strategy,
+                    # Only share when the same providers/models would be used
+                    "providers": plan,
+                })
+
+            # Admission control: wait in line with an estimated start, or come back later
+            try:
+                queued = admission.admit(convo_id)
+            except admission.QueueFull as e:
+                # Joining a running deliberation takes no worker slot
+                existing = flight and singleflight.join(flight)
+                if existing:
+                    if joinable(existing):
+                        return Response({"conversation_id": existing, "shared": True}, status=status.HTTP_200_OK)
+                    singleflight.leave(existing)
+                return queue_full(e)
+
+            # Create Conversation (the question is kept in full for history and follow-ups).
+            # Created before single-flight publishes its id, so joiners can always stream it.
+            Conversation.objects.create(id=convo_id, title=question[:50])
+            metadata = dict(related or {})
+            if round_plan:
+                metadata["plan"] = round_plan
+            Message.objects.create(conversation_id=convo_id, agent_name='user', content=question, round_number=0,
+                                   metadata=metadata)
+
+            if flight:
+                existing = singleflight.lead_or_join(flight, convo_id)
+                if existing and not joinable(existing):
+                    singleflight.leave(existing)
+                    singleflight.abandon(flight, existing)
+                    existing = singleflight.lead_or_join(flight, convo_id)
+                if existing:
+                    admission.withdraw(convo_id)
+                    Conversation.objects.filter(id=convo_id).delete()
+                    return Response({"conversation_id": existing, "shared": True}, status=status.HTTP_200_OK)
+
+            try:
+                # Store Keys Securely
+                # Keys are not passed as task args: the broker payload (Redis) may be
+                # persistent or monitored. Nodes fetch them with get_api_keys(id).
+                store_api_keys(convo_id, keys)
+
+                # Launch Celery Task
+                # Pass conversational ID, question, max_rounds, roster and budget
+                dispatch_deliberation(convo_id, question, max_rounds, roster=roster, latency_budget=latency_budget,
+                                      related=related and related["related"], strategy=strategy)
+            except Exception:
+                # Never enqueued: requests that joined meanwhile see it fail instead of waiting forever
+                Conversation.objects.filter(id=convo_id).update(status='failed')
+                admission.withdraw(convo_id)
+                if flight:
+                    singleflight.release(convo_id)
+                raise
+
+            data = {"conversation_id": convo_id}
+            if related:
+                data.update(related)
+            if round_plan and round_plan["applied"]:
+                data["plan"] = {k: round_plan[k] for k in ("tier", "requested_rounds", "planned_rounds", "roster")}
+            if queued:
+                data["queue"] = queued
+            return Response(data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+# Seconds between keep-alive pings, and between "still listening" heartbeats
+# used by auto-cancel (DELIBERATION_AUTO_CANCEL_GRACE_SECONDS should be well above both)
+PING_INTERVAL = 15.0
+SUBSCRIBER_TOUCH_INTERVAL = 5.0
+# Seconds between queue position checks while waiting for a worker
+QUEUE_POLL_INTERVAL = 2.0
+
+def finished_frame(conversation_id: str):
+    """
+    The closing frame payload for a conversation that has already finished
+    (e.g. answered from a past deliberation), or None while it is running.
+    """
+    convo_status = Conversation.objects.filter(id=conversation_id).values_list('status', flat=True).first()
+    if convo_status == 'completed':
+        result = (Message.objects.filter(conversation_id=conversation_id, agent_name='arbiter')
+                  .order_by('-timestamp').values_list('content', flat=True).first())
+        if result is None:
+            result = next((m.content for m in reversed(archived_messages(conversation_id) or [])
+                           if m.agent_name == 'arbiter'), None)
+        return dumps({"type": "final", "result": result or ""})
+    if convo_status == 'cancelled':
+        return dumps({"type": "cancelled", "reason": "finished"})
+    if convo_status == 'failed':
+        return dumps({"type": "error", "message": "Deliberation failed"})
+    return None
+
+def stored_turn_frames(conversation_id: str):
+    """
+    "message" frame payloads for the turns the running exchange has stored so
+    far (everything after the latest question), so a subscriber that connects
+    mid-run, e.g. a single-flight joiner, sees the transcript it missed. The
+    client drops live frames repeating one of these (same agent and round).
+    """
+    asked_at = (Message.objects.filter(conversation_id=conversation_id, agent_name='user')
+                .order_by('-timestamp').values_list('timestamp', flat=True).first())
+    if asked_at is None:
+        return []
+    turns = (Message.objects.filter(conversation_id=conversation_id, timestamp__gt=asked_at)
+             .exclude(agent_name__in=('user', 'arbiter')).order_by('timestamp')
+             .values_list('agent_name', 'content', 'round_number'))
+    return [dumps({"type": "message", "agent": agent, "content": content, "round": round_num})
+            for agent, content, round_num in turns]
+
 class MessageStreamView(View):
     def get(self, request, conversation_id):
         print(f"DEBUG: SSE Stream Requested for {conversation_id}")
@@ -59,34 +240,67 @@ class MessageStreamView(View):
         def event_stream():
             redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
             pubsub = redis_client.pubsub()
-            channel_name = f"conversation_{conversation_id}"
-            pubsub.subscribe(channel_name)
+            channel = channel_name(conversation_id)
+            pubsub.subscribe(channel)
             
             # Send initial ping
-            yield f"event: ping\ndata: connected\n\n"
+            touch_subscriber(conversation_id)
+            last_touch = time.monotonic()
+            yield b"event: ping\ndata: connected\n\n"
             
             try:
+                # Nothing more will be published for a finished conversation
+                finished = finished_frame(conversation_id)
+                if finished:
+                    yield b"event: message\ndata: " + finished + b"\n\n"
+                    return
+
+                # Subscribed first, so turns stored from here on also arrive live
+                for frame in stored_turn_frames(conversation_id):
+                    yield b"event: message\ndata: " + frame + b"\n\n"
+
+                # Until a worker picks the run up, report its place in the queue
+                waiting = True
+                position = None
+                last_queue_check = 0.0
+                last_ping = time.monotonic()
                 while True:
+                    # Heartbeat for auto-cancel; throttled, this loop runs per token
+                    if time.monotonic() - last_touch > SUBSCRIBER_TOUCH_INTERVAL:
+                        touch_subscriber(conversation_id)
+                        last_touch = time.monotonic()
+
+                    if waiting and time.monotonic() - last_queue_check > QUEUE_POLL_INTERVAL:
+                        last_queue_check = time.monotonic()
+                        try:
+                            queued = admission.queue_status(conversation_id)
+                        except redis.RedisError:
+                            queued = None
+                        if queued is None:
+                            waiting = False
+                        elif (queued["position"], queued["estimated_wait_s"]) != position:
+                            position = (queued["position"], queued["estimated_wait_s"])
+                            yield b"event: message\ndata: " + dumps(queued) + b"\n\n"
+
                     # Use get_message with timeout to allow sending pings
-                    message = pubsub.get_message(ignore_subscribe_messages=True, timeout=15.0)
+                    message = pubsub.get_message(ignore_subscribe_messages=True,
+                                                 timeout=QUEUE_POLL_INTERVAL if waiting else PING_INTERVAL)
                     if message:
-                        data = message['data']
-                        if isinstance(data, bytes):
-                            data = data.decode('utf-8')
-                        yield f"event: message\ndata: {data}\n\n"
+                        # Route on the frame tag, forward the JSON payload untouched
+                        tag, payload = decode_frame(message['data'])
+                        yield b"event: message\ndata: " + payload + b"\n\n"
                         
-                        # Stop if we see a 'final' type message in the data
-                        try:
-                            json_data = json.loads(data)
-                            if json_data.get('type') == 'final':
-                                break
-                        except:
-                            pass
-                    else:
+                        # Stop after a 'final' / 'cancelled' / 'error' frame
+                        if tag in TERMINAL_TAGS:
+                            break
+                        if tag == FRAME_TAGS["started"]:
+                            waiting = False
+                    elif not waiting or time.monotonic() - last_ping > PING_INTERVAL:
                         # Timeout reached, send a ping to keep connection alive
-                        yield f"event: ping\ndata: pong\n\n"
+                        last_ping = time.monotonic()
+                        yield b"event: ping\ndata: pong\n\n"
             finally:
-                pubsub.unsubscribe(channel_name)
+                pubsub.unsubscribe(channel)
                 pubsub.close()
 
         response = StreamingHttpResponse(event_stream(), content_type='text/event-stream')
@@ -94,9 +308,153 @@ class MessageStreamView(View):
         response['X-Accel-Buffering'] = 'no' # For Nginx
         return response
 
+class FollowUpView(APIView):
+    """
+    Continues a finished conversation with a new question. The extra rounds
+    keep counting after the previous ones and start from the stored Arbiter
+    answer plus compacted round summaries (agents/followup.py).
+    """
+    def post(self, request, conversation_id):
+        convo = get_object_or_404(Conversation, id=conversation_id)
+        serializer = FollowUpSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        question = serializer.validated_data['question']
+        keys = serializer.validated_data['api_keys']
+        strategy = serializer.validated_data.get('strategy', settings.DELIBERATION_DEFAULT_STRATEGY)
+        if strategy == 'self_consistency':
+            rounds = serializer.validated_data.get('samples') or settings.DELIBERATION_SAMPLES
+        else:
+            rounds = serializer.validated_data.get('max_rounds') or settings.DELIBERATION_FOLLOW_UP_ROUNDS
+        latency_budget = serializer.validated_data.get('latency_budget') or settings.DELIBERATION_DEFAULT_LATENCY_BUDGET or None
+
+        # Only one run per conversation at a time (a reopened one is also left alone by the archiver)
+        reopened = Conversation.objects.filter(id=convo.id, status__in=('completed', 'cancelled', 'failed')).update(
+            status='pending', is_completed=False)
+        if not reopened:
+            return Response({"conversation_id": conversation_id, "status": convo.status}, status=status.HTTP_409_CONFLICT)
+
+        # An archived conversation's messages go back into the message table first
+        restore_conversation(convo.id)
+        first_round = next_round(convo.id)
+        if first_round == 1:
+            Conversation.objects.filter(id=convo.id).update(status=convo.status, is_completed=convo.is_completed)
+            return Response({"error": "Conversation has no deliberation to follow up on"}, status=status.HTTP_409_CONFLICT)
+        roster = serializer.validated_data.get('roster') or previous_roster(convo.id)
+
+        try:
+            queued = admission.admit(conversation_id)
+        except admission.QueueFull as e:
+            Conversation.objects.filter(id=convo.id).update(status=convo.status, is_completed=convo.is_completed)
+            return queue_full(e)
+
+        Message.objects.create(conversation_id=convo.id, agent_name='user', content=question, round_number=0,
+                               metadata={"follow_up": True, "first_round": first_round})
+        clear_cancel(conversation_id)
+        store_api_keys(conversation_id, keys)
+        dispatch_deliberation(conversation_id, question, first_round + rounds - 1, roster=roster,
+                              latency_budget=latency_budget, first_round=first_round, strategy=strategy)
+
+        data = {"conversation_id": conversation_id, "first_round": first_round, "max_rounds": first_round + rounds - 1}
+        if queued:
+            data["queue"] = queued
+        return Response(data, status=status.HTTP_202_ACCEPTED)
+
+class CancelDeliberationView(APIView):
+    def post(self, request, conversation_id):
+        convo = get_object_or_404(Conversation, id=conversation_id)
+        if convo.status in ('completed', 'cancelled', 'failed'):
+            return Response({"conversation_id": conversation_id, "status": convo.status}, status=status.HTTP_409_CONFLICT)
+
+        # A shared (single-flight) deliberation keeps running for the others
+        if singleflight.leave(conversation_id) > 0:
+            return Response({"conversation_id": conversation_id, "status": "detached"}, status=status.HTTP_202_ACCEPTED)
+
+        request_cancel(conversation_id, reason="user")
+        # Frees its place in the queue now; the worker drops the run when it gets to it
+        admission.withdraw(conversation_id)
+        return Response({"conversation_id": conversation_id, "status": "cancelling"}, status=status.HTTP_202_ACCEPTED)
+
 class ConversationHistoryView(APIView):
     def get(self, request, conversation_id):
         convo = get_object_or_404(Conversation, id=conversation_id)
-        messages = Message.objects.filter(conversation=convo).order_by('timestamp')
+        messages = list(Message.objects.filter(conversation=convo).order_by('timestamp'))
+        if not messages:
+            # Old finished conversations live in compressed archives (deliberations/archive.py)
+            messages = archived_messages(convo.id) or []
         serializer = MessageSerializer(messages, many=True)
         return Response(serializer.data)
+
+class TimelineView(APIView):
+    """
+    Where a conversation's time went, as waterfall rows per run (the first
+    deliberation and each follow-up): queue wait, graph nodes, LLM connect /
+    first token / streaming, Redis publishes and DB writes (utils/tracing.py).
+    """
+    def get(self, request, conversation_id):
+        convo = get_object_or_404(Conversation, id=conversation_id)
+        runs = []
+        for trace in convo.traces.all():
+            root = next((span for span in trace.spans if span[0] == 1), None)
+            runs.append({
+                "first_round": trace.first_round,
+                "started_at": trace.started_at,
+                "duration_ms": root[4] / 1000 if root else None,
+                "status": root[5].get("status") if root and len(root) > 5 else None,
+                "breakdown": tracing.breakdown(trace.spans),
+                "spans": tracing.waterfall(trace.spans),
+            })
+        return Response({"conversation_id": conversation_id, "status": convo.status, "runs": runs})
+
+class ExportView(View):
+    """
+    Streams conversations or messages in a date range for offline analysis.
+    GET /api/export/?table=messages&since=2026-01-01&until=2026-02-01&format=parquet
+
+    `until` defaults to slightly before now and is echoed back in the
+    X-Export-Watermark header: pass it as `since` on the next call to get
+    an incremental export without gaps or duplicates.
+    """
+    CONTENT_TYPES = {
+        "ndjson": "application/x-ndjson",
+        "arrow": "application/vnd.apache.arrow.stream",
+        "parquet": "application/vnd.apache.parquet",
+    }
+
+    def get(self, request):
+        token = getattr(settings, 'EXPORT_API_TOKEN', '')
+        if not token or request.headers.get('X-Export-Token') != token:
+            return JsonResponse({"error": "Export is disabled or token is invalid"}, status=403)
+
+        table = request.GET.get('table', 'messages')
+        fmt = request.GET.get('format', 'ndjson')
+        if table not in export.TABLE_COLUMNS:
+            return JsonResponse({"error": f"Unknown table: {table}"}, status=400)
+        if fmt not in self.CONTENT_TYPES:
+            return JsonResponse({"error": f"Unknown format: {fmt}"}, status=400)
+        # Fall back to NDJSON when pyarrow is not installed
+        if fmt != 'ndjson' and not export.arrow_available():
+            fmt = 'ndjson'
+
+        try:
+            since = export.parse_bound(request.GET.get('since'))
+            until = export.parse_bound(request.GET.get('until')) or export.default_until()
+            chunk_size = min(int(request.GET.get('chunk_size', export.DEFAULT_CHUNK_SIZE)), 50000)
+            if chunk_size < 1:
+                raise ValueError("chunk_size must be at least 1")
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=400)
+
+        rows = export.iter_rows(table, since=since, until=until, chunk_size=chunk_size)
+        if fmt == 'ndjson':
+            body = export.stream_ndjson(rows, batch_size=chunk_size)
+        else:
+            body = export.stream_arrow(table, rows, fmt=fmt, batch_size=chunk_size)
+
+        response = StreamingHttpResponse(body, content_type=self.CONTENT_TYPES[fmt])
+        response['Content-Disposition'] = f'attachment; filename="{table}.{fmt}"'
+        response['X-Export-Format'] = fmt
+        response['X-Export-Watermark'] = until.isoformat()
+        response['X-Accel-Buffering'] = 'no'
+        return response
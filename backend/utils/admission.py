@@ -0,0 +1,204 @@
+
+import math
+import time
+from typing import Optional
+
+import redis
+from django.conf import settings
+
+# Admission control for deliberation runs. Per Celery queue, Redis keeps the
+# deliberations waiting for a worker (sorted by when they were enqueued) and
+# the ones running (by start time), so the web tier knows how backed up the
+# workers are before it enqueues more:
+#
+#   admission:<queue>:queued    zset conversation_id -> enqueued at
+#   admission:<queue>:active    zset conversation_id -> started at
+#   admission:<queue>:run_s     EWMA of run durations (seconds)
+#   admission:conversation:<id> queue a queued conversation waits on
+#
+# DELIBERATION_WORKER_SLOTS deliberations run at once per queue (worker
+# processes x concurrency); up to DELIBERATION_MAX_QUEUED more may wait, each
+# told its position and an estimated start. Beyond that, requests get a 429
+# with a Retry-After. Entries older than DELIBERATION_ADMISSION_STALE_SECONDS
+# (lost tasks, killed workers) stop counting. Bookkeeping errors never block
+# a deliberation: without Redis every request is admitted.
+
+# Redis client for admission bookkeeping
+redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+
+# Admits a conversation into the queue unless running + waiting is at the
+# limit; returns {admitted, active, queued ahead}
+_ADMIT_SCRIPT = redis_client.register_script("""
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[5])
+redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', ARGV[5])
+local queued = redis.call('ZCARD', KEYS[1])
+local active = redis.call('ZCARD', KEYS[2])
+if active + queued >= tonumber(ARGV[3]) + tonumber(ARGV[4]) then
+    return {0, active, queued}
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[1])
+redis.call('SET', KEYS[3], ARGV[7], 'EX', ARGV[6])
+return {1, active, queued}
+""")
+
+# Folds a finished run's duration into the queue's EWMA
+_DURATION_SCRIPT = redis_client.register_script("""
+local current = redis.call('GET', KEYS[1])
+local x = tonumber(ARGV[1])
+if current then
+    x = tonumber(ARGV[2]) * x + (1 - tonumber(ARGV[2])) * tonumber(current)
+end
+redis.call('SET', KEYS[1], tostring(x))
+return 1
+""")
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int, active: int, queued: int):
+        super().__init__(f"{active} deliberations running, {queued} queued")
+        self.retry_after = retry_after
+        self.active = active
+        self.queued = queued
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+def default_queue() -> str:
+    return _setting("DELIBERATION_QUEUE", "") or _setting("CELERY_TASK_DEFAULT_QUEUE", "celery")
+
+
+def _queued_key(queue: str) -> str:
+    return f"admission:{queue}:queued"
+
+
+def _active_key(queue: str) -> str:
+    return f"admission:{queue}:active"
+
+
+def _duration_key(queue: str) -> str:
+    return f"admission:{queue}:run_s"
+
+
+def _conversation_key(conversation_id: str) -> str:
+    return f"admission:conversation:{conversation_id}"
+
+
+def _stale_before(now: float) -> float:
+    return now - _setting("DELIBERATION_ADMISSION_STALE_SECONDS", 1800)
+
+
+def run_seconds(queue: str) -> float:
+    """
+    Typical wall time of one deliberation on `queue`.
+    """
+    value = redis_client.get(_duration_key(queue))
+    return float(value) if value else _setting("DELIBERATION_ADMISSION_PRIOR_RUN_SECONDS", 60.0)
+
+
+def estimated_wait(active: int, ahead: int, queue: str) -> float:
+    """
+    Seconds until a deliberation with `ahead` others queued before it gets a
+    slot: slots free up at about one run time per slot.
+    """
+    slots = max(_setting("DELIBERATION_WORKER_SLOTS", 4), 1)
+    must_finish = active + ahead - slots + 1
+    if must_finish <= 0:
+        return 0.0
+    return math.ceil(must_finish / slots) * run_seconds(queue)
+
+
+def admit(conversation_id: str, queue: str = None) -> Optional[dict]:
+    """
+    Reserves a place for a deliberation about to be enqueued. Returns
+    {"position", "estimated_wait_s", "estimated_start"} when it will have to
+    wait for a slot, None when it can start right away. Raises QueueFull if
+    the queue is at its limit.
+    """
+    queue = queue or default_queue()
+    now = time.time()
+    slots = max(_setting("DELIBERATION_WORKER_SLOTS", 4), 1)
+    max_queued = _setting("DELIBERATION_MAX_QUEUED", 50)
+    try:
+        admitted, active, ahead = _ADMIT_SCRIPT(
+            keys=[_queued_key(queue), _active_key(queue), _conversation_key(conversation_id)],
+            args=[conversation_id, now, slots, max_queued, _stale_before(now),
+                  int(_setting("DELIBERATION_ADMISSION_STALE_SECONDS", 1800)), queue],
+        )
+        if not admitted:
+            # Enough runs have to finish to bring running + waiting under the limit
+            excess = active + ahead - (slots + max_queued) + 1
+            retry_after = max(math.ceil(math.ceil(excess / slots) * run_seconds(queue)), 1)
+            raise QueueFull(retry_after, active, ahead)
+        wait = estimated_wait(active, ahead, queue)
+    except redis.RedisError as e:
+        print(f"Error in admission control: {e}")
+        return None
+    if not wait:
+        return None
+    return {"position": ahead + 1, "estimated_wait_s": round(wait), "estimated_start": round(now + wait)}
+
+
+def withdraw(conversation_id: str):
+    """
+    Gives up a queued place (cancelled before a worker picked it up, or not
+    enqueued after all).
+    """
+    try:
+        queue = redis_client.get(_conversation_key(conversation_id))
+        if queue is not None:
+            pipe = redis_client.pipeline()
+            pipe.zrem(_queued_key(queue.decode()), conversation_id)
+            pipe.delete(_conversation_key(conversation_id))
+            pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error in admission control: {e}")
+
+
+def queue_status(conversation_id: str) -> Optional[dict]:
+    """
+    A "queued" stream event for a conversation still waiting for a worker, or
+    None once it has been picked up (or was never queued).
+    """
+    queue = redis_client.get(_conversation_key(conversation_id))
+    if queue is None:
+        return None
+    queue = queue.decode()
+    pipe = redis_client.pipeline()
+    pipe.zrank(_queued_key(queue), conversation_id)
+    pipe.zcount(_active_key(queue), _stale_before(time.time()), "+inf")
+    ahead, active = pipe.execute()
+    if ahead is None:
+        return None
+    wait = estimated_wait(active, ahead, queue)
+    return {"type": "queued", "position": ahead + 1, "estimated_wait_s": round(wait),
+            "estimated_start": round(time.time() + wait)}
+
+
+def started(conversation_id: str, queue: str = None):
+    """
+    Worker side: the deliberation left the queue and holds a slot.
+    """
+    queue = queue or default_queue()
+    try:
+        pipe = redis_client.pipeline()
+        pipe.zrem(_queued_key(queue), conversation_id)
+        pipe.delete(_conversation_key(conversation_id))
+        pipe.zadd(_active_key(queue), {conversation_id: time.time()})
+        pipe.execute()
+    except redis.RedisError as e:
+        print(f"Error in admission control: {e}")
+
+
+def finished(conversation_id: str, queue: str = None, duration: float = None):
+    """
+    Worker side: frees the slot and updates the typical run time.
+    """
+    queue = queue or default_queue()
+    try:
+        redis_client.zrem(_active_key(queue), conversation_id)
+        if duration is not None:
+            _DURATION_SCRIPT(keys=[_duration_key(queue)], args=[duration, _setting("DELIBERATION_ADMISSION_ALPHA", 0.2)])
+    except redis.RedisError as e:
+        print(f"Error in admission control: {e}")
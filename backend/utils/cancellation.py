@@ -0,0 +1,121 @@
+
+import threading
+import time
+from typing import Optional
+
+import redis
+from django.conf import settings
+
+# Redis client for cancellation flags / subscriber heartbeats
+redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+
+FLAG_TTL = 3600
+
+
+class DeliberationCancelled(Exception):
+    """
+    Raised inside the graph when a deliberation has been cancelled.
+    """
+    def __init__(self, reason: str = "user"):
+        super().__init__(reason)
+        self.reason = reason
+
+
+def _cancel_key(conversation_id: str) -> str:
+    return f"cancel:{conversation_id}"
+
+
+def _seen_key(conversation_id: str) -> str:
+    return f"stream_seen:{conversation_id}"
+
+
+def request_cancel(conversation_id: str, reason: str = "user"):
+    """
+    Flags a deliberation as cancelled. The worker picks it up between chunks.
+    """
+    redis_client.set(_cancel_key(conversation_id), reason, ex=FLAG_TTL)
+
+
+def clear_cancel(conversation_id: str):
+    """
+    Drops a stale cancel flag before a conversation runs again (follow-ups).
+    """
+    redis_client.delete(_cancel_key(conversation_id))
+
+
+def touch_subscriber(conversation_id: str):
+    """
+    Records that an SSE client is still listening (used for auto-cancel).
+    """
+    redis_client.set(_seen_key(conversation_id), time.time(), ex=FLAG_TTL)
+
+
+class CancelToken:
+    """
+    Worker-side view of a conversation's cancellation state.
+    Redis is polled at most every `check_interval` seconds so checking
+    between every streamed chunk stays cheap.
+    """
+    def __init__(self, conversation_id: str, grace_seconds: float = None, check_interval: float = 0.25):
+        if grace_seconds is None:
+            grace_seconds = getattr(settings, 'DELIBERATION_AUTO_CANCEL_GRACE_SECONDS', 0)
+        self.conversation_id = conversation_id
+        self.grace_seconds = grace_seconds
+        self.check_interval = check_interval
+        self.started_at = time.time()
+        self.reason: Optional[str] = None
+        self._last_check = 0.0
+
+    def _poll(self) -> Optional[str]:
+        if self.grace_seconds:
+            flag, seen = redis_client.mget(_cancel_key(self.conversation_id), _seen_key(self.conversation_id))
+        else:
+            flag, seen = redis_client.get(_cancel_key(self.conversation_id)), None
+        if flag:
+            return flag.decode() if isinstance(flag, bytes) else str(flag)
+        if self.grace_seconds:
+            # Subscribers may connect a little after the task starts
+            last_seen = max(float(seen) if seen else 0.0, self.started_at)
+            if time.time() - last_seen > self.grace_seconds:
+                return "no_subscribers"
+        return None
+
+    def cancelled(self, force: bool = False) -> bool:
+        if self.reason:
+            return True
+        now = time.monotonic()
+        if not force and now - self._last_check < self.check_interval:
+            return False
+        self._last_check = now
+        try:
+            self.reason = self._poll()
+        except redis.RedisError as e:
+            print(f"Error checking cancellation: {e}")
+        return bool(self.reason)
+
+    def raise_if_cancelled(self, force: bool = False):
+        if self.cancelled(force=force):
+            raise DeliberationCancelled(self.reason)
+
+
+# One token per running deliberation in this worker process
+_tokens = {}
+_tokens_lock = threading.Lock()
+
+
+def register_token(conversation_id: str) -> CancelToken:
+    with _tokens_lock:
+        token = _tokens[conversation_id] = CancelToken(conversation_id)
+    return token
+
+
+def release_token(conversation_id: str):
+    with _tokens_lock:
+        _tokens.pop(conversation_id, None)
+
+
+def get_token(conversation_id: str) -> CancelToken:
+    with _tokens_lock:
+        token = _tokens.get(conversation_id)
+    # Nodes run outside a task (shell, scripts) get a throwaway token
+    return token or CancelToken(conversation_id)
@@ -0,0 +1,105 @@
+
+import hashlib
+import json
+import re
+from typing import Optional
+
+import redis
+from django.conf import settings
+
+# Redis client for single-flight bookkeeping
+redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
+
+# Deletes the flight key only if it still points at this conversation
+_RELEASE_SCRIPT = redis_client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+
+def normalize_question(question: str) -> str:
+    """
+    Case, whitespace and trailing punctuation don't change the question.
+    """
+    text = re.sub(r"\s+", " ", question).strip().lower()
+    return text.rstrip(" ?!.")
+
+
+def flight_key(question: str, options: dict) -> str:
+    """
+    options: everything that changes what the deliberation produces
+    (max_rounds, roster, resolved providers/models, budget...).
+    """
+    payload = json.dumps({"q": normalize_question(question), **options}, sort_keys=True)
+    return "singleflight:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _owner_key(conversation_id: str) -> str:
+    return f"singleflight_owner:{conversation_id}"
+
+
+def _members_key(conversation_id: str) -> str:
+    return f"singleflight_members:{conversation_id}"
+
+
+def lead_or_join(key: str, conversation_id: str, ttl: int = None) -> Optional[str]:
+    """
+    Claims `key` for `conversation_id`. Returns None if the caller is now the
+    leader (it should start the deliberation), otherwise the id of the
+    in-flight conversation to attach to.
+    """
+    ttl = ttl or getattr(settings, 'DELIBERATION_SINGLE_FLIGHT_TTL', 1800)
+    if redis_client.set(key, conversation_id, nx=True, ex=ttl):
+        pipe = redis_client.pipeline()
+        pipe.set(_owner_key(conversation_id), key, ex=ttl)
+        pipe.set(_members_key(conversation_id), 1, ex=ttl)
+        pipe.execute()
+        return None
+
+    existing = join(key)
+    if existing is None:
+        # Leader finished between SET and GET, try again once
+        return lead_or_join(key, conversation_id, ttl)
+    return existing
+
+
+def join(key: str) -> Optional[str]:
+    """
+    Attaches to the in-flight conversation for `key` without claiming the
+    key; None if there is none.
+    """
+    existing = redis_client.get(key)
+    if existing is None:
+        return None
+    existing = existing.decode()
+    redis_client.incr(_members_key(existing))
+    return existing
+
+
+def abandon(key: str, conversation_id: str):
+    """
+    Drops a flight that can't be joined (e.g. its conversation failed).
+    """
+    _RELEASE_SCRIPT(keys=[key], args=[conversation_id])
+
+
+def leave(conversation_id: str) -> int:
+    """
+    One requester detaches; returns how many are still attached.
+    Conversations that were never shared report 0.
+    """
+    if not redis_client.exists(_members_key(conversation_id)):
+        return 0
+    return max(int(redis_client.decr(_members_key(conversation_id))), 0)
+
+
+def release(conversation_id: str):
+    """
+    Called when the deliberation ends: later identical requests start fresh.
+    """
+    key = redis_client.get(_owner_key(conversation_id))
+    if key is not None:
+        _RELEASE_SCRIPT(keys=[key.decode()], args=[conversation_id])
+    redis_client.delete(_owner_key(conversation_id), _members_key(conversation_id))
@@ -1,27 +1,84 @@
 
 import json
+from functools import lru_cache
+
 import redis
 from django.conf import settings
 
+from utils import tracing
+
+# orjson is optional; it serializes the per-token payloads several times faster
+try:
+    import orjson
+
+    def dumps(data) -> bytes:
+        return orjson.dumps(data)
+except ImportError:
+    def dumps(data) -> bytes:
+        return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
 # Redis client for pub/sub
 redis_client = redis.Redis.from_url(settings.CELERY_BROKER_URL)
 
+# Wire format on the conversation channel: one type tag byte followed by the
+# JSON payload the browser receives, e.g. b'T{"type":"token",...}'.
+# The SSE relay routes on the tag and forwards the payload bytes untouched,
+# so neither side parses or re-encodes JSON per token.
+FRAME_TAGS = {
+    "token": b"T",
+    "message": b"M",
+    "round_update": b"R",
+    "final": b"F",
+    "error": b"E",
+    "cancelled": b"C",
+    "queued": b"Q",
+    "started": b"S",
+}
+UNKNOWN_TAG = b"U"
+# Frames after which the stream is over
+TERMINAL_TAGS = frozenset([FRAME_TAGS["final"], FRAME_TAGS["cancelled"], FRAME_TAGS["error"]])
+
+def channel_name(conversation_id: str) -> str:
+    return f"conversation_{conversation_id}"
+
+def encode_update(data: dict) -> bytes:
+    """
+    Frames an update as published on the conversation channel.
+    """
+    return FRAME_TAGS.get(data.get("type"), UNKNOWN_TAG) + dumps(data)
+
+@lru_cache(maxsize=1024)
+def _token_prefix(agent_name: str, round_num: int) -> bytes:
+    # Everything but the content is constant for a whole turn
+    return b'T{"type":"token","agent":' + dumps(agent_name) + b',"round":' + dumps(round_num) + b',"content":'
+
+def encode_chunk(agent_name: str, token: str, round_num: int) -> bytes:
+    return _token_prefix(agent_name, round_num) + dumps(token) + b"}"
+
+def decode_frame(data: bytes):
+    """
+    Splits a frame into (tag, payload). Untagged JSON published by an older
+    worker is tagged from its "type" (slow path, only during a rollout).
+    """
+    if data[:1] == b"{":
+        try:
+            kind = json.loads(data).get("type")
+        except ValueError:
+            kind = None
+        return FRAME_TAGS.get(kind, UNKNOWN_TAG), data
+    return data[:1], data[1:]
+
 def publish_update(conversation_id: str, data: dict):
     """
     Publishes an update to the conversation channel.
     channel: conversation_{id}
     data: dict to be JSON serialized
     """
-    channel = f"conversation_{conversation_id}"
-    redis_client.publish(channel, json.dumps(data))
+    with tracing.span(conversation_id, "publish", type=data.get("type")):
+        redis_client.publish(channel_name(conversation_id), encode_update(data))
 
 def publish_chunk(conversation_id: str, agent_name: str, token: str, round_num: int):
     """
     Publishes a single token/chunk to the frontend for streaming.
     """
-    publish_update(conversation_id, {
-        "type": "token",
-        "agent": agent_name,
-        "content": token,
-        "round": round_num
-    })
+    redis_client.publish(channel_name(conversation_id), encode_chunk(agent_name, token, round_num))
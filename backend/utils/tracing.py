@@ -0,0 +1,227 @@
+
+import contextvars
+import itertools
+import json
+import os
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+from django.conf import settings
+
+# Span tree of one deliberation run, recorded in the worker: time queued in
+# Celery, each graph node, each LLM call (waiting for the first token, then
+# streaming), Redis publishes and DB writes. Spans are kept in memory while
+# the run lasts and stored as one Trace row when it ends; with
+# DELIBERATION_TRACE_OTLP_FILE set they are also appended to that file as
+# OTLP/JSON (one ExportTraceServiceRequest per line, the format collectors'
+# file receivers read), so no collector has to be running.
+#
+# Span tuples, times in microseconds from when the run was enqueued:
+#   [id, parent_id, name, start_us, duration_us]            (+ attributes dict if any)
+# Nesting follows the calling code: a span opened inside another becomes its
+# child, also across the threads LangGraph runs parallel nodes on.
+
+ROOT_SPAN = "deliberation"
+
+# conversation_id -> Trace
+_traces: Dict[str, "Trace"] = {}
+# Id of the innermost open span (LangGraph copies the context into its threads)
+_current = contextvars.ContextVar("deliberation_span", default=None)
+
+
+def _setting(name: str, default):
+    return getattr(settings, name, default)
+
+
+class Trace:
+    def __init__(self, conversation_id: str, first_round: int = 1, enqueued_at: float = None):
+        self.conversation_id = conversation_id
+        self.first_round = first_round
+        self.trace_id = secrets.token_hex(16)
+        started = time.time()
+        # Clocks of the web and worker hosts may disagree slightly
+        queued = max(started - enqueued_at, 0.0) if enqueued_at else 0.0
+        self.origin = started - queued
+        self._perf_origin = time.perf_counter() - queued
+        self._ids = itertools.count(2)
+        self._lock = threading.Lock()
+        self.spans = []
+        if queued:
+            self.add(self.next_id(), 1, "queue", 0.0, queued)
+
+    def next_id(self) -> int:
+        return next(self._ids)
+
+    def offset(self, perf: float) -> float:
+        """
+        Seconds since the run was enqueued for a time.perf_counter() value.
+        """
+        return perf - self._perf_origin
+
+    def add(self, span_id: int, parent: int, name: str, start: float, end: float, attrs: dict = None):
+        span = [span_id, parent, name, round(start * 1e6), max(round((end - start) * 1e6), 0)]
+        if attrs:
+            span.append(attrs)
+        with self._lock:
+            self.spans.append(span)
+
+
+def start(conversation_id: str, first_round: int = 1, enqueued_at: float = None) -> Optional[Trace]:
+    """
+    Starts recording spans for a deliberation run (no-op with DELIBERATION_TRACING off).
+    """
+    if not _setting("DELIBERATION_TRACING", True):
+        return None
+    trace = _traces[conversation_id] = Trace(conversation_id, first_round, enqueued_at)
+    _current.set(1)
+    return trace
+
+
+def now() -> float:
+    return time.perf_counter()
+
+
+@contextmanager
+def span(conversation_id: str, name: str, **attrs):
+    """
+    Times the block as a child of the innermost open span. Yields the
+    attributes dict (None when the run is not traced) so the block can add to it.
+    """
+    trace = _traces.get(conversation_id)
+    if trace is None:
+        yield None
+        return
+    span_id = trace.next_id()
+    parent = _current.get() or 1
+    token = _current.set(span_id)
+    started = time.perf_counter()
+    try:
+        yield attrs
+    finally:
+        _current.reset(token)
+        trace.add(span_id, parent, name, trace.offset(started), trace.offset(time.perf_counter()), attrs)
+
+
+def add_span(conversation_id: str, name: str, started: float, ended: float, parent: int = None,
+             **attrs) -> Optional[int]:
+    """
+    Records a span measured by the caller (time.perf_counter() values) under
+    `parent` or the innermost open span. Returns its id.
+    """
+    trace = _traces.get(conversation_id)
+    if trace is None or started is None or ended is None:
+        return None
+    span_id = trace.next_id()
+    trace.add(span_id, parent or _current.get() or 1, name, trace.offset(started), trace.offset(ended), attrs)
+    return span_id
+
+
+def finish(conversation_id: str, **attrs):
+    """
+    Closes the root span and stores the run's trace.
+    """
+    trace = _traces.pop(conversation_id, None)
+    if trace is None:
+        return
+    trace.add(1, 0, ROOT_SPAN, 0.0, trace.offset(time.perf_counter()), attrs)
+    try:
+        from deliberations.models import Trace as TraceRecord
+
+        TraceRecord.objects.create(
+            conversation_id=conversation_id,
+            first_round=trace.first_round,
+            started_at=datetime.fromtimestamp(trace.origin, tz=timezone.utc),
+            spans=trace.spans,
+        )
+    except Exception as e:
+        print(f"Error saving trace for {conversation_id}: {e}")
+
+    path = _setting("DELIBERATION_TRACE_OTLP_FILE", "")
+    if path:
+        try:
+            export_otlp(trace, path)
+        except OSError as e:
+            print(f"Error exporting trace to {path}: {e}")
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_request(trace: Trace) -> dict:
+    """
+    The trace as an OTLP/JSON ExportTraceServiceRequest.
+    """
+    origin_ns = round(trace.origin * 1e9)
+    spans = []
+    for span_id, parent, name, start_us, duration_us, *rest in trace.spans:
+        attrs = dict(rest[0]) if rest else {}
+        if span_id == 1:
+            attrs.update({"conversation.id": trace.conversation_id, "deliberation.first_round": trace.first_round})
+        otlp_span = {
+            "traceId": trace.trace_id,
+            "spanId": f"{span_id:016x}",
+            "name": name,
+            "kind": 1,
+            "startTimeUnixNano": str(origin_ns + start_us * 1000),
+            "endTimeUnixNano": str(origin_ns + (start_us + duration_us) * 1000),
+            "attributes": [{"key": k, "value": _otlp_value(v)} for k, v in attrs.items() if v is not None],
+        }
+        if parent:
+            otlp_span["parentSpanId"] = f"{parent:016x}"
+        spans.append(otlp_span)
+    return {"resourceSpans": [{
+        "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "deliberation-worker"}}]},
+        "scopeSpans": [{"scope": {"name": "deliberations"}, "spans": spans}],
+    }]}
+
+
+def export_otlp(trace: Trace, path: str):
+    line = json.dumps(otlp_request(trace), separators=(",", ":")) + "\n"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path, "a") as fh:
+        fh.write(line)
+
+
+def waterfall(spans: list) -> list:
+    """
+    Stored spans as waterfall rows, depth first (children right after their
+    parent, siblings by start time).
+    """
+    children = {}
+    for span_id, parent, name, start_us, duration_us, *rest in spans:
+        children.setdefault(parent, []).append((start_us, span_id, name, duration_us, rest[0] if rest else {}))
+    rows = []
+    stack = [(entry, 0, 0) for entry in sorted(children.get(0, []), reverse=True)]
+    while stack:
+        (start_us, span_id, name, duration_us, attrs), depth, parent = stack.pop()
+        rows.append({"id": span_id, "parent": parent or None, "name": name, "depth": depth,
+                     "start_ms": start_us / 1000, "duration_ms": duration_us / 1000, "attributes": attrs})
+        stack.extend((entry, depth + 1, span_id) for entry in sorted(children.get(span_id, []), reverse=True))
+    return rows
+
+
+def breakdown(spans: list) -> dict:
+    """
+    Summed time per span category (the name up to the first space); parallel
+    spans overlap, so categories can add up to more than the wall time.
+    """
+    totals = {}
+    for span_id, parent, name, start_us, duration_us, *rest in spans:
+        if span_id == 1:
+            continue
+        category = name.split(" ", 1)[0]
+        totals[category] = totals.get(category, 0) + duration_us / 1000
+    return {category: round(ms, 3) for category, ms in sorted(totals.items())}
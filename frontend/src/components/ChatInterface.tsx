@@ -1,6 +1,7 @@
 
 import React, { useState, useEffect, useRef } from 'react';
-import { startDeliberation, getStreamUrl, getConversationHistory } from '../services/api';
+import axios from 'axios';
+import { startDeliberation, continueDeliberation, getStreamUrl, getConversationHistory, getCancelUrl } from '../services/api';
 import MessageItem from './MessageItem';
 
 interface ChatInterfaceProps {
@@ -25,6 +26,8 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
     const [loading, setLoading] = useState(false);
     const [conversationId, setConversationId] = useState<string | null>(null);
     const [currentRound, setCurrentRound] = useState(0);
+    // Place in the deliberation queue while waiting for a worker
+    const [queue, setQueue] = useState<{ position: number; estimated_wait_s: number } | null>(null);
     const eventSourceRef = useRef<EventSource | null>(null);
 
     const syncHistory = async (convoId: string) => {
@@ -38,13 +41,38 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
         }
     };
 
+    const systemMessage = (content: string) => {
+        setMessages((prev) => [...prev, {
+            agent_name: 'system',
+            content,
+            round_number: 0,
+            is_internal_thought: false
+        }]);
+    };
+
+    // Leaves the current conversation: the next question starts a new deliberation
+    const handleNewQuestion = () => {
+        if (eventSourceRef.current) {
+            eventSourceRef.current.close();
+        }
+        setConversationId(null);
+        setMessages([]);
+        setCurrentRound(0);
+        setQueue(null);
+    };
+
     const handleStart = async (e: React.FormEvent) => {
         e.preventDefault();
         if (!question.trim()) return;
 
+        // A finished conversation is continued with a follow-up instead of starting over
+        const followUpOf = conversationId;
+
         setLoading(true);
-        setMessages([]);
-        setCurrentRound(1); // Assume starts at 1
+        if (!followUpOf) {
+            setMessages([]);
+            setCurrentRound(1); // Assume starts at 1
+        }
 
         try {
             // Add user's question to messages immediately for feedback
@@ -54,13 +82,31 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
                 round_number: 0,
                 is_internal_thought: false
             };
-            setMessages([userMsg]);
+            setMessages((prev) => followUpOf ? [...prev, userMsg] : [userMsg]);
             const currentQ = question; // Capture current question
             setQuestion(''); // Clear input
 
-            const response = await startDeliberation(currentQ, apiKeys, maxRounds);
+            let response;
+            if (followUpOf) {
+                try {
+                    response = await continueDeliberation(followUpOf, currentQ, apiKeys);
+                } catch (err) {
+                    // Nothing to follow up on (e.g. cancelled before its first turn): ask it as a new question
+                    if (!(axios.isAxiosError(err) && err.response?.status === 409)) throw err;
+                    response = await startDeliberation(currentQ, apiKeys, maxRounds);
+                    setCurrentRound(1);
+                }
+            } else {
+                response = await startDeliberation(currentQ, apiKeys, maxRounds);
+            }
             const convoId = response.conversation_id;
             setConversationId(convoId);
+            if (response.first_round) setCurrentRound(response.first_round);
+            setQueue(response.queue || null);
+
+            // Only messages after the latest question belong to this run
+            // (the Arbiter is round 0 in every exchange)
+            const currentRun = (prev: Message[]) => prev.map(m => m.agent_name).lastIndexOf('user');
 
             // Connect to Stream
             const url = getStreamUrl(convoId);
@@ -78,7 +124,8 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
                     if (data.type === 'token') {
                         setMessages((prev) => {
                             // Find existing message for this specific agent and round
-                            const msgIndex = prev.findIndex(m => m.agent_name === data.agent && m.round_number === data.round);
+                            const start = currentRun(prev);
+                            const msgIndex = prev.findIndex((m, i) => i > start && m.agent_name === data.agent && m.round_number === data.round);
 
                             if (msgIndex !== -1) {
                                 const newMessages = [...prev];
@@ -101,7 +148,8 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
                     } else if (data.type === 'message' || !data.type) {
                         // Check if message already exists (we might have streamed it)
                         setMessages((prev) => {
-                            const exists = prev.some(m => m.agent_name === data.agent && m.round_number === data.round && m.content.length >= data.content.length);
+                            const start = currentRun(prev);
+                            const exists = prev.some((m, i) => i > start && m.agent_name === data.agent && m.round_number === data.round && m.content.length >= data.content.length);
                             if (exists) return prev;
 
                             return [...prev, {
@@ -111,6 +159,10 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
                                 is_internal_thought: false
                             }];
                         });
+                    } else if (data.type === 'queued') {
+                        setQueue({ position: data.position, estimated_wait_s: data.estimated_wait_s });
+                    } else if (data.type === 'started') {
+                        setQueue(null);
                     } else if (data.type === 'round_update') {
                         setCurrentRound(data.round);
                     } else if (data.type === 'final') {
@@ -118,9 +170,14 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
                         await syncHistory(convoId);
                         setLoading(false);
                         source.close();
+                    } else if (data.type === 'cancelled') {
+                        await syncHistory(convoId);
+                        setLoading(false);
+                        source.close();
                     } else if (data.type === 'error') {
                         console.error("Server Error:", data.message);
                         await syncHistory(convoId);
+                        systemMessage(`The deliberation failed: ${data.message || 'unknown error'}`);
                         setLoading(false);
                         source.close();
                     }
@@ -139,6 +196,15 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
 
         } catch (err) {
             console.error('Failed to start deliberation', err);
+            if (axios.isAxiosError(err) && err.response?.status === 429) {
+                // Every worker is busy and the queue is full
+                const retryAfter = err.response.headers['retry-after'];
+                systemMessage(`All deliberation slots are busy. Please try again in ${retryAfter || 'a few'} seconds.`);
+            } else {
+                const detail = axios.isAxiosError(err) ? (err.response?.data?.error || err.message) : String(err);
+                systemMessage(`Could not start the deliberation: ${detail}`);
+            }
+            setQueue(null);
             setLoading(false);
         }
     };
@@ -151,6 +217,16 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
         };
     }, []);
 
+    // Stop the backend from deliberating for nobody when the page goes away mid-run
+    useEffect(() => {
+        if (!loading || !conversationId) return;
+        const cancelOnLeave = () => {
+            navigator.sendBeacon(getCancelUrl(conversationId));
+        };
+        window.addEventListener('pagehide', cancelOnLeave);
+        return () => window.removeEventListener('pagehide', cancelOnLeave);
+    }, [loading, conversationId]);
+
     const [showReasoning, setShowReasoning] = useState(true);
 
     // ... (existing code: handleStart logic remains)
@@ -198,6 +274,14 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
                             ID: {conversationId.split('-')[0]}
                         </span>
                     )}
+                    {conversationId && !loading && (
+                        <button
+                            onClick={handleNewQuestion}
+                            className="text-sm font-bold text-sky-600 hover:bg-sky-50 px-3 py-2 rounded-lg transition-colors"
+                        >
+                            New Question
+                        </button>
+                    )}
                     <button
                         onClick={onReset}
                         className="text-sm font-bold text-red-500 hover:bg-red-50 px-3 py-2 rounded-lg transition-colors"
@@ -231,7 +315,9 @@ const ChatInterface: React.FC<ChatInterfaceProps> = ({ apiKeys, maxRounds, onRes
                             <div className="w-2 h-2 bg-sky-500 rounded-full animate-bounce"></div>
                         </div>
                         <span className="text-sm font-bold text-slate-500 uppercase tracking-tighter">
-                            Agents Deliberating (Round {currentRound})
+                            {queue
+                                ? `Queued (position ${queue.position}${queue.estimated_wait_s ? `, starts in ~${queue.estimated_wait_s}s` : ''})`
+                                : `Agents Deliberating (Round ${currentRound})`}
                         </span>
                     </div>
                 )}
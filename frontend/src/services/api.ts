@@ -16,6 +16,18 @@ export const startDeliberation = async (
     return response.data; // { conversation_id: string }
 };
 
+export const continueDeliberation = async (
+    conversationId: string,
+    question: string,
+    apiKeys: { openai: string; gemini: string; deepseek: string }
+) => {
+    const response = await axios.post(`${API_BASE_URL}/conversation/${conversationId}/follow-up/`, {
+        question,
+        api_keys: apiKeys
+    });
+    return response.data; // { conversation_id: string, first_round: number, max_rounds: number }
+};
+
 export const getConversationHistory = async (conversationId: string) => {
     const response = await axios.get(`${API_BASE_URL}/conversation/${conversationId}/history/`);
     return response.data; // Message[]
@@ -24,3 +36,12 @@ export const getConversationHistory = async (conversationId: string) => {
 export const getStreamUrl = (conversationId: string) => {
     return `${API_BASE_URL}/conversation/${conversationId}/stream/`;
 };
+
+export const getCancelUrl = (conversationId: string) => {
+    return `${API_BASE_URL}/conversation/${conversationId}/cancel/`;
+};
+
+export const cancelDeliberation = async (conversationId: string) => {
+    const response = await axios.post(getCancelUrl(conversationId));
+    return response.data; // { conversation_id: string, status: string }
+};